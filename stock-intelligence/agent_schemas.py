@@ -0,0 +1,231 @@
+import re
+import json
+
+# Output schemas of the Catalyst agents + a one-pass JSON extractor.
+# Field spec: (kind, default[, choices[, aliases]]) with kind in score / int / str / enum / object.
+# Every agent answer is coerced to its schema so the report always finds its fields,
+# and missing / invalid values are filled with the same deterministic defaults.
+
+TECHNICAL_ACTIONS = ["BUY_ON_WEAKNESS", "BUY_ON_BREAKOUT", "WAIT_AND_SEE", "SELL", "AVOID"]
+# Bare answers mapped to the nearest technical action (a plain "BUY" must stay bullish)
+TECHNICAL_ACTION_ALIASES = {"BUY": "BUY_ON_WEAKNESS", "ACCUMULATE": "BUY_ON_WEAKNESS", "WAIT": "WAIT_AND_SEE", "HOLD": "WAIT_AND_SEE"}
+
+SCHEMAS = {
+    "technical": {
+        "sentiment_score": ("score", 50),
+        "analysis": ("str", "Analisa teknikal tidak tersedia."),
+        "action": ("enum", "WAIT_AND_SEE", TECHNICAL_ACTIONS, TECHNICAL_ACTION_ALIASES),
+        "trading_plan": ("object", {
+            "buy_area": ("str", "-"),
+            "stop_loss": ("str", "-"),
+            "target_profit": ("str", "-"),
+        }),
+        "plan_note": ("str", ""),
+    },
+    "bandarmology": {
+        "sentiment_score": ("score", 50),
+        "status": ("enum", "CHURNING", ["DISTRIBUSI", "AKUMULASI", "MARK-DOWN", "CHURNING"]),
+        "analysis": ("str", "Analisa bandarmology tidak tersedia."),
+        "action": ("enum", "WAIT", ["BUY", "WAIT", "SELL"]),
+    },
+    "fundamental": {
+        "sentiment_score": ("score", 50),
+        "valuation_status": ("enum", "FAIR", ["UNDERVALUED", "FAIR", "OVERVALUED"]),
+        "financial_health": ("enum", "RISKY", ["HEALTHY", "RISKY", "DISTRESS"]),
+        "analysis": ("str", "Analisa fundamental tidak tersedia."),
+    },
+    "cio": {
+        "final_score": ("score", 50),
+        "primary_strategy": ("enum", "AVOID", ["SWING_TRADE", "INVESTING", "SCALPING", "AVOID"]),
+        "conviction_level": ("enum", "LOW", ["HIGH", "MEDIUM", "LOW"]),
+        "final_reasoning": ("str", "Keputusan CIO tidak tersedia."),
+        "recommended_action": ("enum", "WAIT", ["BUY", "SELL", "WAIT"]),
+        "allocation_size": ("str", "ZERO"),
+        "action_plan": ("str", "-"),
+    },
+}
+SCHEMAS["technical_batch"] = {"ticker": ("str", ""), **SCHEMAS["technical"]}
+SCHEMAS["fundamental_batch"] = {"ticker": ("str", ""), **SCHEMAS["fundamental"]}
+
+def is_batch(agent):
+    return agent.endswith("_batch")
+
+# --- ONE-PASS EXTRACTION ---
+class JsonScanner:
+    """
+    Incremental scanner for the first top-level JSON value starting with `opener`
+    ('{' object or '[' array). feed() takes text pieces (e.g. stream chunks) and
+    returns True once the value has closed; result() parses what was scanned.
+    """
+    def __init__(self, opener="{"):
+        self.opener = opener
+        self.start = None
+        self.end = None
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.safe_end, self.safe_closers = None, ""
+        self._pos = 0
+
+    def feed(self, piece):
+        if self.end is not None:
+            return True
+        for ch in piece:
+            i = self._pos
+            self._pos += 1
+            if self.start is None:
+                if ch == self.opener:
+                    self.start = i
+                    self.stack.append("}" if ch == "{" else "]")
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.stack.append("}" if ch == "{" else "]")
+            elif ch in "}]":
+                self.stack.pop()
+                if not self.stack:
+                    self.end = i + 1
+                    return True
+                self.safe_end, self.safe_closers = i + 1, "".join(reversed(self.stack))
+            elif ch == ",":
+                self.safe_end, self.safe_closers = i, "".join(reversed(self.stack))
+        return False
+
+    def result(self, text):
+        """(value, complete) for the full text fed so far."""
+        if self.end is not None:
+            return _loads(text[self.start:self.end]), True
+        if self.safe_end is None:
+            return None, False
+        # Truncated answer (stream cut, token limit): close at the last complete member
+        return _loads(text[self.start:self.safe_end] + self.safe_closers), False
+
+def extract_json(text, opener="{"):
+    """
+    Finds the first top-level JSON value starting with `opener` in a single scan.
+    Truncated answers (stream cut, token limit) are closed at the last complete
+    member. Returns (value, complete) -- value is None if nothing could be parsed.
+    """
+    scanner = JsonScanner(opener)
+    scanner.feed(text)
+    return scanner.result(text)
+
+def _loads(candidate):
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    # Trailing commas are the most common model slip
+    try:
+        return json.loads(re.sub(r",\s*([}\]])", r"\1", candidate))
+    except ValueError:
+        return None
+
+# --- COERCION ---
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = _NUMBER.search(str(value)) if value is not None else None
+    return float(match.group(0)) if match else None
+
+def _coerce(spec, value):
+    kind, default = spec[0], spec[1]
+    if kind == "object":
+        return validate(value if isinstance(value, dict) else {}, default)
+    if value is None:
+        return default
+    if kind in ("score", "int"):
+        num = _to_number(value)
+        if num is None:
+            return default
+        num = int(round(num))
+        return max(0, min(100, num)) if kind == "score" else num
+    if kind == "enum":
+        choices = spec[2]
+        norm = str(value).strip().upper().replace(" ", "_")
+        if norm in choices:
+            return norm
+        for choice in choices:
+            if choice in norm or choice.replace("_", " ") in str(value).upper():
+                return choice
+        aliases = spec[3] if len(spec) > 3 else {}
+        for alias, choice in aliases.items():
+            if alias in norm:
+                return choice
+        return default
+    # str
+    if isinstance(value, list):
+        return "\n".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def validate(data, schema):
+    """Coerces `data` to `schema`; unknown keys are kept, missing ones get their default."""
+    result = dict(data)
+    for field, spec in schema.items():
+        result[field] = _coerce(spec, data.get(field))
+    return result
+
+def defaults(agent):
+    return validate({}, SCHEMAS[agent])
+
+def parse_response(agent, text):
+    """
+    Extracts and validates an agent answer.
+    Single agents return a dict ('parse_error': True if no JSON object was found,
+    'partial': True if it had to be closed); batch agents return a list of dicts.
+    """
+    schema = SCHEMAS.get(agent)
+    if is_batch(agent):
+        value, _ = extract_json(text, "[")
+        items = [item for item in (value or []) if isinstance(item, dict) and item.get("ticker")]
+        return [validate(item, schema) if schema else item for item in items]
+
+    value, complete = extract_json(text, "{")
+    if not isinstance(value, dict):
+        result = validate({}, schema) if schema else {}
+        result["parse_error"] = True
+        return result
+    result = validate(value, schema) if schema else value
+    if not complete:
+        result["partial"] = True
+    return result
+
+# --- PROVIDER RESPONSE SCHEMA (JSON MODE) ---
+def _spec_to_openapi(spec):
+    kind = spec[0]
+    if kind == "object":
+        return to_openapi(spec[1])
+    if kind in ("score", "int"):
+        return {"type": "INTEGER"}
+    if kind == "enum":
+        return {"type": "STRING", "enum": list(spec[2])}
+    return {"type": "STRING"}
+
+def to_openapi(schema):
+    return {
+        "type": "OBJECT",
+        "properties": {field: _spec_to_openapi(spec) for field, spec in schema.items()},
+        "required": list(schema),
+    }
+
+def response_schema(agent):
+    """Gemini response_schema (OpenAPI subset) for `agent`, or None if unknown."""
+    schema = SCHEMAS.get(agent)
+    if schema is None:
+        return None
+    if is_batch(agent):
+        return {"type": "ARRAY", "items": to_openapi(schema)}
+    return to_openapi(schema)
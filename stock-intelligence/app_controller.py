@@ -9,16 +9,36 @@ from dotenv import load_dotenv
 # Import Logic
 from technical_analysis import analyze_technical
 from quant_engine import QuantAnalyzer
+from intraday_tracker import IntradayBrokerTracker
 try:
     from goapi_client import GoApiClient
 except ImportError:
     GoApiClient = None
 
 from catalyst_agent import get_technical_analysis, get_bandarmology_analysis, get_fundamental_analysis, get_final_verdict
+from catalyst_agent import get_technical_analysis_batch, get_fundamental_analysis_batch
+import catalyst_agent
+import prompt_builder
+import llm_scheduler
 from news_fetcher import fetch_stock_news
 from chart_generator import generate_chart
 from main import format_message, broadcast_message
 import db_manager
+import db_maintenance
+import portfolio_io
+
+# Hard deadline (seconds) per AI agent before using the deterministic fallback
+AI_AGENT_DEADLINE = float(os.getenv("AI_AGENT_DEADLINE", "60"))
+AI_AGENT_DEADLINES = {
+    "technical": AI_AGENT_DEADLINE,
+    "bandarmology": AI_AGENT_DEADLINE,
+    "fundamental": float(os.getenv("AI_FUNDAMENTAL_DEADLINE", "45")),
+    "cio": AI_AGENT_DEADLINE,
+}
+
+# AI fundamentals change slowly: reuse a cached Fundamental Agent output this long (minutes)
+# when the rest of the analysis has to be recomputed
+FUNDAMENTAL_REUSE_MINUTES = float(os.getenv("ANALYSIS_FUNDAMENTAL_REUSE_HOURS", "24")) * 60
 
 class StockAppController:
     def __init__(self, log_callback=None):
@@ -30,7 +50,10 @@ class StockAppController:
         self.service_url = "http://localhost:3000"
         
         load_dotenv()
+        db_manager.configure_storage() # DATABASE_URL may come from .env
         db_manager.init_db()
+        # Retention / archiving / vacuum on a background thread (DB_MAINTENANCE_INTERVAL_HOURS)
+        db_maintenance.start_background_maintenance()
         
         # Initialize Quant Components
         self.goapi_client = None
@@ -38,10 +61,14 @@ class StockAppController:
             self.goapi_client = GoApiClient()
             
         self.quant_engine = QuantAnalyzer(self.goapi_client)
+        self.intraday_tracker = IntradayBrokerTracker(self.goapi_client, self.quant_engine) if self.goapi_client else None
+        
+        # Cache status of the last run_analysis: None (fresh run) or {'age_minutes', 'valid_until', 'mode'}
+        self.last_cache_info = None
 
     def log(self, message):
         # Suppress logging in production unless it's a critical error or analysis step
-        if self.log_callback and (message.startswith("✅") or message.startswith("❌") or message.startswith("📊") or message.startswith("🧠") or message.startswith("🌍") or message.startswith("🔵") or message.startswith("🔎") or message.startswith("📈")):
+        if self.log_callback and (message.startswith("✅") or message.startswith("❌") or message.startswith("📊") or message.startswith("🧠") or message.startswith("🌍") or message.startswith("🔵") or message.startswith("🔎") or message.startswith("📈") or message.startswith("⚡") or message.startswith("♻️") or message.startswith("⚠️")):
              self.log_callback(message)
         # Always log to console/file if needed for debugging, or comment out for cleaner production
         # else:
@@ -133,26 +160,50 @@ class StockAppController:
             self.log(f"Error fetching groups: {e}")
             return []
 
-    def run_analysis(self, ticker, timeframe="daily", style="SWING", progress_callback=None):
+    def run_analysis(self, ticker, timeframe="daily", style="SWING", progress_callback=None, skip_ai=False, force_refresh=False):
         """
         Orchestrates the unified "Stock Intelligence" pipeline.
         Combines Technical, Forensic Bandarmology, and News into one report.
         Style: SWING, SCALPING, INVESTING
+        skip_ai: Fast path -- no Catalyst agents, news or chart; the report is built
+                 from analyze_technical + QuantAnalyzer numbers via deterministic templates.
+        force_refresh: Ignore cached results (full and partial) and recompute everything.
+        Results are cached per (ticker, timeframe, style) until the next bar / session,
+        see db_manager.get_cached_analysis; self.last_cache_info tells the UI if one was served.
         """
         ticker = ticker.upper()
-        self.log(f"🔵 Memulai Stock Intelligence ({style}) untuk {ticker} ({timeframe})...")
+        mode = "Quant" if skip_ai else style
+        self.log(f"🔵 Memulai Stock Intelligence ({mode}) untuk {ticker} ({timeframe})...")
         if progress_callback: progress_callback(0.1)
         
-        # Save to History
+        # 1. Check Cache (an AI result also satisfies a fast-mode request)
+        self.last_cache_info = None
+        reuse = {}
+        cached = None
+        if not force_refresh:
+            cached = db_manager.get_cached_analysis(
+                ticker, timeframe=timeframe, style=style, modes=("ai", "quant") if skip_ai else ("ai",)
+            )
+            # Partial reuse: recent AI fundamentals survive a technical refresh
+            if not cached and not skip_ai:
+                cached_fund = db_manager.get_cached_agent_result(ticker, "fundamental", FUNDAMENTAL_REUSE_MINUTES)
+                if cached_fund:
+                    reuse["fundamental"] = cached_fund
+        
+        # Save to History (queued after the cache reads, so they do not wait for its commit)
         db_manager.add_history(ticker)
-
-        _cached = None
-        # 1. Check Cache (Daily only)
-        if timeframe == "daily":
-            cached_data = db_manager.get_cached_analysis(ticker)
-            if cached_data:
-                # pass for now, forcing refresh as per logic
-                pass 
+        
+        if cached:
+            self.last_cache_info = {
+                "age_minutes": cached['age_minutes'], "valid_until": cached['valid_until'], "mode": cached['mode']
+            }
+            self.log(
+                f"♻️ Memakai hasil cache {ticker} ({cached['age_minutes']:.0f} menit lalu, "
+                f"valid s/d {cached['valid_until']:%d-%m %H:%M} WIB)."
+            )
+            if progress_callback: progress_callback(1.0)
+            chart_path = cached['chart_path'] if cached['chart_path'] and os.path.exists(cached['chart_path']) else None
+            return cached['full_message'], chart_path, cached['final_score'] if cached['final_score'] is not None else 50
 
         try:
             # 1. FETCH DATA (Parallel Technical + Bandarmology + News)
@@ -164,7 +215,9 @@ class StockAppController:
                 if self.goapi_client and timeframe == "daily":
                     self.log(f"🔎 Menjalankan Forensik Bandarmology...")
                     if progress_callback: progress_callback(0.4)
-                    real = self.quant_engine.fetch_real_bandarmology(ticker)
+                    # Reuse the intraday tracker's latest snapshot instead of re-downloading today's summary
+                    tracked_raw = self.intraday_tracker.get_latest_raw(ticker) if self.intraday_tracker else None
+                    real = self.quant_engine.fetch_real_bandarmology(ticker, broker_data=tracked_raw)
                     hist = self.goapi_client.get_broker_summary_historical(ticker, days=20)
                     return real, hist
                 return None, None
@@ -173,12 +226,12 @@ class StockAppController:
                 self.log(f"🚀 Memulai Parallel Data Fetching ({ticker})...")
                 future_tech = executor.submit(analyze_technical, ticker, timeframe=timeframe)
                 future_bandar = executor.submit(fetch_full_bandar)
-                future_news = executor.submit(fetch_stock_news, ticker)
+                future_news = executor.submit(fetch_stock_news, ticker) if not skip_ai else None
                 
                 try:
                     ta_data = future_tech.result()
                     real_bandar, hist_raw = future_bandar.result()
-                    news_summary = future_news.result()
+                    news_summary = future_news.result() if future_news else ""
                 except Exception as e:
                     self.log(f"❌ Error in Parallel Fetch: {e}")
                     raise e
@@ -201,6 +254,7 @@ class StockAppController:
                 bs_data = real_bandar.get('broker_summary', {})
                 ff_data = real_bandar.get('foreign_flow', {})
                 context_data['today_summary'] = bs_data.get('summary', 'N/A')
+                context_data['bandar_score'] = bs_data.get('bandar_score', 0)
                 
                 ta_data['bandar_status'] = bs_data.get('status', 'Neutral')
                 ta_data['foreign_status'] = ff_data.get('status', 'N/A')
@@ -261,10 +315,18 @@ class StockAppController:
                 )
                 ta_data['final_score'] = final_res['final_score']
                 ta_data['verdict'] = final_res['verdict']
+                # analyze_technical always sets 'verdict'; this key marks the QuantAnalyzer one
+                ta_data['quant_verdict'] = final_res
                 
                 # Valuation & Foreign Context
                 val_data = ta_data.get('valuation', {})
                 context_data['foreign_flow'] = ff_data.get('status', 'N/A')
+                if ff_data.get('days_available'):
+                    context_data['foreign_flow'] += (
+                        f" (Net 5D: {ff_data.get('net_5d', 0):,.0f}, 20D: {ff_data.get('net_20d', 0):,.0f}, "
+                        f"60D: {ff_data.get('net_60d', 0):,.0f}; {ff_data.get('streak_direction')} "
+                        f"{ff_data.get('streak_days', 0)} hari berturut-turut)"
+                    )
                 context_data['pbv'] = val_data.get('pbv', 0)
                 context_data['per'] = val_data.get('per', 0)
                 context_data['market_cap'] = val_data.get('market_cap', 0)
@@ -288,10 +350,9 @@ class StockAppController:
                 bandar_summary_lines.append(f"Top 3 Buyer (Today): {current_top_buyer}")
                 bandar_summary_lines.append(f"Top 3 Seller (Today): {current_top_seller}")
 
-            self.log("🌍 Berita Terambil via Parallel Fetch.")
-
-            # 3. RUN AI PIPELINE (Refactored)
-            self.log(f"🧠 Melakukan Riset AI (Strategy: {style})...")
+            if not skip_ai:
+                self.log("🌍 Berita Terambil via Parallel Fetch.")
+            
             
             # Prepare Fundamental Data Input
             fund_data = {
@@ -302,19 +363,27 @@ class StockAppController:
                 "eps_growth": ta_data.get('valuation', {}).get('eps_growth', 0),
             }
             
-            ai_tech, ai_forensic, ai_fund, ai_cio = self._run_ai_pipeline(
-                ticker, ta_data, context_data, fund_data, news_summary, style=style
-            )
+            # 3. RUN AI PIPELINE (or deterministic quant pipeline)
+            if skip_ai:
+                ai_tech, ai_forensic, ai_fund, ai_cio = self._run_quant_pipeline(ta_data, context_data, fund_data, style)
+            else:
+                self.log(f"🧠 Melakukan Riset AI (Strategy: {style})...")
+                ai_tech, ai_forensic, ai_fund, ai_cio = self._run_ai_pipeline(
+                    ticker, ta_data, context_data, fund_data, news_summary, style=style,
+                    progress_callback=progress_callback, reuse=reuse
+                )
             
             if progress_callback: progress_callback(0.8)
 
-            # 4. GENERATE CHART
-            self.log("📈 Membuat Chart Technical Standard...")
-            chart_path = generate_chart(
-                ta_data['ticker'], ta_data['df_daily'], 
-                broker_history_df=broker_history_df, broker_flow_df=broker_flow_df,
-                chart_mode='technical' 
-            )
+            # 4. GENERATE CHART (skipped in the fast path, it dominates its runtime)
+            chart_path = None
+            if not skip_ai:
+                self.log("📈 Membuat Chart Technical Standard...")
+                chart_path = generate_chart(
+                    ta_data['ticker'], ta_data['df_daily'], 
+                    broker_history_df=broker_history_df, broker_flow_df=broker_flow_df,
+                    chart_mode='technical' 
+                )
 
             # 5. FORMAT REPORT (Refactored)
             # Update final score before formatting logic if needed, typically AI score is used
@@ -322,13 +391,26 @@ class StockAppController:
             
             msg, tech_analysis_text = self._format_analysis_report(
                 ticker, ta_data, ai_tech, ai_forensic, ai_fund, ai_cio, 
-                bandar_summary_lines, news_summary
+                bandar_summary_lines, news_summary, quant_mode=skip_ai
             )
 
-            # Save (Daily)
-            if timeframe == "daily":
-                db_manager.save_analysis(ta_data['ticker'], ta_data, tech_analysis_text, msg)
+            # Save (keyed on the requested ticker, ta_data['ticker'] carries the .JK suffix).
+            # Degraded AI runs are not served as cache hits; their healthy agents stay reusable.
+            result_mode = "quant" if skip_ai else ("degraded" if ta_data.get('degraded_agents') else "ai")
+            db_manager.save_analysis(
+                ticker, ta_data, tech_analysis_text, msg,
+                timeframe=timeframe, style=style, mode=result_mode,
+                agents={"technical": ai_tech, "bandarmology": ai_forensic, "fundamental": ai_fund, "cio": ai_cio},
+                chart_path=chart_path
+            )
             
+            cache_stats = catalyst_agent.get_llm_cache_stats()['total']
+            self.log(f"📊 LLM Cache: {cache_stats['hits']} hit / {cache_stats['misses']} miss (Hit Ratio {cache_stats['hit_ratio']:.0%})")
+            queue_stats = llm_scheduler.get_scheduler().get_stats()['interactive']
+            self.log(f"📊 LLM Queue: {queue_stats['requests']} request, wait avg {queue_stats['avg_wait_s']:.2f}s / p95 {queue_stats['p95_wait_s']:.2f}s")
+            token_stats = prompt_builder.get_token_stats()
+            if token_stats:
+                self.log("📊 Input Tokens (avg/call): " + ", ".join(f"{a} {v['avg_input_tokens']}" for a, v in token_stats.items()))
             self.log("✅ Analisa Selesai.")
             if progress_callback: progress_callback(1.0)
             
@@ -340,8 +422,31 @@ class StockAppController:
             traceback.print_exc()
             raise e
 
-    def _run_ai_pipeline(self, ticker, ta_data, context_data, fund_data, news_summary, style="SWING"):
-        """Executes AI agents in parallel."""
+    def _run_quant_pipeline(self, ta_data, context_data, fund_data, style="SWING"):
+        """
+        Deterministic replacement of the AI pipeline (skip_ai fast path).
+        Same result shapes as the agents, built from the trading plan maths and QuantAnalyzer scores.
+        """
+        self.log(f"⚡ Mode Cepat: Laporan kuantitatif tanpa AI ({style}).")
+        ai_tech = catalyst_agent.fallback_technical_analysis(ta_data, style)
+        ai_fund = catalyst_agent.fallback_fundamental_analysis(fund_data)
+        if context_data.get('top_seller') != 'N/A' or context_data.get('today_summary') != 'N/A':
+            ai_forensic = catalyst_agent.fallback_bandarmology_analysis(context_data)
+        else:
+            ai_forensic = {"status": "N/A", "analysis": "Data Bandar Tidak Cukup"}
+        
+        ai_cio = catalyst_agent.fallback_final_verdict(ai_tech, ai_forensic, ai_fund, style, quant_verdict=ta_data.get('quant_verdict'))
+        ta_data['degraded_agents'] = []
+        return ai_tech, ai_forensic, ai_fund, ai_cio
+
+    def _run_ai_pipeline(self, ticker, ta_data, context_data, fund_data, news_summary, style="SWING", progress_callback=None, reuse=None):
+        """
+        Executes AI agents in parallel with streaming output.
+        The CIO starts the moment the last upstream agent returns. Slow calls are hedged
+        inside catalyst_agent; agents that miss their hard deadline (AI_AGENT_DEADLINES)
+        degrade to deterministic results, recorded in ta_data['degraded_agents'].
+        reuse: {agent name: cached output} for agents that are not re-run (e.g. fundamental).
+        """
         import concurrent.futures
         
         ai_tech = {}
@@ -349,29 +454,99 @@ class StockAppController:
         ai_fund = {}
         ai_cio = {}
         
+        labels = {"technical": "Teknikal", "bandarmology": "Bandarmology", "fundamental": "Fundamental", "cio": "CIO"}
+        streaming = set()
+        degraded = []
+        
+        def on_progress(agent, text):
+            # First chunk of each agent -> notify UI once (chunks arrive many times per second)
+            if agent not in streaming:
+                streaming.add(agent)
+                self.log(f"🧠 {labels.get(agent, agent)} Agent: menerima respons...")
+        
+        fallbacks = {
+            "technical": lambda: catalyst_agent.fallback_technical_analysis(ta_data, style),
+            "bandarmology": lambda: catalyst_agent.fallback_bandarmology_analysis(context_data),
+            "fundamental": lambda: catalyst_agent.fallback_fundamental_analysis(fund_data),
+        }
+        
+        def degrade(name, reason):
+            self.log(f"⚠️ {labels[name]} Agent {reason}. Menggunakan kalkulasi otomatis.")
+            degraded.append(name)
+            if name == "cio":
+                # Without a QuantAnalyzer verdict (e.g. no GoAPI) the weighted agent fallback decides
+                result = catalyst_agent.fallback_final_verdict(ai_tech, ai_forensic, ai_fund, style, quant_verdict=ta_data.get('quant_verdict'))
+            else:
+                result = fallbacks[name]()
+            return catalyst_agent.mark_degraded(result, reason)
+        
+        ai_executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+        # Own worker: upstream agents abandoned at their deadline may still occupy ai_executor
+        cio_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         try:
-            with concurrent.futures.ThreadPoolExecutor() as ai_executor:
-                # Pass style to Technical Agent
-                future_ai_tech = ai_executor.submit(get_technical_analysis, ticker, ta_data, news_summary, style=style)
-                future_ai_fund = ai_executor.submit(get_fundamental_analysis, ticker, fund_data)
-                
-                # Only run forensic if context exists
-                future_ai_forensic = None
-                if context_data.get('top_seller') != 'N/A' or context_data.get('today_summary') != 'N/A':
-                    future_ai_forensic = ai_executor.submit(get_bandarmology_analysis, ticker, context_data)
+            # Pass style to Technical Agent
+            results = dict(reuse or {})
+            for name in results:
+                self.log(f"♻️ {labels[name]} Agent: memakai hasil cache.")
+            
+            futures = {
+                "technical": ai_executor.submit(get_technical_analysis, ticker, ta_data, news_summary, style=style, on_progress=on_progress),
+            }
+            if "fundamental" not in results:
+                futures["fundamental"] = ai_executor.submit(get_fundamental_analysis, ticker, fund_data, on_progress=on_progress)
+            
+            # Only run forensic if context exists
+            if context_data.get('top_seller') != 'N/A' or context_data.get('today_summary') != 'N/A':
+                futures["bandarmology"] = ai_executor.submit(get_bandarmology_analysis, ticker, context_data, on_progress=on_progress)
+            
+            started = time.monotonic()
+            deadlines = {name: started + AI_AGENT_DEADLINES[name] for name in futures}
+            names = {f: name for name, f in futures.items()}
+            pending = set(futures.values())
+            
+            while pending:
+                next_deadline = min(deadlines[names[f]] for f in pending)
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=max(0, next_deadline - time.monotonic()),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for f in done:
+                    name = names[f]
+                    try:
+                        results[name] = f.result()
+                    except Exception as e:
+                        self.log(f"❌ {labels[name]} Agent error: {e}")
+                        results[name] = degrade(name, "error")
+                        continue
+                    if results[name].get('parse_error'):
+                        results[name] = degrade(name, "invalid JSON")
+                        continue
+                    self.log(f"🧠 {labels[name]} Agent selesai.")
+                    if progress_callback: progress_callback(0.6 + 0.05 * len(results))
                 
-                ai_tech = future_ai_tech.result()
-                ai_fund = future_ai_fund.result()
+                # Agents past their hard deadline are abandoned
+                now = time.monotonic()
+                for f in [f for f in pending if deadlines[names[f]] <= now]:
+                    pending.discard(f)
+                    results[names[f]] = degrade(names[f], f"timeout {AI_AGENT_DEADLINES[names[f]]:.0f}s")
+            
+            ai_tech = results["technical"]
+            ai_fund = results["fundamental"]
+            ai_forensic = results.get("bandarmology", {"status": "N/A", "analysis": "Data Bandar Tidak Cukup"})
                 
-                if future_ai_forensic:
-                    ai_forensic = future_ai_forensic.result()
-                else:
-                    ai_forensic = {"status": "N/A", "analysis": "Data Bandar Tidak Cukup"}
-                    
-                # --- CIO SYNTHESIS ---
-                self.log("⚖️ Menjalankan CIO Agent (Synthesis Decision)...")
-                # Pass style to CIO Agent
-                ai_cio = get_final_verdict(ticker, ai_tech, ai_forensic, ai_fund, style=style)
+            # --- CIO SYNTHESIS ---
+            self.log("⚖️ Menjalankan CIO Agent (Synthesis Decision)...")
+            # Pass style to CIO Agent
+            future_cio = cio_executor.submit(get_final_verdict, ticker, ai_tech, ai_forensic, ai_fund, style=style, on_progress=on_progress)
+            try:
+                ai_cio = future_cio.result(timeout=AI_AGENT_DEADLINES["cio"])
+                if ai_cio.get('parse_error'):
+                    ai_cio = degrade("cio", "invalid JSON")
+            except concurrent.futures.TimeoutError:
+                ai_cio = degrade("cio", f"timeout {AI_AGENT_DEADLINES['cio']:.0f}s")
+            except Exception as e:
+                self.log(f"❌ CIO Agent error: {e}")
+                ai_cio = degrade("cio", "error")
                 
         except Exception as e:
             self.log(f"❌ Error in Parallel AI: {e}")
@@ -379,10 +554,18 @@ class StockAppController:
             ai_forensic = {}
             ai_fund = {}
             ai_cio = {'recommended_action': 'ERROR', 'final_reasoning': str(e)}
+        finally:
+            # Do not block on agents that missed the deadline
+            ai_executor.shutdown(wait=False, cancel_futures=True)
+            cio_executor.shutdown(wait=False, cancel_futures=True)
+        
+        ta_data['degraded_agents'] = degraded
+        if degraded:
+            ai_cio['degraded_agents'] = degraded
             
         return ai_tech, ai_forensic, ai_fund, ai_cio
 
-    def _format_analysis_report(self, ticker, ta_data, ai_tech, ai_forensic, ai_fund, ai_cio, bandar_summary_lines, news_summary):
+    def _format_analysis_report(self, ticker, ta_data, ai_tech, ai_forensic, ai_fund, ai_cio, bandar_summary_lines, news_summary, quant_mode=False):
         """Formats the final WhatsApp message with Professional Aesthetics."""
         try:
             # Helper for bullets
@@ -412,7 +595,14 @@ class StockAppController:
             msg += f"💡 *STRATEGY: {cio_strategy}*\n"
             msg += f"💰 *ALLOCATION: {cio_alloc}*\n"
             msg += f"📝 *CIO NOTE*: _{cio_reason}_\n"
-            msg += f"📉 *Last Price*: {ta_data['price']:.0f}\n\n"
+            msg += f"📉 *Last Price*: {ta_data['price']:.0f}\n"
+            source = "Quant" if quant_mode else "AI"
+            degraded = ta_data.get('degraded_agents') or []
+            if quant_mode:
+                msg += "⚡ _Mode Cepat: laporan kuantitatif tanpa AI._\n"
+            elif degraded:
+                msg += f"⚠️ _Mode Degradasi: {', '.join(degraded)} memakai kalkulasi otomatis (AI timeout/error)._\n"
+            msg += "\n"
             
             # --- 1. TEKNIKAL ---
             msg += "📊 *1. DATA TEKNIKAL & FLOW*\n"
@@ -437,7 +627,7 @@ class StockAppController:
             msg += f"• ROE: {val.get('roe',0)*100:.2f}% | Cap: {mc_str}\n\n"
             
             # --- 3. CHART ANALYSIS ---
-            msg += "📈 *3. ANALISA CHART (AI)*\n"
+            msg += f"📈 *3. ANALISA CHART ({source})*\n"
             msg += f"• Trend: {ta_data['trend']}\n"
             msg += f"• Support: {ta_data.get('support', 0):.0f}\n"
             msg += f"• Resistance: {ta_data.get('resistance', 0):.0f}\n"
@@ -457,7 +647,7 @@ class StockAppController:
             msg += "\n"
             
             # --- 5. EXECUTION PLAN (AI GENERATED) ---
-            msg += "⚔️ *5. TRADING PLAN (AI Level)*\n"
+            msg += f"⚔️ *5. TRADING PLAN ({source} Level)*\n"
             if trading_plan:
                 msg += f"🟢 *BUY*: {trading_plan.get('buy_area', '-')}\n"
                 msg += f"🔴 *STOP LOSS*: {trading_plan.get('stop_loss', '-')}\n"
@@ -548,10 +738,89 @@ class StockAppController:
             except Exception as e:
                 self.log(f"⚠️ Gagal menghapus chart: {e}")
 
+    # --- INTRADAY BROKER FLOW ---
+    def start_intraday_tracking(self, ticker, interval=60):
+        """Starts polling today's broker summary for `ticker` every `interval` seconds."""
+        if not self.intraday_tracker:
+            self.log("⚠️ Intraday tracking requires a GoAPI key.")
+            return False
+        self.intraday_tracker.start(ticker, interval=interval)
+        self.log(f"📊 Intraday Broker Flow tracking aktif untuk {ticker.upper()} (tiap {interval} detik).")
+        return True
+
+    def stop_intraday_tracking(self, ticker=None):
+        if self.intraday_tracker:
+            self.intraday_tracker.stop(ticker)
+
+    def get_intraday_flow(self, ticker, minutes=30):
+        """Returns (flow DataFrame, summary text) for the last N minutes of tracked broker flow."""
+        if not self.intraday_tracker:
+            return None, "Intraday tracking tidak aktif."
+        return (
+            self.intraday_tracker.get_flow_since(ticker, minutes),
+            self.intraday_tracker.summarize_flow(ticker, minutes)
+        )
+
+    # --- WATCHLIST SCAN (BATCHED AI) ---
+    def analyze_watchlist(self, tickers, style="SWING", progress_callback=None):
+        """
+        Screens several tickers with one batched Technical + Fundamental AI call per group
+        instead of one call per ticker. Returns {ticker: {'ta_data', 'ai_tech', 'ai_fund'}}.
+        """
+        import concurrent.futures
+        tickers = [t.upper() for t in tickers]
+        self.log(f"🔵 Watchlist Scan ({style}): {', '.join(tickers)}")
+        if progress_callback: progress_callback(0.1)
+
+        ta_map = {}
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {executor.submit(analyze_technical, t): t for t in tickers}
+            for future in concurrent.futures.as_completed(futures):
+                t = futures[future]
+                try:
+                    ta_data = future.result()
+                    if ta_data:
+                        ta_map[t] = ta_data
+                except Exception as e:
+                    self.log(f"⚠️ {t}: Data teknikal gagal diambil ({e}).")
+
+        if progress_callback: progress_callback(0.5)
+        if not ta_map:
+            return {}
+
+        fund_map = {
+            t: {
+                "pe_ratio": ta.get('valuation', {}).get('per', 0),
+                "pbv": ta.get('valuation', {}).get('pbv', 0),
+                "roe": ta.get('valuation', {}).get('roe', 0),
+                "der": ta.get('valuation', {}).get('der', 0),
+                "eps_growth": ta.get('valuation', {}).get('eps_growth', 0),
+            }
+            for t, ta in ta_map.items()
+        }
+
+        self.log(f"🧠 Batch AI untuk {len(ta_map)} saham...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            f_tech = executor.submit(get_technical_analysis_batch, ta_map, style)
+            f_fund = executor.submit(get_fundamental_analysis_batch, fund_map)
+            tech_res = f_tech.result()
+            fund_res = f_fund.result()
+
+        if progress_callback: progress_callback(1.0)
+        self.log("✅ Watchlist Scan Selesai.")
+        return {
+            t: {'ta_data': ta_map[t], 'ai_tech': tech_res.get(t, {}), 'ai_fund': fund_res.get(t, {})}
+            for t in ta_map
+        }
+
     # --- HISTORY & FAVORITES ---
     def get_history(self, limit=10):
         return db_manager.get_history(limit)
 
+    def get_score_history(self, ticker, days=90):
+        """Confidence score / signal time series of a ticker (oldest first)."""
+        return db_manager.get_score_history(ticker, days=days)
+
     def get_favorites(self):
         return db_manager.get_favorites()
 
@@ -562,8 +831,10 @@ class StockAppController:
         return False
 
     def remove_favorite(self, ticker):
-        db_manager.remove_favorite(ticker)
-        self.log(f"🗑️ {ticker} dihapus dari Favorit.")
+        if db_manager.remove_favorite(ticker):
+            self.log(f"🗑️ {ticker} dihapus dari Favorit.")
+            return True
+        return False
 
     def is_favorite(self, ticker):
         return db_manager.is_favorite(ticker)
@@ -615,6 +886,61 @@ class StockAppController:
             return True
         return False
 
+    # --- BULK IMPORT / EXPORT ---
+    def import_portfolio(self, source, filename=None, replace=False):
+        """
+        Loads positions from a CSV/XLSX file (e.g. a broker statement) in one transaction.
+        Default merges into existing positions with weighted average; replace=True overwrites the portfolio.
+        Returns {'imported': n, 'errors': [...]} or None if the file could not be read.
+        """
+        try:
+            items, errors = portfolio_io.parse_portfolio(portfolio_io.read_rows(source, filename))
+        except Exception as e:
+            self.log(f"❌ Import portfolio gagal: {e}")
+            return None
+        
+        if not replace:
+            current = {item['ticker']: item for item in db_manager.get_portfolio()}
+            for item in items:
+                item['avg_price'], item['lots'] = portfolio_io.merge_position(current.get(item['ticker']), item['avg_price'], item['lots'])
+        
+        if not db_manager.save_portfolio_bulk(items, replace=replace):
+            return None
+        self.log(f"💼 Imported {len(items)} portfolio positions ({'replace' if replace else 'merge'}).")
+        for err in errors:
+            self.log(f"⚠️ Import: {err}")
+        return {"imported": len(items), "errors": errors}
+
+    def export_portfolio(self, target, fmt=None):
+        """Writes the portfolio to a CSV/XLSX path or binary file-like object."""
+        try:
+            portfolio_io.export_portfolio(target, db_manager.get_portfolio(), fmt)
+            return True
+        except Exception as e:
+            self.log(f"❌ Export portfolio gagal: {e}")
+            return False
+
+    def import_favorites(self, source, filename=None, replace=False):
+        """Loads a watchlist file into Favorites in one transaction. Returns the number of tickers (None on error)."""
+        try:
+            tickers = portfolio_io.parse_watchlist(portfolio_io.read_rows(source, filename))
+        except Exception as e:
+            self.log(f"❌ Import watchlist gagal: {e}")
+            return None
+        
+        if not db_manager.add_favorites_bulk(tickers, replace=replace):
+            return None
+        self.log(f"⭐ Imported {len(tickers)} tickers ke Favorit.")
+        return len(tickers)
+
+    def export_favorites(self, target, fmt=None):
+        try:
+            portfolio_io.export_watchlist(target, db_manager.get_favorites(), fmt)
+            return True
+        except Exception as e:
+            self.log(f"❌ Export watchlist gagal: {e}")
+            return False
+
     def get_portfolio_summary(self):
         """Returns portfolio list with added Real-Time P/L data."""
         portfolio = self.get_portfolio()
@@ -742,6 +1068,8 @@ class StockAppController:
             with open(env_path, "w") as f:
                 f.writelines(new_lines)
                 
+            ai_before = (os.getenv("GOOGLE_API_KEY"), os.getenv("AI_MODEL"))
+            
             # Update current process env
             for key, val in keys_to_update.items():
                 if val:
@@ -751,14 +1079,21 @@ class StockAppController:
             load_dotenv(override=True)
             
             # --- HOT RELOAD COMPONENTS ---
+            # Drop cached Gemini model handles if the key or model changed
+            if (os.getenv("GOOGLE_API_KEY"), os.getenv("AI_MODEL")) != ai_before:
+                catalyst_agent.reset_model_registry()
+            
             # Re-initialize GoAPI Client and Quant Engine with new keys
+            self.stop_intraday_tracking()
             if os.getenv("GOAPI_API_KEY") and GoApiClient:
                 self.log("🔄 Reloading GoAPI Client & Quant Engine...")
                 self.goapi_client = GoApiClient()
                 self.quant_engine = QuantAnalyzer(self.goapi_client)
+                self.intraday_tracker = IntradayBrokerTracker(self.goapi_client, self.quant_engine)
             else:
                 self.goapi_client = None
                 self.quant_engine = QuantAnalyzer(None)
+                self.intraday_tracker = None
             
             self.log("✅ Configuration saved to .env")
             return True
@@ -0,0 +1,113 @@
+import os
+import json
+import threading
+import pandas as pd
+
+# Broker class bit flags (combinable for mask lookups)
+RETAIL = 1
+INSTITUTION = 2
+FOREIGN = 4
+LOCAL_BIG = 8
+SMART_MONEY = INSTITUTION | FOREIGN
+
+CLASS_FLAGS = {
+    "retail": RETAIL,
+    "institution": INSTITUTION,
+    "foreign": FOREIGN,
+    "local_big": LOCAL_BIG,
+}
+CLASS_NAMES = {flag: name for name, flag in CLASS_FLAGS.items()}
+
+# Default classification of IDX broker codes.
+# Override/extend with a JSON file ({"XX": "retail", ...}) via BROKER_REGISTRY_PATH.
+DEFAULT_BROKERS = {
+    # Retail (online/mass-market brokers)
+    "YP": "retail", "PD": "retail", "CC": "retail", "NI": "retail",
+    "XC": "retail", "XL": "retail", "KK": "retail",
+    # Foreign institutions
+    "BK": "foreign", "ZP": "foreign", "AK": "foreign", "KZ": "foreign",
+    "RX": "foreign", "CS": "foreign", "CG": "foreign",
+    # Local institutions
+    "DX": "institution", "OD": "institution",
+    # Mixed / local big players
+    "MG": "local_big", "LG": "local_big", "IF": "local_big", "DR": "local_big",
+}
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "broker_registry.json")
+
+
+class BrokerRegistry:
+    def __init__(self, mapping):
+        """
+        :param mapping: {broker_code: class_name} where class_name is one of CLASS_FLAGS.
+        """
+        self.flags = {}
+        for code, cls in mapping.items():
+            flag = CLASS_FLAGS.get(str(cls).lower())
+            if flag is None:
+                print(f"Warning: Unknown broker class '{cls}' for {code}. Skipped.")
+                continue
+            self.flags[str(code).upper()] = flag
+
+        self.retail = self._codes(RETAIL)
+        self.institution = self._codes(INSTITUTION)
+        self.foreign = self._codes(FOREIGN)
+        self.local_big = self._codes(LOCAL_BIG)
+        self.smart_money = self.institution | self.foreign
+
+    def _codes(self, mask):
+        return frozenset(code for code, flag in self.flags.items() if flag & mask)
+
+    def flag(self, code):
+        """Returns the class bit flag of a broker code (0 if unknown)."""
+        return self.flags.get(code, 0)
+
+    def classify(self, code):
+        """Returns the class name of a broker code ('unknown' if not registered)."""
+        return CLASS_NAMES.get(self.flags.get(code, 0), "unknown")
+
+    def flag_array(self, codes):
+        """Vectorised flag lookup for a column/index of broker codes. Returns an int ndarray."""
+        return pd.Index(codes).map(self.flags).fillna(0).to_numpy(dtype=int)
+
+    def classify_series(self, codes):
+        """Vectorised class-name lookup for a column of broker codes."""
+        flags = pd.Series(self.flag_array(codes), index=getattr(codes, 'index', None))
+        return flags.map(CLASS_NAMES).fillna("unknown")
+
+    def prompt_hint(self):
+        """Broker intelligence lines for the Bandarmology agent prompt."""
+        def fmt(codes):
+            return ", ".join(sorted(codes)) or "-"
+
+        return (
+            f"- RETAIL: {fmt(self.retail)} (Jika mereka Top Buyer -> Kemungkinan Distribusi / Retail Domination).\n"
+            f"    - INSTITUTION/ASING: {fmt(self.smart_money)} (Jika mereka Top Buyer -> Akumulasi Institusi).\n"
+            f"    - MIXED/LOCAL BIG: {fmt(self.local_big)}."
+        )
+
+
+def load_registry(path=None):
+    """Builds a registry from the defaults, overlaid with the JSON file at `path` if it exists."""
+    mapping = dict(DEFAULT_BROKERS)
+    path = path or os.getenv("BROKER_REGISTRY_PATH", DEFAULT_REGISTRY_PATH)
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                mapping.update({k.upper(): v for k, v in json.load(f).items()})
+        except Exception as e:
+            print(f"Warning: Failed to load broker registry '{path}': {e}")
+    return BrokerRegistry(mapping)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Returns the process-wide broker registry (loaded once)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_registry()
+    return _registry
@@ -1,83 +1,153 @@
 import os
-import google.generativeai as genai
-from datetime import datetime
+import abc
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import json
-import re
+import hashlib
+import math
+import time
+import threading
+import concurrent.futures
+from collections import deque
+from broker_registry import get_registry
+from market_hours import is_market_open, next_session_start
+import db_manager
+import prompt_builder as pb
+import agent_schemas
+from llm_scheduler import get_scheduler, INTERACTIVE, BACKGROUND
 
 # Load environment variables
 load_dotenv()
 
-def _get_model():
-    """Helper to configure and return the Gemini model."""
-    current_api_key = os.getenv("GOOGLE_API_KEY")
-    if not current_api_key:
+# --- LLM BACKENDS ---
+# Agents talk to a backend that builds model handles exposing the genai interface:
+# model.generate_content(prompt, stream=True) yielding chunks with .text (and
+# .usage_metadata). GeminiBackend is the production backend; llm_stub.StubBackend
+# is an offline stand-in for load/latency testing (LLM_BACKEND=stub).
+class LLMBackend(abc.ABC):
+    name = "base"
+    
+    def is_available(self):
+        return True
+    
+    def credentials(self):
+        """Value identifying the active credentials (part of the model registry key)."""
         return None
     
-    genai.configure(api_key=current_api_key)
-    model_name = os.getenv("AI_MODEL", "gemini-1.5-flash")
+    @abc.abstractmethod
+    def create_model(self, model_name, agent=None, tools=None, system_instruction=None):
+        """Model object for `agent` exposing generate_content(prompt, stream=True)."""
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
     
-    tools = [{"google_search": {}}]
-    try:
-        return genai.GenerativeModel(model_name, tools=tools)
-    except:
-        print("Warning: Google Search Grounding not supported. Using standard model.")
-        return genai.GenerativeModel(model_name)
-
-def _clean_json_response(text):
-    """Helper to extract and parse JSON from AI response."""
-    match = re.search(r'\{.*\}', text, re.DOTALL)
-    if match:
+    def __init__(self):
+        self._configured_api_key = None
+    
+    def is_available(self):
+        return genai is not None and bool(os.getenv("GOOGLE_API_KEY"))
+    
+    def credentials(self):
+        return os.getenv("GOOGLE_API_KEY")
+    
+    def create_model(self, model_name, agent=None, tools=None, system_instruction=None):
+        # genai.configure is process-global, so it only re-runs on key change
+        current_api_key = os.getenv("GOOGLE_API_KEY")
+        if self._configured_api_key != current_api_key:
+            genai.configure(api_key=current_api_key)
+            self._configured_api_key = current_api_key
+        
+        extra = {"system_instruction": system_instruction} if system_instruction else {}
+        if not tools and JSON_MODE_ENABLED and agent in agent_schemas.SCHEMAS:
+            # Gemini rejects response_mime_type together with tools (grounding)
+            extra["generation_config"] = {
+                "response_mime_type": "application/json",
+                "response_schema": agent_schemas.response_schema(agent),
+            }
         try:
-            return json.loads(match.group(0))
+            return genai.GenerativeModel(model_name, tools=tools, **extra) if tools else genai.GenerativeModel(model_name, **extra)
         except:
-            pass
-
-    if text.startswith("```json"):
-        text = text.replace("```json", "").replace("```", "").strip()
-
-    try:
-        return json.loads(text)
-    except:
-        return {
-            "sentiment_score": 50,
-            "analysis": text,
-            "status": "ERROR",
-            "action": "WAIT"
-        }
-
-# --- 1. TECHNICAL AGENT (USER VERSION) ---
-def get_technical_analysis(ticker, ta_data, news_summary="", style="SWING"):
+            print("Warning: Google Search Grounding not supported. Using standard model.")
+            return genai.GenerativeModel(model_name, **extra)
+
+def _backend_from_env():
+    if os.getenv("LLM_BACKEND", "gemini").lower() == "stub":
+        from llm_stub import StubBackend
+        return StubBackend.from_env()
+    return GeminiBackend()
+
+_backend = None
+
+def get_llm_backend():
+    global _backend
+    if _backend is None:
+        _backend = _backend_from_env()
+    return _backend
+
+def set_llm_backend(backend):
+    """Swaps the LLM backend (None = re-read LLM_BACKEND from env) and drops cached model handles."""
+    global _backend
+    _backend = backend
+    reset_model_registry()
+
+# --- MODEL REGISTRY ---
+# Model handles are built once per (backend, credentials, model name, agent, tools,
+# system instruction) and reused by every agent call.
+# Each agent's static instructions are bound to its handle as system_instruction.
+# Search grounding can be disabled (AI_GROUNDING=0); the agents only use supplied data,
+# and tool-less models can be asked for schema-constrained JSON output (AI_JSON_MODE).
+DEFAULT_TOOLS = [{"google_search": {}}] if os.getenv("AI_GROUNDING", "1") != "0" else None
+JSON_MODE_ENABLED = os.getenv("AI_JSON_MODE", "1") != "0"
+
+_model_registry = {}
+_model_lock = threading.Lock()
+
+def _get_model(agent=None, tools=DEFAULT_TOOLS, system_instruction=None):
+    """Helper to return the (cached) model handle for the active backend, AI_MODEL and system instruction."""
+    backend = get_llm_backend()
+    if not backend.is_available():
+        return None
+    
+    model_name = os.getenv("AI_MODEL", "gemini-1.5-flash")
+    key = (backend.name, backend.credentials(), model_name, agent, json.dumps(tools, sort_keys=True), system_instruction)
+    
+    model = _model_registry.get(key)
+    if model is not None:
+        return model
+    
+    with _model_lock:
+        model = _model_registry.get(key)
+        if model is None:
+            model = backend.create_model(model_name, agent=agent, tools=tools, system_instruction=system_instruction)
+            _model_registry[key] = model
+    return model
+
+def reset_model_registry():
+    """Drops all cached model handles (call after API key / model / backend changes)."""
+    with _model_lock:
+        _model_registry.clear()
+        if isinstance(_backend, GeminiBackend):
+            _backend._configured_api_key = None
+
+def _with_defaults(agent, **fields):
+    """Schema-complete result for non-LLM answers (missing key, errors)."""
+    return {**agent_schemas.defaults(agent), **fields}
+
+# --- DETERMINISTIC TRADING PLAN ---
+def calculate_trading_plan(ta_data, style="SWING"):
     """
-    Supercharged Technical Agent.
-    Focus: Market Structure, Trend, Momentum, Volatility.
-    Style: SCALPING / SWING / INVESTING
+    Computes the style-specific SL/TP plan from technical data (no LLM involved).
+    Returns dict: price, stop_loss, target_profit (0 = open target), target_str,
+                  buy_area_low, label, note.
     """
-    model = _get_model()
-    if not model: return {"sentiment_score": 50, "analysis": "API Key Missing"}
-
-    print(f"Catalyst: Running Technical Strategy ({style}) for {ticker}...")
-    
-    # Dynamic Role & Focus
-    role = "Senior Trader & Risk Manager"
-    focus = "Swing Trading (Follow Trend)"
-    sl_rule = "Standard (1 ATR)"
-    
-    if style == "SCALPING":
-        role = "Aggressive Day Trader (Scalper)"
-        focus = "Intraday Momentum & Volatility Spikes"
-        sl_rule = "Tight (Low Risk)"
-    elif style == "INVESTING":
-        role = "Long-Term Technical Analyst"
-        focus = "Major Trend & key Support/Resistance (Ignore Noise)"
-        sl_rule = "Loose (Major Support)"
-
-    # --- DYNAMIC PLAN CALCULATION (USER REFINED STRATEGIES) ---
     current_price = ta_data['price']
     atr = ta_data.get('atr', current_price * 0.02)
     pivots = ta_data.get('pivots', {})
     w_ema50 = ta_data.get('weekly_ema50', 0)
-    ema20 = ta_data.get('ema20', 0)
     
     calc_sl = 0
     calc_tp = 0
@@ -132,312 +202,584 @@ def get_technical_analysis(ticker, ta_data, news_summary="", style="SWING"):
 
     # Format TP string for output
     tp_str = f"{calc_tp:.0f}" if calc_tp > 0 else "OPEN (Run Trend)"
+    
+    return {
+        "price": current_price,
+        "stop_loss": calc_sl,
+        "target_profit": calc_tp,
+        "target_str": tp_str,
+        "buy_area_low": ta_data.get('support', 0),
+        "label": plan_label,
+        "note": extra_note
+    }
+
+# --- LLM RESPONSE CACHE ---
+# Parsed agent responses are cached in the DB, keyed by a hash of (agent, model, prompt).
+# Prompts only carry market data, so an unchanged prompt means unchanged inputs.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+FUNDAMENTAL_TTL = timedelta(days=1)
+INTRADAY_TTL = {"SCALPING": timedelta(minutes=5)}
+DEFAULT_INTRADAY_TTL = timedelta(minutes=15)
+
+_cache_stats = {}
+_cache_stats_lock = threading.Lock()
 
-    prompt = f"""
-    Bertindaklah sebagai {role}. 
-    Tugasmu bukan hanya membaca indikator, tapi menyusun TRADING PLAN ({focus}) untuk saham {ticker}.
-    
-    [STRATEGY CONTEXT: {style}]
-    - SCALPING: Prioritaskan Volume Spikes, DOM, & Momentum jangka pendek. Hiraukan Valuasi.
-    - SWING: Cari Trend Follow atau Reversal Confirmation yang valid.
-    - INVESTING: Cari Entry point di Support Kuat (Buy on Weakness) untuk jangka panjang.
-    
-    [ANTI-HALLUCINATION POLICY]:
-    1. STRICTLY use the provided data below. Do NOT invent numbers.
-    2. If data is 'N/A' or 0, state it as "Unknown" or "Neutral".
-    3. Do not assume news if not provided in "BERITA & SENTIMEN".
-    4. LANGUAGE: STRICTLY INDONESIAN (BAHASA INDONESIA). Do not use English for the analysis text.
-
-    DATA PASAR (DATAFAKTA):
-    - Harga Terakhir: {ta_data['price']:.0f}
-    - Tren (ADX {ta_data.get('adx', 0):.2f}): {ta_data['trend']} (Kondisi: {'>25=Strong Trend' if ta_data.get('adx',0)>25 else '<20=Choppy/Sideways'})
-    - Volume: {ta_data['vol_status']} ({ta_data['vol_ratio']:.2f}x rata-rata). 
-      (Note: Jika harga turun tapi volume meledak >2x, waspada panic selling/distribution).
-    - Momentum (RSI): {ta_data['rsi']:.2f} | (MACD): {ta_data['macd_status']}
-    - Volatilitas (ATR): {ta_data.get('atr', 0):.0f} (Gunakan ini untuk tentukan jarak Stop Loss).
-    
-    DATA HISTORIS SINGKAT:
-    {ta_data.get('recent_history', 'N/A')}
-    
-    LEVEL PIVOT & FIBONACCI (SUPPORT/RESISTANCE REFERENSI):
-    - Pivot: {ta_data.get('pivots', {}).get('pivot', 'N/A')}
-    - Support (Classic): S1={ta_data.get('pivots', {}).get('s1', 'N/A')}, S2={ta_data.get('pivots', {}).get('s2', 'N/A')}
-    - Resistance (Classic): R1={ta_data.get('pivots', {}).get('r1', 'N/A')}, R2={ta_data.get('pivots', {}).get('r2', 'N/A')}
-    
-    - Fibonacci Retracement:
-      0.236: {ta_data.get('fib_levels', {}).get(0.236, 'N/A'):.0f}
-      0.382: {ta_data.get('fib_levels', {}).get(0.382, 'N/A'):.0f} (Key Support)
-      0.618: {ta_data.get('fib_levels', {}).get(0.618, 'N/A'):.0f} (Golden Pocket)
-
-    [CALCULATED TRADING PLAN ({plan_label})]:
-    - BUY AREA: {ta_data.get('support', 0):.0f} - {current_price:.0f} (atau dekat EMA20)
-    - STOP LOSS: {calc_sl:.0f}
-    - TARGET PROFIT: {tp_str}
-    
-    (PENTING: Gunakan angka kalkulasi di atas sebagai REFERENSI UTAMA. {extra_note} Pertahankan Risk Profile ini.)
-
-
-    BERITA & SENTIMEN:
-    {news_summary}
-
-    TUGAS ANALISIS (Thinking Process):
-    1. Cek Market Structure: Apakah Higher High (Uptrend) atau Lower Low (Downtrend)?
-    2. Cek Divergence: Apakah ada anomali antara Harga vs Indikator?
-    3. Tentukan Skenario:
-       - Skenario Bullish (Jika breakout/rebound).
-       - Skenario Bearish (Jika breakdown).
-
-    OUTPUT YANG DIMINTA (JSON):
-    {{
-        "sentiment_score": (0-100, <40=Bearish, >60=Bullish),
-        "analysis": "Analisis teknikal padat (max 150 kata). Fokus pada Price Action & Volume.",
-        "action": "BUY_ON_WEAKNESS / BUY_ON_BREAKOUT / WAIT_AND_SEE / SELL / AVOID",
-        "trading_plan": {{
-            "buy_area": "Range harga beli (Wajib isi, jika Bearish isi area Support terdekat untuk pantau)",
-            "stop_loss": "Harga SL (Critical Support - 1 ATR)",
-            "target_profit": "Target harga (Resistance)"
-        }},
-        "plan_note": "Isi pesan tambahan jika plan ini high risk atau 'Wait for Confirmation'"
-    }}
+def _cache_key(agent, model_name, prompt, system=""):
+    normalized = " ".join(f"{system}\n{prompt}".split())
+    return hashlib.sha256(f"{agent}|{model_name}|{normalized}".encode("utf-8")).hexdigest()
+
+def _cache_expiry(agent, style=None):
+    """
+    Fundamentals are valid for a day. Market-driven agents are valid until the
+    next bar: a short window while IDX is trading, otherwise until the next session opens.
+    """
+    now = datetime.now()
+    if agent.startswith("fundamental"):
+        return now + FUNDAMENTAL_TTL
+    if is_market_open():
+        return now + INTRADAY_TTL.get(style, DEFAULT_INTRADAY_TTL)
+    session_start = next_session_start().astimezone().replace(tzinfo=None)
+    return max(session_start, now + DEFAULT_INTRADAY_TTL)
+
+def _record_cache(agent, hit):
+    with _cache_stats_lock:
+        stats = _cache_stats.setdefault(agent, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+def get_llm_cache_stats():
+    """Returns {agent: {'hits', 'misses', 'hit_ratio'}} plus a 'total' entry."""
+    with _cache_stats_lock:
+        report = {agent: dict(v) for agent, v in _cache_stats.items()}
+    total = {"hits": sum(v["hits"] for v in report.values()), "misses": sum(v["misses"] for v in report.values())}
+    report["total"] = total
+    for v in report.values():
+        calls = v["hits"] + v["misses"]
+        v["hit_ratio"] = round(v["hits"] / calls, 3) if calls else 0.0
+    return report
+
+def _stream_text(agent, model, prompt, on_progress=None, opener="{", system="", cancel=None):
     """
+    Consumes a streaming Gemini response, reporting partial text via on_progress(agent, text).
+    Stops reading as soon as the top-level JSON object (or array) closes, or when the
+    `cancel` event is set (the other request of a hedged pair won).
+    The measured prompt token count (usage metadata) is fed to prompt_builder.
+    """
+    text = ""
+    scanner = agent_schemas.JsonScanner(opener)
+    prompt_tokens = 0
+    for chunk in model.generate_content(prompt, stream=True):
+        if cancel is not None and cancel.is_set():
+            break # Dropping the stream stops further output tokens
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", 0):
+            prompt_tokens = usage.prompt_token_count
+        try:
+            piece = chunk.text
+        except ValueError:
+            continue # Chunk without text parts (e.g. grounding metadata only)
+        text += piece
+        if on_progress:
+            on_progress(agent, text)
+        if scanner.feed(piece):
+            break
+    model_name = getattr(model, "model_name", None)
+    pb.record_usage(agent, model_name, len(system) + len(prompt), prompt_tokens)
+    return text
+
+# --- LATENCY BUDGETS & HEDGED REQUESTS ---
+# If a call runs longer than the agent's p95 latency, a duplicate request is
+# issued and whichever returns first wins. Until enough samples exist the
+# static soft budget is used.
+HEDGE_ENABLED = os.getenv("AI_HEDGE", "1") != "0"
+SOFT_BUDGET = {"technical": 20.0, "bandarmology": 20.0, "fundamental": 15.0, "cio": 20.0}
+MIN_LATENCY_SAMPLES = 5
+
+_latencies = {}
+_latency_lock = threading.Lock()
+# Threads may sit in the scheduler queue, so the pool is sized above LLM_MAX_CONCURRENCY
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+def _record_latency(agent, seconds):
+    with _latency_lock:
+        _latencies.setdefault(agent, deque(maxlen=50)).append(seconds)
+
+def get_latency_p95(agent):
+    """p95 of recent successful call latencies (seconds), or the static soft budget."""
+    with _latency_lock:
+        samples = sorted(_latencies.get(agent, ()))
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return SOFT_BUDGET.get(agent, 20.0)
+    return samples[max(0, math.ceil(0.95 * len(samples)) - 1)]
+
+def _scheduled(fn, priority, started=None, cancel=None):
+    """
+    Runs fn(cancel) inside a global LLM scheduler slot. Returns (result, call start time).
+    A request cancelled while still queued gives its slot back without calling the API.
+    """
+    scheduler = get_scheduler()
+    scheduler.acquire(priority)
+    call_start = time.monotonic()
+    if started is not None:
+        started.set()
     try:
-        response = model.generate_content(prompt)
-        return _clean_json_response(response.text.strip())
+        if cancel is not None and cancel.is_set():
+            return None, call_start
+        return fn(cancel), call_start
+    finally:
+        scheduler.release()
+
+def _hedged_call(agent, fn, priority=INTERACTIVE):
+    """
+    Runs fn(cancel) through the LLM scheduler; if it exceeds the agent's p95 (measured from
+    when it got its slot), races a duplicate call and returns the first result.
+    Hedges are only sent when the scheduler has a free slot, never queued behind real work.
+    The losing request gets its `cancel` event set: fn must stop streaming when it sees it,
+    so the loser frees its scheduler slot and stops consuming output tokens.
+    """
+    if not HEDGE_ENABLED:
+        result, call_start = _scheduled(fn, priority)
+        _record_latency(agent, time.monotonic() - call_start)
+        return result
+    
+    started = threading.Event()
+    primary_cancel = threading.Event()
+    primary = _hedge_executor.submit(_scheduled, fn, priority, started, primary_cancel)
+    while not started.wait(0.5) and not primary.done():
+        pass # Still queued in the scheduler
+    
+    pending = {primary}
+    events = {primary: primary_cancel}
+    done, _ = concurrent.futures.wait(pending, timeout=get_latency_p95(agent))
+    if not done and get_scheduler().has_capacity():
+        print(f"Catalyst: {agent} slower than p95 ({get_latency_p95(agent):.1f}s). Sending hedged request...")
+        hedge_cancel = threading.Event()
+        hedge = _hedge_executor.submit(_scheduled, fn, priority, None, hedge_cancel)
+        pending.add(hedge)
+        events[hedge] = hedge_cancel
+    
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in done:
+            try:
+                result, call_start = f.result()
+            except Exception as e:
+                error = e # Keep waiting for the other request, if any
+                continue
+            for other in pending:
+                events[other].set() # Running stream stops at its next chunk
+                other.cancel()
+            _record_latency(agent, time.monotonic() - call_start)
+            return result
+    raise error
+
+def _generate_json(agent, model, prompt, style=None, on_progress=None, batch=False, system="", priority=INTERACTIVE):
+    """
+    Runs the prompt through the LLM response cache, calling Gemini only on a miss.
+    batch=True expects a JSON array (list of dicts) instead of a single object.
+    system: the system instruction bound to `model` (part of the cache key).
+    priority: llm_scheduler class of the request (cache hits never queue).
+    """
+    model_name = getattr(model, "model_name", os.getenv("AI_MODEL", ""))
+    key = _cache_key(agent, model_name, prompt, system)
+    
+    if LLM_CACHE_ENABLED:
+        try:
+            cached = db_manager.get_llm_cache(key)
+        except Exception as e:
+            cached = None
+            print(f"LLM cache read failed: {e}")
+        if cached is not None:
+            _record_cache(agent, True)
+            return cached
+        _record_cache(agent, False)
+    
+    opener = "[" if batch else "{"
+    text = _hedged_call(agent, lambda cancel: _stream_text(agent, model, prompt, on_progress, opener, system, cancel), priority)
+    result = agent_schemas.parse_response(agent, text)
+    
+    valid = bool(result) if batch else not (result.get("parse_error") or result.get("partial"))
+    if LLM_CACHE_ENABLED and valid:
+        try:
+            db_manager.save_llm_cache(key, agent, model_name, result, _cache_expiry(agent, style))
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+    return result
+
+# --- 1. TECHNICAL AGENT (USER VERSION) ---
+def get_technical_analysis(ticker, ta_data, news_summary="", style="SWING", on_progress=None, priority=INTERACTIVE):
+    """
+    Supercharged Technical Agent.
+    Focus: Market Structure, Trend, Momentum, Volatility.
+    Style: SCALPING / SWING / INVESTING
+    """
+    system = pb.technical_system(style)
+    model = _get_model("technical", system_instruction=system)
+    if not model: return _with_defaults("technical", analysis="API Key Missing")
+
+    print(f"Catalyst: Running Technical Strategy ({style}) for {ticker}...")
+    
+    # --- DYNAMIC PLAN CALCULATION (USER REFINED STRATEGIES) ---
+    plan = calculate_trading_plan(ta_data, style)
+    model_name = getattr(model, "model_name", None)
+    
+    prompt = pb.fit_to_budget([
+        (pb.technical_block(ticker, ta_data, plan), False),
+        (f"news: {news_summary}" if news_summary else None, False),
+        (f"hist:\n{pb.compact_history(ta_data.get('recent_history'))}" if pb.compact_history(ta_data.get('recent_history')) else None, True),
+    ], pb.TOKEN_BUDGET["technical"], model_name)
+    
+    try:
+        return _generate_json("technical", model, prompt, style=style, on_progress=on_progress, system=system, priority=priority)
     except Exception as e:
-        return {"sentiment_score": 50, "analysis": f"Error: {e}"}
+        return _with_defaults("technical", analysis=f"Error: {e}")
 
 # --- 2. BANDARMOLOGY AGENT (UPDATED USER VERSION) ---
-def get_bandarmology_analysis(ticker, context_data):
+def get_bandarmology_analysis(ticker, context_data, on_progress=None, priority=INTERACTIVE):
     """
     Forensic Bandarmology Agent.
     Includes Foreign Flow, Valuation Context, and Detailed Broker Forensics.
     """
-    model = _get_model()
-    if not model: return {"sentiment_score": 50, "analysis": "API Key Missing"}
+    system = pb.bandarmology_system(get_registry().prompt_hint())
+    model = _get_model("bandarmology", system_instruction=system)
+    if not model: return _with_defaults("bandarmology", analysis="API Key Missing")
 
     print(f"Catalyst: Running Bandarmology Forensics for {ticker}...")
     
-    # Extract Context
-    bs_today = context_data.get('today_summary', 'N/A')
-    seller_code = context_data.get('top_seller', 'N/A')
-    seller_hist = context_data.get('seller_hist_net', 'N/A')
-    avg_price_seller = context_data.get('seller_avg_price', 0)
-    
-    # Extract Additional Context
-    vwap = context_data.get('vwap', 0)
-    price_change = context_data.get('price_change', 0)
-    top1_buy_price = context_data.get('top1_buy_price', 0)
-    
-    # Granular Broker Data
-    top3_buyers_raw = context_data.get('top3_buyers', '-')
-    top3_sellers_raw = context_data.get('top3_sellers', '-')
-    
-    # Valuation & Foreign
-    pbv = context_data.get('pbv', 0)
-    per = context_data.get('per', 0)
-    market_cap = context_data.get('market_cap', 0)
-    foreign_flow = context_data.get('foreign_flow', 'N/A')
-    
     # Format Market Cap
-    if market_cap > 1_000_000_000_000: mcap_str = f"{market_cap/1e12:.2f} Triliun"
-    elif market_cap > 1_000_000_000: mcap_str = f"{market_cap/1e9:.0f} Miliar"
-    else: mcap_str = f"{market_cap:,.0f}"
-    
-    prompt = f"""
-    ROLE: Investigator Bandarmologi Profesional (Market Flow Detective).
-    TUGAS: Analisis aliran dana institusi (smart money) menggunakan metode TOP-DOWN (Peta Besar vs Trigger Harian).
-
-    [DATA INTEGRITY RULES]:
-    1. Base your analysis PURELY on the Forensik Data below.
-    2. LANGUAGE: STRICTLY INDONESIAN (BAHASA INDONESIA).
-    3. CITATION MANDATORY: You MUST explicitly mention the timeframe defined in [PETA BESAR] (e.g. "Dalam 20 hari terakhir...").
-    
-    [BROKER INTELLIGENCE (HINTS)]:
-    - RETAIL: YP, PD, CC, NI, XC (Jika mereka Top Buyer -> Kemungkinan Distribusi / Retail Domination).
-    - INSTITUTION/ASING: BK, KZ, AK, ZP, RX (Jika mereka Top Buyer -> Akumulasi Institusi).
-    - MIXED/LOCAL BIG: MG, LG, IF, DR.
-    
-    --- DATA FORENSIK ---
-    
-    1. THE MAP (PETA BESAR - {context_data.get('periodic_period', 'N/A')} Hari Terakhir):
-    - Fase: {context_data.get('periodic_status', 'N/A')}
-    - Penguasa: {context_data.get('periodic_buyer_type', 'N/A')}
-    - Top Accumulator: {context_data.get('periodic_top_accum', 'N/A')}
-    - Avg Price Bandar: {context_data.get('periodic_avg_price', 0):,.0f} (vs Harga Market: {context_data.get('market_price', 0):,.0f})
-    
-    2. THE TRIGGER (HARI INI):
-    - Status Hari Ini: {bs_today}
-    - Top 3 Buyer: {top3_buyers_raw}
-    - Top 3 Seller: {top3_sellers_raw}
-    - Dominasi Volume: {context_data.get('daily_dominance', 'N/A')}
-    
-    [VALUASI & CONTEXT]:
-    - Market Cap: {mcap_str}
-    - PBV: {pbv:.2f}x
-    - Foreign Flow: {foreign_flow}
-    
-    --- LOGIKA DETEKSI (TOP-DOWN ANALYSIS) ---
-    Gunakan logika ini untuk kesimpulan:
-    
-    1. [STRONG BUY SIGNAL]: 
-       - Peta Besar = AKUMULASI (Institusi).
-       - Harga Market DEKAT dengan Avg Price Bandar.
-       - Trigger Hari Ini = AKUMULASI (Institusi beli lagi).
-       
-    2. [JEBAKAN / TRAP / DISTRIBUTION]:
-       - Peta Besar = DISTRIBUSI.
-       - Trigger Hari Ini = Akumulasi RETAIL (YP/PD Top Buyer) -> Ini bukan akumulasi asli, tapi pancingan.
-       - Tindakan: Hati-hati / Sell on Strength.
-       
-    3. [MARKDOWN ACCUMULATION]:
-       - Peta Besar = Akumulasi.
-       - Trigger Hari Ini = Harga Turun tapi Institusi tampung (Net Buy) atau Asing Masuk.
-       - Tindakan: Cicil Beli (Buy on Weakness).
-
-    --- FORMAT OUTPUT JSON ---
-    {{
-        "sentiment_score": (0=Distribusi Total, 50=Netral, 100=Strong Accumulation),
-        "status": "DISTRIBUSI / AKUMULASI / MARK-DOWN / CHURNING",
-        "analysis": "Analisis naratif tajam (Max 150 kata). WAJIB MENCANTUMKAN DURASI (misal: 'Dalam 20 hari terakhir...'). Fokus pada siapa pemain utama (Retail vs Institusi) berdasarkan Kode Broker.",
-        "action": "BUY / WAIT / SELL"
-    }}
-    """
+    market_cap = context_data.get('market_cap', 0) or 0
+    if market_cap > 1_000_000_000_000: mcap_str = f"{market_cap/1e12:.2f}T"
+    elif market_cap > 1_000_000_000: mcap_str = f"{market_cap/1e9:.0f}M"
+    else: mcap_str = pb.fmt_num(market_cap)
+    
+    the_map = f"MAP({context_data.get('periodic_period', 'N/A')}D) " + pb.kv(
+        fase=context_data.get('periodic_status', 'N/A'),
+        penguasa=context_data.get('periodic_buyer_type', 'N/A'),
+        top_accum=context_data.get('periodic_top_accum', 'N/A'),
+        bandar_avg=pb.fmt_num(context_data.get('periodic_avg_price', 0)),
+        px=pb.fmt_num(context_data.get('market_price', 0)),
+    )
+    trigger = "\n".join([
+        f"TRIGGER status: {context_data.get('today_summary', 'N/A')}",
+        f"top3_buy: {context_data.get('top3_buyers', '-')}",
+        f"top3_sell: {context_data.get('top3_sellers', '-')}",
+        "TRIGGER " + pb.kv(
+            dominasi=context_data.get('daily_dominance', 'N/A'),
+            chg=f"{pb.fmt_num(context_data.get('price_change', 0), 2)}%",
+            vwap=pb.fmt_num(context_data.get('vwap', 0)),
+        ),
+    ])
+    seller = "seller " + pb.kv(
+        kode=context_data.get('top_seller', 'N/A'),
+        hist=str(context_data.get('seller_hist_net', 'N/A')).replace(" ", ""),
+        avg=context_data.get('seller_avg_price', 0),
+    )
+    context = pb.kv(mcap=mcap_str, pbv=f"{pb.fmt_num(context_data.get('pbv', 0), 2)}x") + \
+        f"\nforeign: {context_data.get('foreign_flow', 'N/A')}"
+    
+    prompt = pb.fit_to_budget([
+        (f"[{ticker}] DATA FORENSIK", False),
+        (the_map, False),
+        (trigger, False),
+        (context, False),
+        (seller, True),
+    ], pb.TOKEN_BUDGET["bandarmology"], getattr(model, "model_name", None))
+    
     try:
-        response = model.generate_content(prompt)
-        return _clean_json_response(response.text.strip())
+        return _generate_json("bandarmology", model, prompt, on_progress=on_progress, system=system, priority=priority)
     except Exception as e:
-        return {"sentiment_score": 50, "analysis": f"Error: {e}"}
+        return _with_defaults("bandarmology", analysis=f"Error: {e}")
 
 # --- 3. FUNDAMENTAL AGENT (ADDED) ---
-def get_fundamental_analysis(ticker, financial_data):
+def get_fundamental_analysis(ticker, financial_data, on_progress=None, priority=INTERACTIVE):
     """
     Fundamental Agent.
     Focus: Valuation (Cheap/Expensive) & Health (Safe/Risky).
     """
-    model = _get_model()
-    if not model: return {"sentiment_score": 50, "analysis": "API Key Missing"}
+    system = pb.fundamental_system()
+    model = _get_model("fundamental", system_instruction=system)
+    if not model: return _with_defaults("fundamental", analysis="API Key Missing")
 
     print(f"Catalyst: Running Fundamental Scan for {ticker}...")
 
-    prompt = f"""
-    Bertindaklah sebagai Senior Equity Research Analyst (Value Investing approach).
-    Analisis kesehatan finansial emiten {ticker}.
-    
-    [STRICT DATA ONLY]:
-    - Use the provided Financial Data ratios.
-    - Do not retrieve outside data.
-    - If a ratio is 'N/A', ignore it or label as 'Data Unavailable'.
-    - LANGUAGE: STRICTLY INDONESIAN (BAHASA INDONESIA). Use formal investment terms in Indonesian.
-
-    DATA KEUANGAN:
-    - PE Ratio: {financial_data.get('pe_ratio', 'N/A')}
-    - PBV: {financial_data.get('pbv', 'N/A')}
-    - ROE: {financial_data.get('roe', 'N/A')}%
-    - DER (Debt to Equity): {financial_data.get('der', 'N/A')}x
-    - EPS Growth (YoY): {financial_data.get('eps_growth', 'N/A')}%
-
-    TUGAS:
-    1. Valuasi: Apakah saham ini Undervalued, Fair, atau Overvalued?
-    2. Kesehatan: Apakah utang aman (DER < 1.5)? Profitabilitas kuat (ROE > 10%)?
-    3. Growth: Apakah perusahaan bertumbuh?
-
-    OUTPUT JSON:
-    {{
-        "sentiment_score": (0-100, <40=Bad Fundamentals, >70=Strong Fundamentals),
-        "valuation_status": "UNDERVALUED / FAIR / OVERVALUED",
-        "financial_health": "HEALTHY / RISKY / DISTRESS",
-        "analysis": "Ringkasan fundamental max 100 kata. Highlight rasio kunci."
-    }}
-    """
+    prompt = pb.fit_to_budget([
+        (f"[{ticker}] " + _fundamental_fields(financial_data), False),
+    ], pb.TOKEN_BUDGET["fundamental"], getattr(model, "model_name", None))
+    
     try:
-        response = model.generate_content(prompt)
-        return _clean_json_response(response.text.strip())
+        return _generate_json("fundamental", model, prompt, on_progress=on_progress, system=system, priority=priority)
     except Exception as e:
-        return {"sentiment_score": 50, "analysis": f"Error: {e}"}
+        return _with_defaults("fundamental", analysis=f"Error: {e}")
+
+def _fundamental_fields(financial_data):
+    return pb.kv(
+        per=pb.fmt_num(financial_data.get('pe_ratio'), 2),
+        pbv=pb.fmt_num(financial_data.get('pbv'), 2),
+        roe=pb.fmt_num(financial_data.get('roe'), 2),
+        der=pb.fmt_num(financial_data.get('der'), 2),
+        eps_g=pb.fmt_num(financial_data.get('eps_growth'), 2),
+    )
 
 # --- 4. SYNTHESIZER AGENT / CIO (ADDED) ---
-def get_final_verdict(ticker, tech_res, bandar_res, fund_res, style="SWING"):
+def get_final_verdict(ticker, tech_res, bandar_res, fund_res, style="SWING", on_progress=None, priority=INTERACTIVE):
     """
     The Boss Agent.
     Combines Technical + Bandarmology + Fundamental into one final decision.
     Style: SCALPING / SWING / INVESTING
     """
-    model = _get_model()
-    if not model: return {"final_score": 0, "final_reasoning": "Model Error"}
+    system = pb.cio_system(style)
+    model = _get_model("cio", system_instruction=system)
+    if not model: return _with_defaults("cio", final_score=0, final_reasoning="Model Error")
     
     print(f"Catalyst: Synthesizing Final Verdict ({style}) for {ticker}...")
     
-    # Custom Logic Guidance based on Strategy
-    logic_guidance = ""
-    if style == "SCALPING":
-        logic_guidance = """
-        [STRATEGY: SCALPING / FAST TRADE]
-        - FOKUS UTAMA: Momentum, Volume, & Bandarmology Flow (Hari Ini).
-        - FUNDAMENTAL: "IGNORE" (Abaikan valuasi mahal/murah, fokus hanya pada liquiditas).
-        - ACTION: Jika Volume Spike + Bandar Akumulasi = BUY Agresif (Stop Loss Ketat).
-        """
-    elif style == "INVESTING":
-        logic_guidance = """
-        [STRATEGY: LONG TERM INVESTING]
-        - FOKUS UTAMA: Fundamental (Valuasi Murah + Growth) & 'The Map' Bandarmology.
-        - TECHNICAL: Gunakan hanya untuk Entry di Support (Buy on Weakness). Hiraukan noise harian.
-        - ACTION: Jika Fundamental Bagus + Valuasi Murah = BUY & HOLD.
-        """
-    else: # SWING
-        logic_guidance = """
-        [STRATEGY: SWING TRADING (Default)]
-        - FOKUS: Keseimbangan Teknikal (Trend) & Bandarmology.
-        - FUNDAMENTAL: Check kesehatan (hindari saham gorengan berhutang tinggi).
-        - LOGIKA PENIMBANGAN (WEIGHTING):
-          - Jika Fundamental JELEK tapi Teknikal & Bandar BAGUS -> "Speculative Buy" (Short Term only).
-          - Jika Fundamental BAGUS dan Teknikal BAGUS -> "Strong Buy" (Swing/Invest).
-          - Jika Bandarmologi "DISTRIBUSI MASIF", abaikan sinyal Buy teknikal (Risk of False Breakout).
-        """
-
-    prompt = f"""
-    Anda adalah Chief Investment Officer (CIO) dengan memegang strategi: {style}.
-    Ambil keputusan final: BELI, JUAL, atau TAHAN untuk saham {ticker}.
- 
-    1. LAPORAN TEKNIKAL:
-       - Score: {tech_res.get('sentiment_score')} | Action: {tech_res.get('action')}
-       - Plan: {tech_res.get('trading_plan', {})}
-       - Insight: {tech_res.get('analysis')}
-
-    2. LAPORAN BANDARMOLOGI:
-       - Score: {bandar_res.get('sentiment_score')} | Status: {bandar_res.get('status')}
-       - Insight: {bandar_res.get('analysis')}
-
-    3. LAPORAN FUNDAMENTAL:
-       - Score: {fund_res.get('sentiment_score')} 
-       - STATUS VALUASI: {fund_res.get('valuation_status')} (Undervalued/Fair/Overvalued)
-       - Insight: {fund_res.get('analysis')}
-
-    {logic_guidance}
-
-    [REQUIREMENT: DETAILED ACTION PLAN]:
-    Provide a specific execution strategy including:
-    1. "Risk 1% Rule" calculation example (Assume 100 Mio Portfolio -> Max Risk 1 Mio).
-    2. Position Sizing advice (e.g. "Potong Size 1/3", "Cicil Beli").
-    3. Strict Exit rules (e.g. "Buang jika closing di bawah support").
-    
-    LANGUAGE: STRICTLY INDONESIAN (BAHASA INDONESIA). Semua output harus dalam Bahasa Indonesia.
-
-    OUTPUT JSON:
-    {{
-        "final_score": (0-100),
-        "primary_strategy": "SWING_TRADE / INVESTING / SCALPING / AVOID",
-        "conviction_level": "HIGH / MEDIUM / LOW",
-        "final_reasoning": "Kesimpulan tegas max 3 kalimat. Gabungkan ketiga perspektif.",
-        "recommended_action": "BUY / SELL / WAIT",
-        "allocation_size": "SMALL (5%) / MEDIUM (15%) / AGGRESSIVE (25%) / ZERO",
-        "action_plan": "Tulis rencana eksekusi detail (Risk Rule, Cicil Beli, Cut Loss) dalam format poin-poin singkat."
-    }}
-    """
+    budget = pb.TOKEN_BUDGET["cio"]
+    model_name = getattr(model, "model_name", None)
+    # Each agent's narrative gets an equal share of what is left after the score lines
+    insight_budget = budget // 4
+    plan = tech_res.get('trading_plan') or {}
+    
+    prompt = pb.fit_to_budget([
+        (f"[{ticker}]", False),
+        ("TECH " + pb.kv(score=tech_res.get('sentiment_score'), action=tech_res.get('action')) +
+         (" plan " + pb.kv(buy=plan.get('buy_area'), sl=plan.get('stop_loss'), tp=plan.get('target_profit')) if plan else ""), False),
+        ("insight: " + pb.truncate_to_tokens(str(tech_res.get('analysis', '')), insight_budget, model_name), False),
+        ("BANDAR " + pb.kv(score=bandar_res.get('sentiment_score'), status=bandar_res.get('status')), False),
+        ("insight: " + pb.truncate_to_tokens(str(bandar_res.get('analysis', '')), insight_budget, model_name), False),
+        ("FUND " + pb.kv(score=fund_res.get('sentiment_score'), valuasi=fund_res.get('valuation_status'),
+                         health=fund_res.get('financial_health')), False),
+        ("insight: " + pb.truncate_to_tokens(str(fund_res.get('analysis', '')), insight_budget, model_name), False),
+    ], budget, model_name)
+    
     try:
-        response = model.generate_content(prompt)
-        return _clean_json_response(response.text.strip())
+        return _generate_json("cio", model, prompt, style=style, on_progress=on_progress, system=system, priority=priority)
     except Exception as e:
-        return {"final_score": 0, "final_reasoning": f"Error: {e}"}
+        return _with_defaults("cio", final_score=0, final_reasoning=f"Error: {e}")
+
+# --- BATCH MODE (WATCHLIST / SCREENER) ---
+# Several tickers are packed into one prompt; the model returns a JSON array keyed
+# by ticker, which is split back into per-ticker dicts with the single-agent shape.
+TECH_BATCH_SIZE = int(os.getenv("AI_TECH_BATCH_SIZE", "5"))
+FUND_BATCH_SIZE = int(os.getenv("AI_FUND_BATCH_SIZE", "10"))
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _ticker_key(ticker):
+    """'bbri' / 'BBRI.JK' / ' BBRI ' -> 'BBRI' for matching batch answers to requested tickers."""
+    t = str(ticker or "").strip().upper()
+    return t[:-3] if t.endswith(".JK") else t
+
+def _split_batch(results, tickers):
+    """Maps batch answers back to the requested tickers (keys as given by the caller)."""
+    requested = {_ticker_key(t): t for t in tickers}
+    by_ticker = {}
+    for item in results:
+        t = requested.get(_ticker_key(item.pop("ticker", "")))
+        if t is not None:
+            by_ticker[t] = item
+    return by_ticker
+
+def get_technical_analysis_batch(items, style="SWING", on_progress=None, priority=BACKGROUND):
+    """
+    Batch Technical Agent.
+    items: {ticker: ta_data}. Returns {ticker: result} with the same shape as get_technical_analysis.
+    Tickers missing from a batch answer are re-run with the single-ticker agent.
+    """
+    system = pb.technical_system(style, batch=True)
+    model = _get_model("technical_batch", system_instruction=system)
+    if not model:
+        return {t: _with_defaults("technical", analysis="API Key Missing") for t in items}
+    model_name = getattr(model, "model_name", None)
+    
+    results = {}
+    for group in _chunks(items, TECH_BATCH_SIZE):
+        print(f"Catalyst: Running Batch Technical Strategy ({style}) for {', '.join(group)}...")
+        prompt = pb.fit_to_budget(
+            [(pb.technical_block(t, items[t], calculate_trading_plan(items[t], style)), False) for t in group],
+            pb.TOKEN_BUDGET["technical_batch"] * len(group), model_name
+        )
+        try:
+            batch_res = _generate_json("technical_batch", model, prompt, style=style, on_progress=on_progress, batch=True, system=system, priority=priority)
+        except Exception as e:
+            print(f"Batch Technical Error: {e}")
+            batch_res = []
+        results.update(_split_batch(batch_res, group))
+    
+    for t in items:
+        if t not in results:
+            results[t] = get_technical_analysis(t, items[t], style=style, on_progress=on_progress, priority=priority)
+    return results
+
+def get_fundamental_analysis_batch(items, on_progress=None, priority=BACKGROUND):
+    """
+    Batch Fundamental Agent.
+    items: {ticker: financial_data}. Returns {ticker: result} with the same shape as get_fundamental_analysis.
+    """
+    system = pb.fundamental_system(batch=True)
+    model = _get_model("fundamental_batch", system_instruction=system)
+    if not model:
+        return {t: _with_defaults("fundamental", analysis="API Key Missing") for t in items}
+    model_name = getattr(model, "model_name", None)
+    
+    results = {}
+    for group in _chunks(items, FUND_BATCH_SIZE):
+        print(f"Catalyst: Running Batch Fundamental Scan for {', '.join(group)}...")
+        prompt = pb.fit_to_budget(
+            [(f"[{t}] " + _fundamental_fields(items[t]), False) for t in group],
+            pb.TOKEN_BUDGET["fundamental_batch"] * len(group), model_name
+        )
+        try:
+            batch_res = _generate_json("fundamental_batch", model, prompt, on_progress=on_progress, batch=True, system=system, priority=priority)
+        except Exception as e:
+            print(f"Batch Fundamental Error: {e}")
+            batch_res = []
+        results.update(_split_batch(batch_res, group))
+    
+    for t in items:
+        if t not in results:
+            results[t] = get_fundamental_analysis(t, items[t], on_progress=on_progress, priority=priority)
+    return results
+
+# --- 5. DETERMINISTIC FALLBACKS ---
+# Used when an agent misses its deadline. Same output shape as the LLM agents,
+# built only from numbers already computed by analyze_technical / QuantAnalyzer.
+def mark_degraded(result, reason):
+    """Tags a fallback result so the report can show that the AI output was replaced."""
+    result["degraded"] = True
+    result["degraded_reason"] = reason
+    return result
+
+def _technical_score(ta_data):
+    # Same trend/MACD/RSI/ADX points as analyze_technical's tech_score. ta_data['final_score']
+    # already contains bandar/foreign flow (QuantAnalyzer composite with GoAPI)
+    trend, macd_status = str(ta_data.get('trend') or ''), str(ta_data.get('macd_status') or '')
+    score = 50
+    if "Bullish" in trend: score += 20
+    elif "Bearish" in trend: score -= 20
+    if "Golden Cross" in macd_status: score += 10
+    elif "Dead Cross" in macd_status: score -= 10
+    if (ta_data.get('rsi') or 0) > 50: score += 5
+    if (ta_data.get('adx') or 0) > 25: score += 5
+    return score
+
+def fallback_technical_analysis(ta_data, style="SWING"):
+    score = _technical_score(ta_data)
+    plan = calculate_trading_plan(ta_data, style)
+    
+    action = "WAIT_AND_SEE"
+    if score >= 60: action = "BUY_ON_WEAKNESS"
+    elif score <= 40: action = "AVOID"
+    
+    return {
+        "sentiment_score": score,
+        "analysis": (
+            f"Tren {ta_data.get('trend', '-')}, RSI {ta_data.get('rsi', 0):.0f}, MACD {ta_data.get('macd_status', '-')}, "
+            f"Volume {ta_data.get('vol_status', '-')} ({ta_data.get('vol_ratio', 0):.2f}x rata-rata)."
+        ),
+        "action": action,
+        "trading_plan": {
+            "buy_area": f"{plan['buy_area_low']:.0f} - {plan['price']:.0f}",
+            "stop_loss": f"{plan['stop_loss']:.0f}",
+            "target_profit": plan['target_str']
+        },
+        "plan_note": plan['note']
+    }
+
+def fallback_bandarmology_analysis(context_data):
+    # Bandar score (-50..+60) -> 0..100
+    score = int(min(100, max(0, 50 + context_data.get('bandar_score', 0))))
+    
+    status = "CHURNING"
+    if score >= 60: status = "AKUMULASI"
+    elif score <= 40: status = "DISTRIBUSI"
+    
+    return {
+        "sentiment_score": score,
+        "status": status,
+        "analysis": (
+            f"Peta {context_data.get('periodic_period', 'N/A')} hari: {context_data.get('periodic_status', 'N/A')}. "
+            f"Hari ini: {context_data.get('today_summary', 'N/A')}"
+        ),
+        "action": "BUY" if score >= 60 else ("SELL" if score <= 40 else "WAIT")
+    }
+
+def fallback_fundamental_analysis(financial_data):
+    def num(key):
+        try:
+            return float(financial_data.get(key) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    pe, pbv, roe, der = num('pe_ratio'), num('pbv'), num('roe'), num('der')
+    
+    score = 50
+    if 0 < pbv < 1: score += 15
+    elif pbv > 3: score -= 10
+    if 0 < pe < 15: score += 10
+    elif pe < 0: score -= 15
+    if roe > 0.15: score += 15
+    elif roe < 0: score -= 10
+    if der > 1.5: score -= 10
+    
+    valuation = "FAIR"
+    if (0 < pbv < 1) or (0 < pe < 10): valuation = "UNDERVALUED"
+    elif pbv > 3 or pe > 25: valuation = "OVERVALUED"
+    
+    return {
+        "sentiment_score": int(min(100, max(0, score))),
+        "valuation_status": valuation,
+        "financial_health": "RISKY" if (der > 2 or roe < 0) else "HEALTHY",
+        "analysis": f"PER {pe:.2f}x, PBV {pbv:.2f}x, ROE {roe*100:.2f}%, DER {der:.2f}x."
+    }
+
+# Weights of (technical, bandarmology, fundamental) per style
+FALLBACK_WEIGHTS = {
+    "SCALPING": (0.5, 0.5, 0.0),
+    "INVESTING": (0.25, 0.25, 0.5),
+    "SWING": (0.4, 0.4, 0.2),
+}
+
+def fallback_final_verdict(tech_res, bandar_res, fund_res, style="SWING", quant_verdict=None):
+    """
+    quant_verdict: Optional QuantAnalyzer.calculate_final_verdict result; when given,
+    its score/verdict is used instead of re-weighting the agent scores.
+    """
+    w_tech, w_bandar, w_fund = FALLBACK_WEIGHTS.get(style, FALLBACK_WEIGHTS["SWING"])
+    score = int(
+        tech_res.get('sentiment_score', 50) * w_tech +
+        bandar_res.get('sentiment_score', 50) * w_bandar +
+        fund_res.get('sentiment_score', 50) * w_fund
+    )
+    
+    action, alloc = "WAIT", "ZERO"
+    if quant_verdict:
+        score = int(quant_verdict.get('final_score', score))
+        verdict = quant_verdict.get('verdict', '')
+        if "BUY" in verdict: action, alloc = "BUY", "SMALL (5%)"
+        elif "SELL" in verdict: action = "SELL"
+    elif score >= 65: action, alloc = "BUY", "SMALL (5%)"
+    elif score <= 35: action = "SELL"
+    
+    plan = tech_res.get('trading_plan', {})
+    return {
+        "final_score": score,
+        "primary_strategy": style if action == "BUY" else "AVOID",
+        "conviction_level": "LOW",
+        "final_reasoning": (
+            f"Skor gabungan Teknikal {tech_res.get('sentiment_score', 50)}, Bandar {bandar_res.get('sentiment_score', 50)}, "
+            f"Fundamental {fund_res.get('sentiment_score', 50)} (bobot {style})."
+        ),
+        "recommended_action": action,
+        "allocation_size": alloc,
+        "action_plan": (
+            f"- Buy Area: {plan.get('buy_area', '-')}\n"
+            f"- Stop Loss: {plan.get('stop_loss', '-')} (Risk maks 1% portfolio)\n"
+            f"- Target: {plan.get('target_profit', '-')}"
+        )
+    }
 
 # --- MAIN RUNNER EXAMPLE ---
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+import os
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+
+import db_manager
+
+# Retention per table. Rows that fall out of retention are exported to gzip JSONL
+# archives before they are deleted, so the hot DB stays small enough for the page cache.
+RETENTION = {
+    # Newest `keep_recent` rows per (ticker, timeframe, style, mode) are kept as-is; older ones are
+    # downsampled to the last row of each day, and dropped entirely after `max_age_days`.
+    "analysis_cache": {
+        "keep_recent": int(os.getenv("DB_KEEP_RECENT_ANALYSES", "5")),
+        "max_age_days": int(os.getenv("DB_ANALYSIS_MAX_AGE_DAYS", "180")),
+    },
+    # One row per ticker (see migration v2): keep the most recently viewed tickers
+    "history": {"max_rows": int(os.getenv("DB_HISTORY_MAX_ROWS", "500"))},
+    # Expired LLM responses are never served again
+    "llm_cache": {"expired_grace_days": 1},
+}
+
+ARCHIVE_DIR = os.getenv("DB_ARCHIVE_DIR", "")   # Default: db_archive/ next to the DB file
+VACUUM_PAGES = 2000                              # Pages released per incremental vacuum step
+ID_CHUNK = 500                                   # Ids per IN (...) statement
+
+def archive_dir():
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    if db_manager.is_shared_storage():
+        return os.path.abspath("db_archive")
+    return os.path.join(os.path.dirname(os.path.abspath(db_manager.DB_NAME)), "db_archive")
+
+def _archive_rows(table, rows):
+    """Writes rows to <archive_dir>/<table>-<timestamp>.jsonl.gz. Returns the file path."""
+    if not rows:
+        return None
+    folder = archive_dir()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{table}-{datetime.now():%Y%m%d-%H%M%S-%f}.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n")
+    return path
+
+def _archive_and_delete(conn, table, key, ids):
+    """Archives then deletes rows of `table` whose `key` is in ids (one transaction). Returns the count."""
+    if not ids:
+        return 0
+    rows = []
+    for i in range(0, len(ids), ID_CHUNK):
+        chunk = ids[i:i + ID_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        rows.extend(conn.execute(f"SELECT * FROM {table} WHERE {key} IN ({marks})", chunk).fetchall())
+
+    # The archive is written first: a crash before the delete only duplicates rows
+    _archive_rows(table, rows)
+    with conn:
+        for i in range(0, len(ids), ID_CHUNK):
+            chunk = ids[i:i + ID_CHUNK]
+            marks = ", ".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM {table} WHERE {key} IN ({marks})", chunk)
+    return len(rows)
+
+def prune_analysis_cache(conn, keep_recent, max_age_days):
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    ids = [row[0] for row in conn.execute('''
+        SELECT id FROM (
+            SELECT id, timestamp,
+                ROW_NUMBER() OVER (PARTITION BY ticker, timeframe, style, mode ORDER BY timestamp DESC) AS recent_rank,
+                ROW_NUMBER() OVER (PARTITION BY ticker, timeframe, style, mode, date(timestamp) ORDER BY timestamp DESC) AS day_rank
+            FROM analysis_cache
+        )
+        WHERE recent_rank > ? AND (day_rank > 1 OR timestamp < ?)
+    ''', (keep_recent, cutoff)).fetchall()]
+    return _archive_and_delete(conn, "analysis_cache", "id", ids)
+
+def prune_history(conn, max_rows):
+    tickers = [row[0] for row in conn.execute(
+        "SELECT ticker FROM history ORDER BY timestamp DESC LIMIT ? OFFSET ?", (2 ** 31 - 1, max_rows)
+    ).fetchall()]
+    return _archive_and_delete(conn, "history", "ticker", tickers)
+
+def prune_llm_cache(conn, expired_grace_days):
+    # Cached responses are reproducible, so they are dropped without archiving
+    cutoff = datetime.now() - timedelta(days=expired_grace_days)
+    with conn:
+        return conn.execute("DELETE FROM llm_cache WHERE expires < ?", (cutoff,)).rowcount
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    """
+    Returns free pages to the OS. Never runs a full VACUUM on the live DB: the one-time
+    switch to auto_vacuum=INCREMENTAL happens in db_manager.init_db at startup.
+    """
+    if getattr(conn, "dialect", "sqlite") == "postgres":
+        return # The server's autovacuum takes care of it
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return # Not converted yet (next startup does it)
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+
+def run_maintenance(retention=None):
+    """Applies retention to every table, then vacuums. Returns {table: rows removed}."""
+    retention = retention or RETENTION
+    db_manager.flush_writes()
+    conn = db_manager.get_db_connection()
+    report = {}
+    try:
+        report["analysis_cache"] = prune_analysis_cache(conn, **retention["analysis_cache"])
+        report["history"] = prune_history(conn, **retention["history"])
+        db_manager.invalidate_cache("history")
+        report["llm_cache"] = prune_llm_cache(conn, **retention["llm_cache"])
+        incremental_vacuum(conn)
+    except Exception as e:
+        print(f"Error during DB maintenance: {e}")
+    return report
+
+
+class DBMaintenance:
+    """Runs run_maintenance() on a daemon thread every `interval_hours` (first run after `initial_delay` s)."""
+
+    def __init__(self, interval_hours=6, initial_delay=60):
+        self.interval = interval_hours * 3600
+        self.initial_delay = initial_delay
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        if self._stop.wait(self.initial_delay):
+            return
+        while True:
+            self.last_report = run_maintenance()
+            if any(self.last_report.values()):
+                print(f"DB maintenance: {self.last_report}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_maintenance = None
+_maintenance_lock = threading.Lock()
+
+def start_background_maintenance():
+    """Starts the process-wide maintenance thread once (DB_MAINTENANCE_INTERVAL_HOURS, 0 = disabled)."""
+    global _maintenance
+    interval = float(os.getenv("DB_MAINTENANCE_INTERVAL_HOURS", "6"))
+    if interval <= 0:
+        return None
+    with _maintenance_lock:
+        if _maintenance is None:
+            _maintenance = DBMaintenance(interval_hours=interval)
+            _maintenance.start()
+    return _maintenance
@@ -1,17 +1,253 @@
 import sqlite3
 import json
 import os
+import queue
+import atexit
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from datetime import datetime, timedelta
 
-DB_NAME = "stock_intelligence.db"
+import market_hours
+import db_postgres
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+# Storage target: a SQLite file path (default) or a Postgres URL ("postgresql://...")
+# shared by several processes. Every cache / pool / queue below is keyed by it.
+DB_NAME = os.getenv("DATABASE_URL") or os.getenv("STOCK_DB_PATH", "stock_intelligence.db")
+
+DB_ERRORS = (sqlite3.Error,) + db_postgres.ERRORS
+
+def configure_storage():
+    """Re-reads DATABASE_URL / STOCK_DB_PATH (call after load_dotenv)."""
+    global DB_NAME
+    DB_NAME = os.getenv("DATABASE_URL") or os.getenv("STOCK_DB_PATH", DB_NAME)
+    return DB_NAME
+
+def is_shared_storage(db_name=None):
+    return db_postgres.is_postgres_url(db_name or DB_NAME)
+
+# --- CONNECTION MANAGER ---
+# Each thread keeps one open connection per database file (keyed by DB_NAME, so
+# switching DB_NAME -- e.g. in tests -- transparently opens a new one). Connections
+# are tuned once on open: WAL lets readers run while a writer commits, and the
+# statement cache reuses prepared statements across calls.
+# Callers must NOT close the connection; writes go through the write-behind queue below.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",      # Safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size=-16000",       # 16 MB page cache
+    "PRAGMA mmap_size=134217728",     # 128 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_connections = {}   # (thread, db_name) -> connection, for close_connections()
+_connections_lock = threading.Lock()
+_generation = 0     # Bumped by close_connections() to invalidate per-thread handles
+
+def _open_connection(db_name):
+    if db_postgres.is_postgres_url(db_name):
+        return db_postgres.connect(db_name)
+    conn = sqlite3.connect(db_name, timeout=5.0, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def get_db_connection(db_name=None):
+    """Returns the calling thread's pooled connection to db_name (default DB_NAME), opened on first use."""
+    db_name = db_name or DB_NAME
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = {}
+    
+    entry = pool.get(db_name)
+    if entry is not None and entry[0] == _generation:
+        return entry[1]
+    
+    conn = _open_connection(db_name)
+    pool[db_name] = (_generation, conn)
+    with _connections_lock:
+        # Connections of finished threads are closed here instead of leaking
+        for key in [k for k in _connections if not k[0].is_alive()]:
+            _connections.pop(key).close()
+        _connections[(threading.current_thread(), db_name)] = conn
+    return conn
+
+def close_connections(db_name=None):
+    """Closes pooled connections of all threads (only those to `db_name` if given), after pending writes."""
+    global _generation
+    flush_writes()
+    with _connections_lock:
+        _generation += 1
+        for key in [k for k in _connections if db_name is None or k[1] == db_name]:
+            try:
+                _connections.pop(key).close()
+            except DB_ERRORS as e:
+                print(f"Error closing connection: {e}")
+
+# --- WRITE-BEHIND QUEUE ---
+# Writes are not committed on the caller's thread: they are queued as SQL statements
+# and a single writer thread commits them in batches (one transaction per batch).
+# The queue is bounded, so a caller only blocks when the writer falls far behind.
+# Reads first wait for pending writes to the same DB, so callers still read their own writes.
+# User-facing writes (favorites, portfolio) wait for their own commit so failures reach the UI.
+WRITE_BEHIND_ENABLED = os.getenv("DB_WRITE_BEHIND", "1") != "0"
+WRITE_QUEUE_SIZE = 1000
+WRITE_BATCH_MAX = 200
+WRITE_WAIT_TIMEOUT = 10 # Seconds a read / waiting write blocks on the writer before giving up
+
+class WriteBehindQueue:
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, batch_max=WRITE_BATCH_MAX):
+        self.batch_max = batch_max
+        self._queue = queue.Queue(maxsize)
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+        self._batches = 0
+        self._failed = 0
+        self._pending = {}   # db_name -> queued statements
+        self._thread = None
+
+    def submit(self, db_name, sql, params=(), many=False):
+        """Queues a statement. Returns a Future resolved with True (committed) or False (failed)."""
+        future = Future()
+        with self._cond:
+            self._submitted += 1
+            self._pending[db_name] = self._pending.get(db_name, 0) + 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((db_name, sql, params, many, future)) # Blocks while the queue is full
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                # Consecutive statements for the same DB share one transaction
+                start = 0
+                for i in range(1, len(batch) + 1):
+                    if i == len(batch) or batch[i][0] != batch[start][0]:
+                        self._commit(batch[start][0], batch[start:i])
+                        start = i
+            except Exception as e:
+                print(f"Database writer error: {e}")
+            finally:
+                # Counters always move on, so a failed batch can never block readers
+                for item in batch:
+                    if not item[4].done():
+                        item[4].set_result(False)
+                with self._cond:
+                    self._done += len(batch)
+                    self._batches += 1
+                    for item in batch:
+                        self._pending[item[0]] -= 1
+                    self._cond.notify_all()
+
+    def _commit(self, db_name, items):
+        try:
+            conn = get_db_connection(db_name)
+            with conn:
+                for _, sql, params, many, _ in items:
+                    _execute(conn, sql, params, many)
+            for item in items:
+                item[4].set_result(True)
+            return
+        except Exception as e:
+            # Not only DB errors: a missing driver or malformed params must not kill the writer
+            if len(items) == 1:
+                print(f"Error writing to database: {e}")
+                items[0][4].set_result(False)
+                with self._cond:
+                    self._failed += 1
+                return
+        # One bad statement must not drop the rest of the batch
+        for item in items:
+            self._commit(db_name, [item])
+
+    def has_pending(self, db_name):
+        with self._cond:
+            return self._pending.get(db_name, 0) > 0
+
+    def flush(self, timeout=None):
+        """Waits until everything queued so far is committed. Returns False on timeout."""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def get_stats(self):
+        with self._cond:
+            return {"queued": self._submitted - self._done, "written": self._done - self._failed,
+                    "failed": self._failed, "batches": self._batches}
+
+_writer = WriteBehindQueue()
+
+def _execute(conn, sql, params=(), many=False):
+    """Runs one queued write. `sql` may also be a list of (sql, params, many) that must commit together."""
+    if isinstance(sql, list):
+        for statement in sql:
+            _execute(conn, *statement)
+    else:
+        (conn.executemany if many else conn.execute)(sql, params)
+
+def _write(sql, params=(), many=False, wait=False):
+    """
+    Queues a write statement for DB_NAME (runs it right away if write-behind is disabled).
+    wait=True blocks until it is committed and returns whether it succeeded;
+    otherwise returns True once queued (fire-and-forget: history, caches, snapshots).
+    """
+    if WRITE_BEHIND_ENABLED:
+        future = _writer.submit(DB_NAME, sql, params, many)
+        if not wait:
+            return True
+        try:
+            return future.result(WRITE_WAIT_TIMEOUT)
+        except FutureTimeout:
+            print(f"Database write still pending after {WRITE_WAIT_TIMEOUT}s.")
+            return False
+    conn = get_db_connection()
+    try:
+        with conn:
+            _execute(conn, sql, params, many)
+        return True
+    except Exception as e:
+        print(f"Error writing to database: {e}")
+        return False
+
+def _read_connection():
+    """Connection for reads; pending writes to DB_NAME are committed first (bounded wait)."""
+    if _writer.has_pending(DB_NAME) and not _writer.flush(WRITE_WAIT_TIMEOUT):
+        print(f"Database writer busy for {WRITE_WAIT_TIMEOUT}s, reading without the pending writes.")
+    return get_db_connection()
+
+def flush_writes(timeout=None):
+    """Blocks until all queued writes are committed (used on shutdown and in tests)."""
+    return _writer.flush(timeout)
+
+def get_write_stats():
+    return _writer.get_stats()
+
+atexit.register(flush_writes, 10)
+
 def init_db():
     conn = get_db_connection()
+    if is_shared_storage():
+        # Postgres starts directly at the current schema version
+        db_postgres.init_schema(conn, len(MIGRATIONS))
+        invalidate_cache()
+        return
+    
+    # Only takes effect on a new (empty) DB; older ones are converted below
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
     cursor = conn.cursor()
     
     # Create table if not exists
@@ -52,174 +288,576 @@ def init_db():
         )
     ''')
     
+    # Foreign Flow Table (one row per ticker per trading day)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS foreign_flow (
+            ticker TEXT NOT NULL,
+            date TEXT NOT NULL,
+            net_foreign_buy REAL,
+            total_buy REAL,
+            total_sell REAL,
+            has_data INTEGER DEFAULT 1,
+            PRIMARY KEY (ticker, date)
+        )
+    ''')
+    
+    # LLM Response Cache (content-addressed agent outputs)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            agent TEXT NOT NULL,
+            model TEXT,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires DATETIME NOT NULL,
+            response TEXT
+        )
+    ''')
+    
     conn.commit()
-    conn.close()
+    migrate(conn)
+    _enable_incremental_vacuum(conn)
+    invalidate_cache()
+
+def _enable_incremental_vacuum(conn):
+    """
+    One-time switch of an existing DB to auto_vacuum=INCREMENTAL (needs a full VACUUM).
+    Done at startup, before the app writes: on the maintenance thread the exclusive lock
+    would outlast busy_timeout and queued writes would fail with "database is locked".
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    print("Converting DB to incremental auto-vacuum (one-time VACUUM)...")
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+# --- SCHEMA MIGRATIONS ---
+# The CREATE TABLE statements above are the original (version 0) schema.
+# Every later change is a migration; PRAGMA user_version records how many have run,
+# so existing databases are upgraded in place on the next init_db().
+def _migration_1_indexes(conn):
+    # Covers get_cached_analysis: WHERE ticker = ? AND timestamp > ? ORDER BY timestamp DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_ticker_ts ON analysis_cache (ticker, timestamp DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires)")
+
+def _migration_2_history_per_ticker(conn):
+    # History becomes one row per ticker (last seen), instead of one row per visit
+    conn.execute('''
+        CREATE TABLE history_new (
+            ticker TEXT PRIMARY KEY,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("INSERT INTO history_new (ticker, timestamp) SELECT ticker, MAX(timestamp) FROM history GROUP BY ticker")
+    conn.execute("DROP TABLE history")
+    conn.execute("ALTER TABLE history_new RENAME TO history")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_ts ON history (timestamp DESC)")
+
+def _migration_3_compact_snapshots(conn):
+    # Typed snapshot columns; the legacy ta_data blob (with a stringified df_daily) is stripped
+    for column, kind in (("price", "REAL"), ("final_score", "INTEGER"), ("verdict", "TEXT"),
+                         ("snapshot", "TEXT"), ("bars_ref", "TEXT")):
+        conn.execute(f"ALTER TABLE analysis_cache ADD COLUMN {column} {kind}")
+    
+    rows = conn.execute("SELECT id, ta_data FROM analysis_cache WHERE ta_data IS NOT NULL").fetchall()
+    for row in rows:
+        try:
+            ta_data = json.loads(row["ta_data"])
+        except (TypeError, ValueError):
+            ta_data = {}
+        ta_data.pop("df_daily", None) # Only its repr() was stored, not recoverable
+        price, final_score, verdict, snapshot, _ = compact_snapshot(ta_data)
+        conn.execute(
+            "UPDATE analysis_cache SET price = ?, final_score = ?, verdict = ?, snapshot = ?, ta_data = NULL WHERE id = ?",
+            (price, final_score, verdict, snapshot, row["id"])
+        )
+
+def _migration_4_result_cache_key(conn):
+    # Results are cached per (ticker, timeframe, style); agent outputs kept for partial reuse
+    for column, kind in (("timeframe", "TEXT DEFAULT 'daily'"), ("style", "TEXT"), ("mode", "TEXT"),
+                         ("agents", "TEXT"), ("chart_path", "TEXT")):
+        conn.execute(f"ALTER TABLE analysis_cache ADD COLUMN {column} {kind}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_key ON analysis_cache (ticker, timeframe, style, timestamp DESC)")
+
+def _migration_5_analysis_scores(conn):
+    # Normalised time series of every analysis, clustered on (ticker, ts) for range scans
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_scores (
+            ticker TEXT NOT NULL,
+            ts DATETIME NOT NULL,
+            timeframe TEXT,
+            style TEXT,
+            mode TEXT,
+            price REAL,
+            final_score INTEGER,
+            verdict TEXT,
+            cio_action TEXT,
+            rsi REAL,
+            adx REAL,
+            mfi REAL,
+            vol_ratio REAL,
+            trend TEXT,
+            macd_status TEXT,
+            bandar_status TEXT,
+            foreign_status TEXT,
+            PRIMARY KEY (ticker, ts)
+        ) WITHOUT ROWID
+    ''')
+    # Backfill from the snapshots already in the cache
+    conn.execute('''
+        INSERT OR IGNORE INTO analysis_scores
+        SELECT ticker, timestamp, timeframe, style, mode, price, final_score, verdict,
+               json_extract(agents, '$.cio.recommended_action'),
+               json_extract(snapshot, '$.rsi'), json_extract(snapshot, '$.adx'), json_extract(snapshot, '$.mfi'),
+               json_extract(snapshot, '$.vol_ratio'), json_extract(snapshot, '$.trend'),
+               json_extract(snapshot, '$.macd_status'), json_extract(snapshot, '$.bandar_status'),
+               json_extract(snapshot, '$.foreign_status')
+        FROM analysis_cache WHERE snapshot IS NOT NULL
+    ''')
+
+MIGRATIONS = [
+    _migration_1_indexes,
+    _migration_2_history_per_ticker,
+    _migration_3_compact_snapshots,
+    _migration_4_result_cache_key,
+    _migration_5_analysis_scores,
+]
+
+def get_schema_version(conn=None):
+    conn = conn or get_db_connection()
+    if getattr(conn, "dialect", "sqlite") == "postgres":
+        return db_postgres.schema_version(conn)
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn=None):
+    """Applies pending (SQLite) migrations, each in its own transaction. Returns the schema version."""
+    conn = conn or get_db_connection()
+    version = get_schema_version(conn)
+    if getattr(conn, "dialect", "sqlite") == "postgres":
+        return version
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            with conn:
+                conn.execute("BEGIN") # DDL too, so a failed migration leaves no trace
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+            print(f"DB migrated to schema v{number} ({migration.__name__}).")
+        except sqlite3.Error as e:
+            print(f"Error applying migration {number}: {e}")
+            break
+    return get_schema_version(conn)
+
+# --- ANALYSIS SNAPSHOTS ---
+# analysis_cache stores a compact snapshot of ta_data instead of the whole dict:
+# headline numbers as typed columns, the other scalars / small dicts as compact JSON.
+# Frames (df_daily) are never serialized -- only a bars_ref pointer
+# ("ticker|interval|last_date|rows") from which the bars are re-fetched on first access.
+def _to_plain(value):
+    """JSON-friendly version of value; None for array-likes (frames, series, arrays)."""
+    if isinstance(value, dict):
+        plain = {str(k): _to_plain(v) for k, v in value.items()}
+        return {k: v for k, v in plain.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    if getattr(value, "ndim", 0) > 0:
+        return None
+    if hasattr(value, "item"): # numpy scalar
+        value = value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def _bars_ref(ta_data, interval="1d"):
+    df = ta_data.get("df_daily")
+    if df is None or getattr(df, "empty", True):
+        return None
+    last_date = str(df.index[-1])[:10]
+    return f"{ta_data.get('ticker', '')}|{interval}|{last_date}|{len(df)}"
+
+def compact_snapshot(ta_data):
+    """Returns (price, final_score, verdict, snapshot_json, bars_ref) for an analysis row."""
+    snapshot = _to_plain({k: v for k, v in ta_data.items() if k != "df_daily"})
+    price = snapshot.get("price")
+    final_score = snapshot.get("final_score")
+    return (
+        float(price) if isinstance(price, (int, float)) else None,
+        int(final_score) if isinstance(final_score, (int, float)) else None,
+        snapshot.get("verdict"),
+        json.dumps(snapshot, separators=(",", ":"), ensure_ascii=False),
+        _bars_ref(ta_data),
+    )
+
+def load_bars(bars_ref):
+    """Default bars loader: re-downloads OHLCV up to the snapshot's last bar (no indicator columns)."""
+    from technical_analysis import get_stock_data # Lazy import (pandas / yfinance)
+    ticker, interval, last_date, rows = bars_ref.split("|")
+    df, _ = get_stock_data(ticker, interval=interval)
+    return df.loc[:last_date].tail(int(rows))
+
+BARS_LOADER = load_bars
+
+class AnalysisSnapshot(dict):
+    """ta_data restored from the cache; 'df_daily' is loaded lazily via BARS_LOADER on first access."""
+    def __init__(self, data, bars_ref=None):
+        super().__init__(data)
+        self.bars_ref = bars_ref
+    
+    def __missing__(self, key):
+        if key != "df_daily" or not self.bars_ref or BARS_LOADER is None:
+            raise KeyError(key)
+        try:
+            df = BARS_LOADER(self.bars_ref)
+        except Exception as e:
+            print(f"Error loading bars for {self.bars_ref}: {e}")
+            raise KeyError(key)
+        self[key] = df
+        return df
+
+# --- PORTABLE SQL ---
+def _upsert_sql(table, columns, keys, update=True):
+    """INSERT ... ON CONFLICT statement understood by both SQLite (>= 3.24) and Postgres."""
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT ({', '.join(keys)}) "
+    )
+    updates = [c for c in columns if c not in keys]
+    if not update or not updates:
+        return sql + "DO NOTHING"
+    return sql + "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
 
 # --- ANALYSIS CACHE ---
-def get_cached_analysis(ticker, minutes_valid=120):
+def _parse_timestamp(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+def get_cached_analysis(ticker, minutes_valid=None, timeframe="daily", style=None, modes=None):
     """
-    Retrieves cached analysis for a ticker if it's fresher than 'minutes_valid'.
-    Default: 120 minutes (2 hours).
+    Retrieves the latest analysis for (ticker, timeframe[, style]) if it is still fresh.
+    Freshness follows market hours (market_hours.result_valid_until) unless
+    'minutes_valid' is given; 'valid_until' is returned in WIB. modes: accepted result modes ('ai', 'quant'), None = any.
     Returns None if no valid cache found.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Calculate cutoff time
-    cutoff_time = datetime.now() - timedelta(minutes=minutes_valid)
+    conn = _read_connection()
     
-    cursor.execute('''
-        SELECT * FROM analysis_cache 
-        WHERE ticker = ? AND timestamp > ?
-        ORDER BY timestamp DESC
-        LIMIT 1
-    ''', (ticker.upper(), cutoff_time))
+    query = "SELECT * FROM analysis_cache WHERE ticker = ? AND timeframe = ?"
+    params = [ticker.upper(), timeframe]
+    if style:
+        query += " AND style = ?"
+        params.append(style.upper())
+    if modes:
+        query += f" AND mode IN ({', '.join('?' * len(modes))})"
+        params.extend(modes)
+    row = conn.execute(query + " ORDER BY timestamp DESC LIMIT 1", params).fetchone()
+    if not row:
+        return None
     
-    row = cursor.fetchone()
-    conn.close()
+    # Timestamps are stored as naive host-local time (the host is not necessarily in WIB,
+    # e.g. a UTC container), so they are converted before applying IDX market hours
+    saved_at = _parse_timestamp(row["timestamp"]).astimezone(market_hours.WIB)
+    if minutes_valid is not None:
+        valid_until = saved_at + timedelta(minutes=minutes_valid)
+    else:
+        valid_until = market_hours.result_valid_until(saved_at, timeframe)
+    now = datetime.now(market_hours.WIB)
     
-    if row:
+    if now < valid_until:
         return {
             "id": row["id"],
             "ticker": row["ticker"],
             "timestamp": row["timestamp"],
-            "ta_data": json.loads(row["ta_data"]),
+            "timeframe": row["timeframe"],
+            "style": row["style"],
+            "mode": row["mode"],
+            "age_minutes": (now - saved_at).total_seconds() / 60,
+            "valid_until": valid_until,
+            "price": row["price"],
+            "final_score": row["final_score"],
+            "verdict": row["verdict"],
+            "ta_data": AnalysisSnapshot(json.loads(row["snapshot"] or "{}"), row["bars_ref"]),
+            "agents": json.loads(row["agents"]) if row["agents"] else {},
+            "chart_path": row["chart_path"],
             "ai_analysis": row["ai_analysis"],
             "full_message": row["full_message"]
         }
     return None
 
-def save_analysis(ticker, ta_data, ai_analysis, full_message):
+def get_cached_agent_result(ticker, agent, max_age_minutes):
+    """
+    Latest usable output of one AI agent for a ticker (any timeframe/style), for partial reuse.
+    Only AI runs qualify (fast-mode 'quant' rows hold deterministic heuristics);
+    degraded (fallback) and failed outputs are skipped.
+    """
+    conn = _read_connection()
+    cutoff_time = datetime.now() - timedelta(minutes=max_age_minutes)
+    rows = conn.execute('''
+        SELECT agents FROM analysis_cache
+        WHERE ticker = ? AND timestamp > ? AND agents IS NOT NULL AND mode IN ('ai', 'degraded')
+        ORDER BY timestamp DESC
+        LIMIT 10
+    ''', (ticker.upper(), cutoff_time)).fetchall()
+    
+    for row in rows:
+        result = json.loads(row["agents"]).get(agent)
+        if not result or result.get("degraded") or result.get("parse_error"):
+            continue
+        if str(result.get("analysis", "")).startswith("Error:"):
+            continue
+        return result
+    return None
+
+def save_analysis(ticker, ta_data, ai_analysis, full_message, timeframe="daily", style="SWING", mode="ai", agents=None, chart_path=None):
     """
     Saves a new analysis result to the database.
+    agents: {'technical': ..., 'fundamental': ...} outputs kept for partial reuse.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    price, final_score, verdict, snapshot, bars_ref = compact_snapshot(ta_data)
+    timestamp = datetime.now()
     
-    cursor.execute('''
-        INSERT INTO analysis_cache (ticker, timestamp, ta_data, ai_analysis, full_message)
-        VALUES (?, ?, ?, ?, ?)
+    _write('''
+        INSERT INTO analysis_cache (ticker, timestamp, timeframe, style, mode, price, final_score, verdict,
+                                    snapshot, bars_ref, agents, chart_path, ai_analysis, full_message)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         ticker.upper(), 
-        datetime.now(), 
-        json.dumps(ta_data, default=str), # Serialize dict to JSON string
+        timestamp, 
+        timeframe, (style or "").upper(), mode,
+        price, final_score, verdict,
+        snapshot, # Compact JSON, no df_daily
+        bars_ref,
+        json.dumps(_to_plain(agents), separators=(",", ":"), ensure_ascii=False) if agents else None,
+        chart_path,
         ai_analysis,
         full_message
     ))
+    _save_score(ticker, timestamp, timeframe, style, mode, price, final_score, verdict, ta_data, agents)
     
-    conn.commit()
-    conn.close()
     print(f"Saved analysis for {ticker} to database.")
 
+# --- SCORE TIME SERIES ---
+# One analysis_scores row per saved analysis: the headline signal values as columns,
+# so score / indicator trends are plain range scans instead of parsing snapshots.
+SCORE_FIELDS = ("price", "final_score", "verdict", "cio_action", "rsi", "adx", "mfi", "vol_ratio",
+                "trend", "macd_status", "bandar_status", "foreign_status")
+
+def _number(value):
+    value = _to_plain(value)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def _save_score(ticker, timestamp, timeframe, style, mode, price, final_score, verdict, ta_data, agents):
+    cio = (agents or {}).get("cio") or {}
+    # Values in column order: ticker, ts, timeframe, style, mode, *SCORE_FIELDS
+    _write(_upsert_sql("analysis_scores", ("ticker", "ts", "timeframe", "style", "mode") + SCORE_FIELDS, ("ticker", "ts")), (
+        ticker.upper(), timestamp, timeframe, (style or "").upper(), mode,
+        price, final_score, verdict, cio.get("recommended_action"),
+        _number(ta_data.get("rsi")), _number(ta_data.get("adx")), _number(ta_data.get("mfi")), _number(ta_data.get("vol_ratio")),
+        ta_data.get("trend"), ta_data.get("macd_status"), ta_data.get("bandar_status"), ta_data.get("foreign_status")
+    ))
+
+def get_score_history(ticker, days=90, timeframe=None, fields=None):
+    """
+    Score / signal history of a ticker over the last `days`, oldest first.
+    Returns a list of dicts with 'ts' plus `fields` (default: SCORE_FIELDS).
+    """
+    fields = [f for f in (fields or SCORE_FIELDS) if f in SCORE_FIELDS]
+    conn = _read_connection()
+    
+    query = f"SELECT ts, {', '.join(fields)} FROM analysis_scores WHERE ticker = ? AND ts >= ?"
+    params = [ticker.upper(), datetime.now() - timedelta(days=days)]
+    if timeframe:
+        query += " AND timeframe = ?"
+        params.append(timeframe)
+    rows = conn.execute(query + " ORDER BY ts", params).fetchall()
+    return [dict(row) for row in rows]
+
+# --- READ-THROUGH CACHE ---
+# Favorites, history and portfolio are tiny and read on every keystroke / sidebar refresh,
+# so they are served from memory. Each table is loaded on first read (per DB_NAME) and
+# dropped by every write to it; a load that raced with a write is not stored.
+# With shared (Postgres) storage other processes write too, so entries also expire.
+CACHED_TABLES = ("favorites", "history", "portfolio")
+HISTORY_CACHE_ROWS = 100
+SHARED_CACHE_TTL = float(os.getenv("DB_SHARED_CACHE_TTL", "5"))
+
+_cache = {}           # (db_name, table) -> (loaded value, monotonic load time)
+_cache_versions = {}  # (db_name, table) -> write counter
+_cache_lock = threading.Lock()
+
+def _cached(table, loader):
+    key = (DB_NAME, table)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and not (is_shared_storage() and time.monotonic() - entry[1] > SHARED_CACHE_TTL):
+            return entry[0]
+        version = _cache_versions.get(key, 0)
+    
+    value = loader()
+    with _cache_lock:
+        if _cache_versions.get(key, 0) == version:
+            _cache[key] = (value, time.monotonic())
+    return value
+
+def invalidate_cache(*tables):
+    """Drops the in-memory copy of `tables` (default: all cached tables) for DB_NAME."""
+    with _cache_lock:
+        for table in tables or CACHED_TABLES:
+            key = (DB_NAME, table)
+            _cache.pop(key, None)
+            _cache_versions[key] = _cache_versions.get(key, 0) + 1
+
 # --- FAVORITES ---
 def add_favorite(ticker):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT OR IGNORE INTO favorites (ticker) VALUES (?)", (ticker.upper(),))
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error adding favorite: {e}")
-        return False
-    finally:
-        conn.close()
+    invalidate_cache("favorites")
+    return _write(_upsert_sql("favorites", ("ticker",), ("ticker",), update=False), (ticker.upper(),), wait=True)
 
 def remove_favorite(ticker):
-    conn = get_db_connection()
-    conn.execute("DELETE FROM favorites WHERE ticker = ?", (ticker.upper(),))
-    conn.commit()
-    conn.close()
+    invalidate_cache("favorites")
+    return _write("DELETE FROM favorites WHERE ticker = ?", (ticker.upper(),), wait=True)
+
+def _load_favorites():
+    conn = _read_connection()
+    rows = conn.execute("SELECT ticker FROM favorites ORDER BY ticker").fetchall()
+    tickers = tuple(row['ticker'] for row in rows)
+    return tickers, frozenset(tickers)
+
+def add_favorites_bulk(tickers, replace=False):
+    """Adds many favorites in one transaction (replace=True drops the ones not listed)."""
+    tickers = sorted({t.strip().upper() for t in tickers if t and t.strip()})
+    statements = [("DELETE FROM favorites", (), False)] if replace else []
+    if tickers:
+        statements.append((_upsert_sql("favorites", ("ticker",), ("ticker",), update=False), [(t,) for t in tickers], True))
+    if not statements:
+        return True
+    invalidate_cache("favorites")
+    return _write(statements, wait=True)
 
 def get_favorites():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT ticker FROM favorites ORDER BY ticker")
-    rows = cursor.fetchall()
-    conn.close()
-    return [row['ticker'] for row in rows]
+    return list(_cached("favorites", _load_favorites)[0])
 
 def is_favorite(ticker):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM favorites WHERE ticker = ?", (ticker.upper(),))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return ticker.upper() in _cached("favorites", _load_favorites)[1]
 
 # --- HISTORY ---
 def add_history(ticker):
-    conn = get_db_connection()
-    # Optional: Delete duplicates to keep only latest entry for cleaner history?
-    # For now, we just insert.
-    conn.execute("INSERT INTO history (ticker, timestamp) VALUES (?, ?)", (ticker.upper(), datetime.now()))
-    conn.commit()
-    conn.close()
+    invalidate_cache("history")
+    # One row per ticker: a repeat visit only bumps its last-seen timestamp
+    _write(_upsert_sql("history", ("ticker", "timestamp"), ("ticker",)), (ticker.upper(), datetime.now()))
+
+def _load_history(limit):
+    conn = _read_connection()
+    rows = conn.execute("SELECT ticker FROM history ORDER BY timestamp DESC LIMIT ?", (limit,)).fetchall()
+    return tuple(row['ticker'] for row in rows)
 
 def get_history(limit=10):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT ticker FROM history ORDER BY timestamp DESC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [row['ticker'] for row in rows]
+    if limit > HISTORY_CACHE_ROWS:
+        return list(_load_history(limit))
+    return list(_cached("history", lambda: _load_history(HISTORY_CACHE_ROWS))[:limit])
 
 # --- PORTFOLIO ---
 def add_portfolio(ticker, avg_price, lots):
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO portfolio (ticker, avg_price, lots)
-            VALUES (?, ?, ?)
-        ''', (ticker.upper(), avg_price, lots))
-        conn.commit()
+    invalidate_cache("portfolio")
+    return _write(_upsert_sql("portfolio", ("ticker", "avg_price", "lots"), ("ticker",)), (ticker.upper(), avg_price, lots), wait=True)
+
+def save_portfolio_bulk(items, remove=(), replace=False):
+    """
+    Upserts many positions and deletes `remove` tickers in one transaction.
+    items: [{'ticker', 'avg_price', 'lots'}, ...]. replace=True clears the portfolio first.
+    """
+    statements = [("DELETE FROM portfolio", (), False)] if replace else []
+    remove = [t.upper() for t in remove]
+    for i in range(0, len(remove), 500):
+        chunk = remove[i:i + 500]
+        statements.append((f"DELETE FROM portfolio WHERE ticker IN ({', '.join('?' * len(chunk))})", chunk, False))
+    if items:
+        statements.append((
+            _upsert_sql("portfolio", ("ticker", "avg_price", "lots"), ("ticker",)),
+            [(item["ticker"].upper(), item["avg_price"], item["lots"]) for item in items],
+            True
+        ))
+    if not statements:
         return True
-    except Exception as e:
-        print(f"Error adding to portfolio: {e}")
-        return False
-    finally:
-        conn.close()
+    invalidate_cache("portfolio")
+    return _write(statements, wait=True)
 
-def get_portfolio():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM portfolio ORDER BY ticker")
-    rows = cursor.fetchall()
-    conn.close()
+def _load_portfolio():
+    conn = _read_connection()
+    rows = conn.execute("SELECT * FROM portfolio ORDER BY ticker").fetchall()
     
-    portfolio = []
+    portfolio = {}
     for row in rows:
-        portfolio.append({
+        portfolio[row["ticker"]] = {
             "ticker": row["ticker"],
             "avg_price": row["avg_price"],
             "lots": row["lots"]
-        })
+        }
     return portfolio
 
+def get_portfolio():
+    # Copies, so callers cannot modify the cached rows
+    return [dict(item) for item in _cached("portfolio", _load_portfolio).values()]
+
 def get_portfolio_item(ticker):
     """Retrieves a single portfolio item by ticker."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM portfolio WHERE ticker = ?", (ticker.upper(),))
-    row = cursor.fetchone()
-    conn.close()
+    item = _cached("portfolio", _load_portfolio).get(ticker.upper())
+    return dict(item) if item else None
+
+def delete_portfolio(ticker):
+    invalidate_cache("portfolio")
+    return _write("DELETE FROM portfolio WHERE ticker = ?", (ticker.upper(),), wait=True)
+
+# --- FOREIGN FLOW ---
+def get_foreign_flow(ticker, since_date=None):
+    """
+    Retrieves stored daily foreign flow rows for a ticker.
+    Returns a dictionary: {date_str: row}. Rows with has_data=False mark
+    days already checked that had no trading (holidays).
+    """
+    conn = _read_connection()
     
-    if row:
-        return {
-            "ticker": row["ticker"],
-            "avg_price": row["avg_price"],
-            "lots": row["lots"]
+    query = "SELECT * FROM foreign_flow WHERE ticker = ?"
+    params = [ticker.upper()]
+    if since_date:
+        query += " AND date >= ?"
+        params.append(str(since_date))
+    rows = conn.execute(query + " ORDER BY date", params).fetchall()
+    
+    return {
+        row["date"]: {
+            "date": row["date"],
+            "net_foreign_buy": row["net_foreign_buy"],
+            "total_buy": row["total_buy"],
+            "total_sell": row["total_sell"],
+            "has_data": bool(row["has_data"])
         }
+        for row in rows
+    }
+
+def save_foreign_flow(ticker, rows):
+    """
+    Upserts daily foreign flow rows (as returned by GoApiClient.get_foreign_flow_history).
+    """
+    if not rows:
+        return
+    columns = ("ticker", "date", "net_foreign_buy", "total_buy", "total_sell", "has_data")
+    _write(_upsert_sql("foreign_flow", columns, ("ticker", "date")), [
+        (
+            ticker.upper(), r['date'], r.get('net_foreign_buy', 0), r.get('total_buy', 0),
+            r.get('total_sell', 0), 1 if r.get('has_data', True) else 0
+        )
+        for r in rows
+    ], many=True)
+
+# --- LLM RESPONSE CACHE ---
+def get_llm_cache(cache_key):
+    """Returns the cached parsed agent response for `cache_key`, or None if missing/expired."""
+    conn = _read_connection()
+    row = conn.execute(
+        "SELECT response FROM llm_cache WHERE cache_key = ? AND expires > ?",
+        (cache_key, datetime.now())
+    ).fetchone()
+    
+    if row:
+        return json.loads(row["response"])
     return None
 
-def delete_portfolio(ticker):
-    conn = get_db_connection()
-    try:
-        conn.execute("DELETE FROM portfolio WHERE ticker = ?", (ticker.upper(),))
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error deleting from portfolio: {e}")
-        return False
-    finally:
-        conn.close()
+def save_llm_cache(cache_key, agent, model, response, expires):
+    """Stores a parsed agent response until `expires` (datetime)."""
+    columns = ("cache_key", "agent", "model", "created", "expires", "response")
+    _write(_upsert_sql("llm_cache", columns, ("cache_key",)), (cache_key, agent, model, datetime.now(), expires, json.dumps(response, default=str)))
@@ -0,0 +1,205 @@
+import os
+import threading
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    import psycopg2.pool
+except ImportError:
+    psycopg2 = None
+
+# Postgres storage for db_manager (DB_NAME / DATABASE_URL = "postgresql://...").
+# Lets several processes (Streamlit, desktop app, CLI workers) share cache and history.
+# Connections come from one ThreadedConnectionPool per DSN and are wrapped so db_manager
+# keeps using the sqlite3-style API: conn.execute(sql with ? params), `with conn:`.
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+
+ERRORS = (psycopg2.Error,) if psycopg2 else ()
+
+def is_postgres_url(target):
+    return str(target).startswith(("postgres://", "postgresql://"))
+
+class PostgresConnection:
+    """sqlite3.Connection look-alike over a pooled psycopg2 connection (autocommit outside `with`)."""
+    dialect = "postgres"
+
+    def __init__(self, pool, raw, pooled=True):
+        self._pool = pool
+        self._raw = raw
+        self._pooled = pooled
+        raw.autocommit = True   # Plain reads never leave the session idle in a transaction
+
+    cursor_factory = psycopg2.extras.DictCursor if psycopg2 else None
+
+    @staticmethod
+    def _sql(sql, bind=True):
+        """
+        sqlite '?' placeholders -> '%s' outside quoted literals/identifiers.
+        bind: psycopg2 %-formats the whole statement when params are passed, so literal
+        '%' (e.g. LIKE 'BB%') must become '%%'; without params the SQL is sent untouched.
+        """
+        out = []
+        quote = None
+        for ch in sql:
+            if quote:
+                if ch == quote:
+                    quote = None # '' / "" escapes simply reopen on the next char
+            elif ch in ("'", '"'):
+                quote = ch
+            elif ch == "?" and bind:
+                out.append("%s")
+                continue
+            if ch == "%" and bind:
+                ch = "%%"
+            out.append(ch)
+        return "".join(out)
+
+    def execute(self, sql, params=()):
+        cur = self._raw.cursor(cursor_factory=self.cursor_factory)
+        if params:
+            cur.execute(self._sql(sql), tuple(params))
+        else:
+            cur.execute(self._sql(sql, bind=False))
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        cur = self._raw.cursor()
+        psycopg2.extras.execute_batch(cur, self._sql(sql), list(seq_of_params), page_size=200)
+        return cur
+
+    def commit(self):
+        pass # autocommit; transactions are opened by `with conn:`
+
+    def __enter__(self):
+        self._raw.cursor().execute("BEGIN")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._raw.cursor().execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+    def close(self):
+        """Returns the connection to its pool (or closes it if it was opened outside the pool)."""
+        if self._pooled:
+            self._pool.putconn(self._raw)
+        else:
+            self._raw.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(dsn):
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = _pools[dsn] = psycopg2.pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, dsn)
+        return pool
+
+def connect(dsn):
+    """Checks out a pooled connection; falls back to a direct one if the pool is exhausted."""
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 is not installed (pip install psycopg2-binary) but a Postgres DATABASE_URL is set.")
+    pool = _get_pool(dsn)
+    try:
+        return PostgresConnection(pool, pool.getconn())
+    except psycopg2.pool.PoolError:
+        print(f"Postgres pool exhausted ({POOL_MAX}), opening a direct connection.")
+        return PostgresConnection(pool, psycopg2.connect(dsn), pooled=False)
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+# Current schema (same as SQLite after all db_manager migrations); created in one step
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS analysis_cache (
+        id BIGSERIAL PRIMARY KEY,
+        ticker TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ta_data TEXT,
+        ai_analysis TEXT,
+        full_message TEXT,
+        price DOUBLE PRECISION,
+        final_score INTEGER,
+        verdict TEXT,
+        snapshot TEXT,
+        bars_ref TEXT,
+        timeframe TEXT DEFAULT 'daily',
+        style TEXT,
+        mode TEXT,
+        agents TEXT,
+        chart_path TEXT
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_analysis_ticker_ts ON analysis_cache (ticker, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_key ON analysis_cache (ticker, timeframe, style, timestamp DESC)",
+    "CREATE TABLE IF NOT EXISTS favorites (ticker TEXT PRIMARY KEY)",
+    '''CREATE TABLE IF NOT EXISTS history (
+        ticker TEXT PRIMARY KEY,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_history_ts ON history (timestamp DESC)",
+    '''CREATE TABLE IF NOT EXISTS portfolio (
+        ticker TEXT PRIMARY KEY,
+        avg_price DOUBLE PRECISION,
+        lots INTEGER,
+        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS foreign_flow (
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        net_foreign_buy DOUBLE PRECISION,
+        total_buy DOUBLE PRECISION,
+        total_sell DOUBLE PRECISION,
+        has_data INTEGER DEFAULT 1,
+        PRIMARY KEY (ticker, date)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        agent TEXT NOT NULL,
+        model TEXT,
+        created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires TIMESTAMP NOT NULL,
+        response TEXT
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires)",
+    '''CREATE TABLE IF NOT EXISTS analysis_scores (
+        ticker TEXT NOT NULL,
+        ts TIMESTAMP NOT NULL,
+        timeframe TEXT,
+        style TEXT,
+        mode TEXT,
+        price DOUBLE PRECISION,
+        final_score INTEGER,
+        verdict TEXT,
+        cio_action TEXT,
+        rsi DOUBLE PRECISION,
+        adx DOUBLE PRECISION,
+        mfi DOUBLE PRECISION,
+        vol_ratio DOUBLE PRECISION,
+        trend TEXT,
+        macd_status TEXT,
+        bandar_status TEXT,
+        foreign_status TEXT,
+        PRIMARY KEY (ticker, ts)
+    )''',
+    "CREATE TABLE IF NOT EXISTS schema_info (version INTEGER NOT NULL)",
+]
+
+SCHEMA_LOCK_ID = 7_120_501 # Advisory lock: processes starting together create the schema once
+
+def init_schema(conn, version):
+    with conn:
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (SCHEMA_LOCK_ID,))
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if conn.execute("SELECT version FROM schema_info").fetchone() is None:
+            conn.execute("INSERT INTO schema_info (version) VALUES (?)", (version,))
+
+def schema_version(conn):
+    row = conn.execute("SELECT version FROM schema_info").fetchone()
+    return row[0] if row else 0
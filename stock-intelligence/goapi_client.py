@@ -1,13 +1,7 @@
 import requests
 import os
 import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
-
-import requests
-import os
-import datetime
+import concurrent.futures
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -135,6 +129,65 @@ class GoApiClient:
             
         return results
 
+    def get_recent_trading_dates(self, days=60):
+        """
+        Returns the last N weekdays (newest first), including today if it is a weekday.
+        Exchange holidays are not known here; GoAPI returns empty results for them.
+        """
+        dates = []
+        current_date = datetime.date.today()
+        while len(dates) < days:
+            if current_date.weekday() < 5:
+                dates.append(current_date)
+            current_date -= datetime.timedelta(days=1)
+        return dates
+
+    def _fetch_foreign_flow_day(self, ticker, d_str, timeout=5):
+        """
+        Fetches and aggregates the FOREIGN broker summary for a single date.
+        Returns a row dict (with 'has_data' False for empty days such as holidays),
+        or None if the request itself failed.
+        """
+        url = f"{self.base_url}/{ticker}/broker_summary"
+        params = {"date": d_str, "investor": "FOREIGN"}
+        
+        try:
+            response = requests.get(url, headers=self.headers, params=params, timeout=timeout)
+            if response.status_code != 200:
+                return None
+            data = response.json()
+        except Exception as e:
+            print(f"GoAPI Foreign Flow Error ({d_str}): {e}")
+            return None
+        
+        results = []
+        if 'data' in data and isinstance(data['data'], dict):
+            results = data['data'].get('results') or []
+        
+        # Calculate Net Foreign
+        net_foreign = 0.0
+        total_buy = 0.0
+        total_sell = 0.0
+        
+        for item in results:
+            val = float(item.get('value', 0))
+            side = item.get('side', '').upper()
+            
+            if side == 'BUY':
+                total_buy += val
+                net_foreign += val
+            elif side == 'SELL':
+                total_sell += val
+                net_foreign -= val
+                
+        return {
+            'date': d_str,
+            'net_foreign_buy': net_foreign,
+            'total_buy': total_buy,
+            'total_sell': total_sell,
+            'has_data': bool(results)
+        }
+
     def get_foreign_flow(self, ticker, date=None):
         """
         Fetches Foreign Flow (Net Foreign Buy/Sell).
@@ -146,44 +199,33 @@ class GoApiClient:
         
         for d in target_dates:
             d_str = d.strftime("%Y-%m-%d") if isinstance(d, datetime.date) else d
-            
-            url = f"{self.base_url}/{ticker}/broker_summary"
-            params = {"date": d_str, "investor": "FOREIGN"}
-            
-            try:
-                response = requests.get(url, headers=self.headers, params=params, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'data' in data and 'results' in data['data']:
-                        results = data['data']['results']
-                        if results:
-                            # Calculate Net Foreign
-                            net_foreign = 0.0
-                            total_buy = 0.0
-                            total_sell = 0.0
-                            
-                            for item in results:
-                                val = float(item.get('value', 0))
-                                side = item.get('side', '').upper()
-                                
-                                if side == 'BUY':
-                                    total_buy += val
-                                    net_foreign += val
-                                elif side == 'SELL':
-                                    total_sell += val
-                                    net_foreign -= val
-                                    
-                            return [{
-                                'date': d_str,
-                                'net_foreign_buy': net_foreign,
-                                'total_buy': total_buy,
-                                'total_sell': total_sell
-                            }]
-            except Exception as e:
-                print(f"GoAPI Foreign Flow Error ({d_str}): {e}")
+            row = self._fetch_foreign_flow_day(ticker, d_str)
+            if row and row['has_data']:
+                row.pop('has_data')
+                return [row]
                 
         return None
 
+    def get_foreign_flow_history(self, ticker, dates, max_workers=8):
+        """
+        Fetches Foreign Flow for several dates concurrently.
+        Returns a dictionary: {date_str: row} (see _fetch_foreign_flow_day).
+        Dates whose request failed are omitted so callers can retry them later.
+        """
+        if not self.api_key or not dates: return {}
+        
+        d_strs = [d.strftime("%Y-%m-%d") if isinstance(d, datetime.date) else d for d in dates]
+        results = {}
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(d_strs))) as executor:
+            futures = {executor.submit(self._fetch_foreign_flow_day, ticker, d_str, 3): d_str for d_str in d_strs}
+            for future in concurrent.futures.as_completed(futures):
+                row = future.result()
+                if row is not None:
+                    results[futures[future]] = row
+                    
+        return results
+
     def get_latest_price(self, ticker):
         """
         Fetches the latest snapshot price for a ticker.
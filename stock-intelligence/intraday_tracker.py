@@ -0,0 +1,153 @@
+import datetime
+import threading
+from collections import deque
+import pandas as pd
+
+from market_hours import now_wib, is_market_open
+
+
+class IntradayBrokerTracker:
+    """
+    Polls today's broker summary on an interval and keeps per-interval broker deltas.
+    Each poll is diffed against the previous snapshot, so "who bought in the last
+    30 minutes" is a sum over stored deltas instead of a full re-analysis.
+    """
+
+    def __init__(self, goapi_client, quant_engine, interval=60, max_deltas=600):
+        self.goapi_client = goapi_client
+        self.quant_engine = quant_engine
+        self.interval = interval
+        self.max_deltas = max_deltas
+
+        self._lock = threading.Lock()
+        self._state = {}    # ticker -> {'date', 'raw', 'snapshot', 'updated', 'deltas'}
+        self._threads = {}  # ticker -> (thread, stop_event)
+
+    def _aggregate(self, day_str, raw):
+        """Aggregates raw broker rows into Volume/Value per (Broker, Action)."""
+        ledger = self.quant_engine.build_broker_ledger({day_str: raw})
+        if ledger is None or ledger.empty:
+            return pd.DataFrame(columns=['Volume', 'Value'])
+        # Value is the ledger's rupiah column; Volume may already be rupiah too, so never Volume x price
+        return ledger.groupby(['Broker', 'Action'])[['Volume', 'Value']].sum()
+
+    def poll(self, ticker):
+        """
+        Fetches today's broker summary once and records the change since the previous poll.
+        Returns the delta DataFrame (index=(Broker, Action), cols=['Volume', 'Value']),
+        or None for the first poll of the day (baseline) / failed fetches.
+        """
+        ticker = ticker.upper()
+        now = now_wib()
+        day_str = now.strftime("%Y-%m-%d")
+
+        raw = self.goapi_client.get_broker_summary(ticker, date=day_str)
+        if not raw:
+            return None
+        current = self._aggregate(day_str, raw)
+
+        with self._lock:
+            state = self._state.get(ticker)
+            if state is None or state['date'] != day_str:
+                # New day (or first poll): store baseline only
+                self._state[ticker] = {
+                    'date': day_str, 'raw': raw, 'snapshot': current,
+                    'updated': now, 'deltas': deque(maxlen=self.max_deltas)
+                }
+                return None
+
+            previous = state['snapshot']
+            delta = current.sub(previous, fill_value=0.0)
+            delta = delta[(delta['Volume'] != 0) | (delta['Value'] != 0)]
+
+            # Only the changed aggregates are written back into the snapshot
+            if not delta.empty:
+                state['snapshot'] = previous.add(delta, fill_value=0.0)
+                state['deltas'].append((now, delta))
+            state['raw'] = raw
+            state['updated'] = now
+            return delta
+
+    def get_latest_raw(self, ticker, max_age=None):
+        """Returns the last polled raw broker summary if younger than max_age seconds (default 2x interval)."""
+        max_age = max_age if max_age is not None else self.interval * 2
+        with self._lock:
+            state = self._state.get(ticker.upper())
+            if not state or (now_wib() - state['updated']).total_seconds() > max_age:
+                return None
+            return state['raw']
+
+    def get_flow_since(self, ticker, minutes=30):
+        """
+        Sums the broker deltas of the last N minutes.
+        Returns DataFrame: Index=Broker, Cols=['BuyVol', 'SellVol', 'NetVol', 'NetValue'],
+        sorted by NetVol descending (top net buyers first). None if nothing was tracked.
+        """
+        cutoff = now_wib() - datetime.timedelta(minutes=minutes)
+        with self._lock:
+            state = self._state.get(ticker.upper())
+            if not state:
+                return None
+            recent = [d for ts, d in state['deltas'] if ts >= cutoff]
+
+        if not recent:
+            return pd.DataFrame(columns=['BuyVol', 'SellVol', 'NetVol', 'NetValue'])
+
+        total = pd.concat(recent).groupby(level=['Broker', 'Action']).sum()
+        vol = total['Volume'].unstack(fill_value=0.0).reindex(columns=['BUY', 'SELL'], fill_value=0.0)
+        val = total['Value'].unstack(fill_value=0.0).reindex(columns=['BUY', 'SELL'], fill_value=0.0)
+
+        flow = pd.DataFrame({
+            'BuyVol': vol['BUY'],
+            'SellVol': vol['SELL'],
+            'NetVol': vol['BUY'] - vol['SELL'],
+            'NetValue': val['BUY'] - val['SELL'],
+        })
+        return flow.sort_values('NetVol', ascending=False)
+
+    def summarize_flow(self, ticker, minutes=30, top_n=3):
+        """Short text summary of the last N minutes of broker flow."""
+        flow = self.get_flow_since(ticker, minutes)
+        if flow is None or flow.empty:
+            return f"Belum ada perubahan flow broker dalam {minutes} menit terakhir."
+        buyers = flow[flow['NetVol'] > 0].head(top_n)
+        sellers = flow[flow['NetVol'] < 0].sort_values('NetVol').head(top_n)
+        buy_str = ", ".join(f"{b} (+{v:,.0f})" for b, v in buyers['NetVol'].items()) or "-"
+        sell_str = ", ".join(f"{b} ({v:,.0f})" for b, v in sellers['NetVol'].items()) or "-"
+        return f"Flow {minutes} menit terakhir. Net Buyer: {buy_str}. Net Seller: {sell_str}."
+
+    # --- BACKGROUND POLLING ---
+    def start(self, ticker, interval=None):
+        """Starts polling `ticker` in a background thread (during market hours only)."""
+        ticker = ticker.upper()
+        interval = interval or self.interval
+        stop_event = threading.Event()
+
+        def _run():
+            while not stop_event.is_set():
+                if is_market_open():
+                    try:
+                        self.poll(ticker)
+                    except Exception as e:
+                        print(f"   [Intraday] Poll error for {ticker}: {e}")
+                stop_event.wait(interval)
+
+        thread = threading.Thread(target=_run, name=f"intraday-{ticker}", daemon=True)
+        with self._lock: # Check-and-insert in one step, otherwise two callers start two pollers
+            if ticker in self._threads:
+                return
+            self._threads[ticker] = (thread, stop_event)
+        thread.start()
+
+    def stop(self, ticker=None):
+        """Stops polling one ticker, or all tickers if None."""
+        with self._lock:
+            tickers = [ticker.upper()] if ticker else list(self._threads)
+            entries = [self._threads.pop(t, None) for t in tickers]
+        for entry in entries:
+            if entry:
+                entry[1].set()
+
+    def is_tracking(self, ticker):
+        with self._lock:
+            return ticker.upper() in self._threads
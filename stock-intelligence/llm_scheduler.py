@@ -0,0 +1,125 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+# Process-wide governor for LLM requests.
+# Every Gemini call (from any run_analysis, watchlist scan or background job) takes a
+# slot here first, so the process never exceeds LLM_MAX_CONCURRENCY in-flight requests
+# or LLM_RPM request starts per minute. Waiting callers are served by priority class
+# (interactive UI before background scans), FIFO within a class.
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=4, rpm=60):
+        """
+        :param max_concurrency: Max LLM requests in flight.
+        :param rpm: Max request starts per rolling minute (0 = unlimited).
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rpm = int(rpm)
+
+        self._cond = threading.Condition()
+        self._waiting = []          # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._active = 0
+        self._starts = deque()      # monotonic start times within the last 60s
+        self._waits = {p: deque(maxlen=200) for p in PRIORITY_NAMES}
+        self._counts = {p: 0 for p in PRIORITY_NAMES}
+
+    def _rate_wait(self, now):
+        """Seconds until the RPM window allows another start (0 if allowed now)."""
+        while self._starts and now - self._starts[0] >= 60:
+            self._starts.popleft()
+        if self.rpm <= 0 or len(self._starts) < self.rpm:
+            return 0.0
+        return 60 - (now - self._starts[0])
+
+    def acquire(self, priority=INTERACTIVE):
+        """Blocks until a slot is granted. Returns the queue wait in seconds."""
+        ticket = (priority, next(self._seq))
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket and self._active < self.max_concurrency:
+                    now = time.monotonic()
+                    delay = self._rate_wait(now)
+                    if delay <= 0:
+                        heapq.heappop(self._waiting)
+                        self._active += 1
+                        self._starts.append(now)
+                        waited = now - enqueued
+                        self._waits.setdefault(priority, deque(maxlen=200)).append(waited)
+                        self._counts[priority] = self._counts.get(priority, 0) + 1
+                        # The next ticket may be grantable too
+                        self._cond.notify_all()
+                        return waited
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def run(self, fn, priority=INTERACTIVE):
+        """Runs fn() inside a slot (in the caller's thread)."""
+        self.acquire(priority)
+        try:
+            return fn()
+        finally:
+            self.release()
+
+    def has_capacity(self):
+        """True if a request could start right now without queueing."""
+        with self._cond:
+            return (not self._waiting and self._active < self.max_concurrency
+                    and self._rate_wait(time.monotonic()) <= 0)
+
+    def get_stats(self):
+        """Returns {'active', 'queued', <priority name>: {'requests', 'avg_wait_s', 'p95_wait_s', 'max_wait_s'}}."""
+        with self._cond:
+            report = {"active": self._active, "queued": len(self._waiting)}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits.get(priority, ()))
+                report[name] = {
+                    "requests": self._counts.get(priority, 0),
+                    "avg_wait_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p95_wait_s": round(waits[max(0, int(0.95 * len(waits) + 0.5) - 1)], 3) if waits else 0.0,
+                    "max_wait_s": round(waits[-1], 3) if waits else 0.0,
+                }
+        return report
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Returns the process-wide scheduler (LLM_MAX_CONCURRENCY / LLM_RPM from env)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                    rpm=int(os.getenv("LLM_RPM", "60")),
+                )
+    return _scheduler
+
+def configure_scheduler(max_concurrency=None, rpm=None):
+    """Changes the limits of the process-wide scheduler (waiting callers are re-evaluated)."""
+    scheduler = get_scheduler()
+    with scheduler._cond:
+        if max_concurrency is not None:
+            scheduler.max_concurrency = max(1, int(max_concurrency))
+        if rpm is not None:
+            scheduler.rpm = int(rpm)
+        scheduler._cond.notify_all()
+    return scheduler
@@ -0,0 +1,248 @@
+import os
+import re
+import math
+import json
+import time
+import random
+import hashlib
+import threading
+import concurrent.futures
+
+from catalyst_agent import LLMBackend
+
+# Offline stand-in for Gemini. Returns schema-valid JSON for every Catalyst agent
+# with configurable latency distributions and failure rates, so the whole AI
+# pipeline (concurrency, hedging, deadlines, fallbacks) can be exercised without
+# network access. Enable with LLM_BACKEND=stub or catalyst_agent.set_llm_backend().
+#
+# Latency specs: "fixed:S", "uniform:LO:HI", "normal:MEAN:SD", "lognormal:MEDIAN:SIGMA" (seconds).
+
+class StubLLMError(RuntimeError):
+    pass
+
+def parse_latency(spec):
+    """Parses a latency spec string (or tuple) into a sampler: rng -> seconds."""
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        spec = ("fixed", spec)
+    if isinstance(spec, str):
+        spec = spec.split(":")
+    kind, params = spec[0].lower(), [float(p) for p in spec[1:]]
+
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+# --- CANNED RESPONSES ---
+def _score(digest, offset=0):
+    return 20 + digest[offset] % 61  # 20..80
+
+def _pick(digest, offset, options):
+    return options[digest[offset] % len(options)]
+
+def _technical(digest, prompt):
+    plan = re.search(r"buy=(\d+)-(\d+) sl=(\d+) tp=(\S+)", prompt)
+    buy_area = f"{plan.group(1)} - {plan.group(2)}" if plan else "N/A"
+    return {
+        "sentiment_score": _score(digest, 0),
+        "analysis": "[STUB] Struktur harga dan volume dibaca dari data uji offline.",
+        "action": _pick(digest, 1, ["BUY_ON_WEAKNESS", "BUY_ON_BREAKOUT", "WAIT_AND_SEE", "SELL", "AVOID"]),
+        "trading_plan": {
+            "buy_area": buy_area,
+            "stop_loss": plan.group(3) if plan else "N/A",
+            "target_profit": plan.group(4) if plan else "N/A",
+        },
+        "plan_note": "[STUB] Respons deterministik untuk pengujian.",
+    }
+
+def _bandarmology(digest, prompt):
+    return {
+        "sentiment_score": _score(digest, 2),
+        "status": _pick(digest, 3, ["DISTRIBUSI", "AKUMULASI", "MARK-DOWN", "CHURNING"]),
+        "analysis": "[STUB] Dalam periode data uji, aliran broker disimulasikan secara offline.",
+        "action": _pick(digest, 4, ["BUY", "WAIT", "SELL"]),
+    }
+
+def _fundamental(digest, prompt):
+    return {
+        "sentiment_score": _score(digest, 5),
+        "valuation_status": _pick(digest, 6, ["UNDERVALUED", "FAIR", "OVERVALUED"]),
+        "financial_health": _pick(digest, 7, ["HEALTHY", "RISKY", "DISTRESS"]),
+        "analysis": "[STUB] Rasio keuangan dievaluasi dengan respons uji offline.",
+    }
+
+def _cio(digest, prompt):
+    return {
+        "final_score": _score(digest, 8),
+        "primary_strategy": _pick(digest, 9, ["SWING_TRADE", "INVESTING", "SCALPING", "AVOID"]),
+        "conviction_level": _pick(digest, 10, ["HIGH", "MEDIUM", "LOW"]),
+        "final_reasoning": "[STUB] Keputusan sintetis dari laporan agen uji.",
+        "recommended_action": _pick(digest, 11, ["BUY", "SELL", "WAIT"]),
+        "allocation_size": _pick(digest, 12, ["SMALL (5%)", "MEDIUM (15%)", "ZERO"]),
+        "action_plan": "- [STUB] Risk 1%: max loss 1 Juta.\n- Cicil beli 2 tahap.\n- Cut loss di bawah support.",
+    }
+
+def _batch(single):
+    def build(digest, prompt):
+        tickers = re.findall(r"^\[([A-Z0-9.\-]+)\]", prompt, re.MULTILINE)
+        items = []
+        for t in tickers:
+            item = single(hashlib.sha256(f"{t}|{prompt}".encode("utf-8")).digest(), prompt)
+            items.append({"ticker": t, **item})
+        return items
+    return build
+
+RESPONSES = {
+    "technical": _technical,
+    "bandarmology": _bandarmology,
+    "fundamental": _fundamental,
+    "cio": _cio,
+    "technical_batch": _batch(_technical),
+    "fundamental_batch": _batch(_fundamental),
+}
+
+# --- STREAMING CHUNKS (genai-compatible) ---
+class _Usage:
+    def __init__(self, prompt_token_count):
+        self.prompt_token_count = prompt_token_count
+
+class _Chunk:
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+class StubModel:
+    def __init__(self, backend, model_name, agent, system_instruction=None):
+        self.backend = backend
+        self.model_name = f"stub/{model_name}"
+        self.agent = agent
+        self.system_instruction = system_instruction or ""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        chunks = self.backend.respond(self.agent, self.system_instruction, prompt)
+        if stream:
+            return chunks
+        chunks = list(chunks)
+        return _Chunk("".join(c.text for c in chunks), chunks[-1].usage_metadata if chunks else None)
+
+class StubBackend(LLMBackend):
+    name = "stub"
+
+    def __init__(self, latency="fixed:0", agent_latency=None, failure_rate=0.0, malformed_rate=0.0,
+                 seed=None, chunk_size=40, ttft_share=0.4):
+        """
+        :param latency: Default latency spec for every agent.
+        :param agent_latency: {agent: spec} overrides.
+        :param failure_rate: Probability a call raises StubLLMError (after part of its latency).
+        :param malformed_rate: Probability the answer is cut mid-JSON.
+        :param ttft_share: Share of the latency spent before the first chunk.
+        """
+        self.default_latency = parse_latency(latency)
+        self.agent_latency = {a: parse_latency(s) for a, s in (agent_latency or {}).items()}
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.chunk_size = chunk_size
+        self.ttft_share = ttft_share
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "malformed": 0}
+
+    @classmethod
+    def from_env(cls):
+        agent_latency = {}
+        for agent in RESPONSES:
+            spec = os.getenv(f"LLM_STUB_LATENCY_{agent.upper()}")
+            if spec:
+                agent_latency[agent] = spec
+        seed = os.getenv("LLM_STUB_SEED")
+        return cls(
+            latency=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+            agent_latency=agent_latency,
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", "0")),
+            malformed_rate=float(os.getenv("LLM_STUB_MALFORMED_RATE", "0")),
+            seed=int(seed) if seed else None,
+        )
+
+    def create_model(self, model_name, agent=None, tools=None, system_instruction=None):
+        return StubModel(self, model_name, agent, system_instruction)
+
+    def _draw(self, agent):
+        sampler = self.agent_latency.get(agent, self.default_latency)
+        with self._rng_lock:
+            return sampler(self._rng), self._rng.random(), self._rng.random()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def respond(self, agent, system_instruction, prompt):
+        """Generator of response chunks; sleeps according to the agent's latency distribution."""
+        latency, fail_roll, malformed_roll = self._draw(agent)
+        self._count("calls")
+
+        if fail_roll < self.failure_rate:
+            time.sleep(latency * self.ttft_share)
+            self._count("failures")
+            raise StubLLMError(f"Stub failure ({agent})")
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        builder = RESPONSES.get(agent, _technical)
+        text = json.dumps(builder(digest, prompt), ensure_ascii=False)
+        if malformed_roll < self.malformed_rate:
+            self._count("malformed")
+            text = text[:len(text) // 2]
+
+        usage = _Usage((len(system_instruction) + len(prompt)) // 4)
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        return self._stream(pieces, usage, latency)
+
+    def _stream(self, pieces, usage, latency):
+        time.sleep(latency * self.ttft_share)
+        per_chunk = latency * (1 - self.ttft_share) / len(pieces)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(per_chunk)
+            yield _Chunk(piece, usage)
+
+# --- BENCHMARK ---
+def benchmark(fn, runs=20, concurrency=4):
+    """
+    Calls fn(i) `runs` times across `concurrency` threads.
+    Returns {'runs', 'errors', 'wall_s', 'throughput_per_min', 'p50_s', 'p95_s', 'max_s'}.
+    """
+    def timed(i):
+        start = time.monotonic()
+        try:
+            fn(i)
+            return time.monotonic() - start, None
+        except Exception as e:
+            return time.monotonic() - start, e
+
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(runs)))
+    wall = time.monotonic() - start
+
+    latencies = sorted(r[0] for r in results)
+    def pct(p):
+        return latencies[max(0, int(round(p * len(latencies))) - 1)] if latencies else 0.0
+
+    return {
+        "runs": runs,
+        "errors": sum(1 for r in results if r[1] is not None),
+        "wall_s": round(wall, 3),
+        "throughput_per_min": round(runs / wall * 60, 1) if wall else 0.0,
+        "p50_s": round(pct(0.5), 3),
+        "p95_s": round(pct(0.95), 3),
+        "max_s": round(latencies[-1], 3) if latencies else 0.0,
+    }
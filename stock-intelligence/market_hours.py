@@ -0,0 +1,79 @@
+import os
+import datetime
+
+# IDX trades in WIB (UTC+7, no DST)
+WIB = datetime.timezone(datetime.timedelta(hours=7))
+
+MARKET_OPEN = datetime.time(9, 0)
+MARKET_CLOSE = datetime.time(16, 0) # Includes pre-closing auction
+
+# Lunch break per weekday (Mon-Thu vs Friday prayer break)
+SESSION_BREAK = {
+    "default": (datetime.time(12, 0), datetime.time(13, 30)),
+    "friday": (datetime.time(11, 30), datetime.time(14, 0)),
+}
+
+def now_wib():
+    return datetime.datetime.now(WIB)
+
+def _to_wib(now):
+    if now is None:
+        return now_wib()
+    if now.tzinfo is None:
+        # Naive datetimes are treated as local WIB time
+        return now.replace(tzinfo=WIB)
+    return now.astimezone(WIB)
+
+def _session_break(day):
+    return SESSION_BREAK["friday"] if day.weekday() == 4 else SESSION_BREAK["default"]
+
+def is_trading_day(day):
+    """Weekday check only; exchange holidays are not known here."""
+    return day.weekday() < 5
+
+def is_market_open(now=None):
+    """True if IDX is in a continuous trading session at `now` (WIB)."""
+    now = _to_wib(now)
+    if not is_trading_day(now):
+        return False
+    t = now.time()
+    if not (MARKET_OPEN <= t < MARKET_CLOSE):
+        return False
+    break_start, break_end = _session_break(now)
+    return not (break_start <= t < break_end)
+
+def next_session_start(now=None):
+    """Returns the next time (WIB) trading starts or resumes after `now`."""
+    now = _to_wib(now)
+    break_start, break_end = _session_break(now)
+    if is_trading_day(now):
+        t = now.time()
+        if t < MARKET_OPEN:
+            return datetime.datetime.combine(now.date(), MARKET_OPEN, WIB)
+        if break_start <= t < break_end:
+            return datetime.datetime.combine(now.date(), break_end, WIB)
+
+    day = now.date() + datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return datetime.datetime.combine(day, MARKET_OPEN, WIB)
+
+# How long an analysis stays valid while the market is open, per chart timeframe
+# (the current bar keeps forming, so results are refreshed on this cadence)
+RESULT_REFRESH_MINUTES = {
+    "daily": int(os.getenv("ANALYSIS_REFRESH_MINUTES", "15")),
+    "weekly": 60,
+    "monthly": 240,
+}
+
+def result_valid_until(saved_at, timeframe="daily"):
+    """
+    Freshness of an analysis computed at `saved_at` (WIB):
+    during a session it expires after the timeframe's refresh cadence,
+    outside trading (break, evening, weekend) it stays valid until the next session starts.
+    """
+    saved_at = _to_wib(saved_at)
+    if is_market_open(saved_at):
+        minutes = RESULT_REFRESH_MINUTES.get(timeframe, RESULT_REFRESH_MINUTES["daily"])
+        return saved_at + datetime.timedelta(minutes=minutes)
+    return next_session_start(saved_at)
@@ -0,0 +1,176 @@
+import io
+import os
+import csv
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# CSV / XLSX import and export for the portfolio and the favorites watchlist.
+# Headers are matched loosely, so broker statements can be loaded as-is
+# (e.g. "Kode Saham", "Harga Rata-rata", "Lot" or "Shares"/"Lembar").
+
+TICKER_COLUMNS = ("ticker", "kode", "kode saham", "stock", "saham", "symbol", "code", "emiten")
+PRICE_COLUMNS = ("avg_price", "avg price", "average price", "avg", "harga rata-rata", "harga rata rata", "harga", "price")
+LOTS_COLUMNS = ("lots", "lot", "qty (lot)", "jumlah lot")
+SHARES_COLUMNS = ("shares", "qty", "quantity", "lembar", "volume")
+SHARES_PER_LOT = 100
+KNOWN_COLUMNS = set(TICKER_COLUMNS + PRICE_COLUMNS + LOTS_COLUMNS + SHARES_COLUMNS)
+
+PORTFOLIO_HEADERS = ["ticker", "avg_price", "lots"]
+WATCHLIST_HEADERS = ["ticker"]
+
+def _format(name, fmt=None):
+    fmt = (fmt or os.path.splitext(str(name or ""))[1].lstrip(".") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        raise ValueError(f"Unsupported file format: {fmt} (use .csv or .xlsx)")
+    return fmt
+
+def _require_openpyxl():
+    if openpyxl is None:
+        raise RuntimeError("openpyxl is not installed (pip install openpyxl) - XLSX import/export unavailable.")
+
+def read_rows(source, filename=None):
+    """
+    Reads a CSV/XLSX table into a list of {header: value} dicts (headers lower-cased).
+    source: path or binary file-like object (then `filename` gives the format).
+    """
+    fmt = _format((filename or source) if isinstance(source, (str, os.PathLike)) else filename)
+    if fmt == "xlsx":
+        _require_openpyxl()
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            table = [list(row) for row in wb.active.iter_rows(values_only=True)]
+        finally:
+            wb.close()
+    else:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding="utf-8-sig", newline="") as f:
+                text = f.read()
+        else:
+            text = source.read()
+            text = text.decode("utf-8-sig") if isinstance(text, bytes) else text
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        table = list(csv.reader(io.StringIO(text), dialect))
+
+    # Header = first non-empty row; without known headers the columns are positional
+    # (ticker, avg_price, lots), e.g. a plain list of tickers
+    table = [row for row in table if any(v not in (None, "") for v in row)]
+    if not table:
+        return []
+    headers = [str(h or "").strip().lower() for h in table[0]]
+    if not KNOWN_COLUMNS.intersection(headers):
+        headers = PORTFOLIO_HEADERS + [str(i) for i in range(len(PORTFOLIO_HEADERS), len(headers))]
+        return [dict(zip(headers, row)) for row in table]
+    return [dict(zip(headers, row)) for row in table[1:]]
+
+def _pick(row, names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _clean_ticker(value):
+    ticker = str(value or "").strip().upper()
+    return ticker[:-3] if ticker.endswith(".JK") else ticker
+
+def _to_number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace("Rp", "").replace(" ", "")
+    # "1.234.567" / "3.500" / "1.234,5" (Indonesian) vs "1,234.5" / "1234,5"
+    if (text.count(".") > 1 or ("," in text and "." in text and text.index(".") < text.index(","))
+            or ("," not in text and text.count(".") == 1 and len(text.split(".")[-1]) == 3)):
+        text = text.replace(".", "").replace(",", ".")
+    elif "," in text and "." not in text and len(text.split(",")[-1]) != 3:
+        text = text.replace(",", ".")
+    else:
+        text = text.replace(",", "")
+    return float(text)
+
+def merge_position(existing, price, lots):
+    """Weighted average of an existing {'avg_price', 'lots'} position and a new buy. Returns (avg_price, lots)."""
+    if not existing:
+        return price, lots
+    total_lots = existing["lots"] + lots
+    if total_lots <= 0:
+        return 0, total_lots
+    return (existing["avg_price"] * existing["lots"] + price * lots) / total_lots, total_lots
+
+def parse_portfolio(rows):
+    """
+    Turns imported rows into positions. Repeated tickers (several buys) are averaged.
+    Returns (items, errors): items = [{'ticker', 'avg_price', 'lots'}], errors = ["row N: ..."].
+    """
+    positions = {}
+    errors = []
+    for idx, row in enumerate(rows, start=2): # Row 1 is the header
+        ticker = _clean_ticker(_pick(row, TICKER_COLUMNS))
+        if not ticker:
+            errors.append(f"row {idx}: missing ticker")
+            continue
+        try:
+            price = _to_number(_pick(row, PRICE_COLUMNS))
+            lots = _pick(row, LOTS_COLUMNS)
+            if lots is not None:
+                lots = int(_to_number(lots))
+            else:
+                lots = int(_to_number(_pick(row, SHARES_COLUMNS)) // SHARES_PER_LOT)
+        except (TypeError, ValueError):
+            errors.append(f"row {idx}: invalid price/lots for {ticker}")
+            continue
+        if price <= 0 or lots <= 0:
+            errors.append(f"row {idx}: price and lots must be positive for {ticker}")
+            continue
+
+        avg_price, total_lots = merge_position(positions.get(ticker), price, lots)
+        positions[ticker] = {"ticker": ticker, "avg_price": avg_price, "lots": total_lots}
+    return list(positions.values()), errors
+
+def parse_watchlist(rows):
+    """Tickers from imported rows. Order kept, duplicates dropped."""
+    tickers = []
+    for row in rows:
+        ticker = _clean_ticker(_pick(row, TICKER_COLUMNS))
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+def write_rows(target, headers, rows, fmt=None):
+    """Writes rows (lists) under headers to a path or binary file-like object as CSV/XLSX."""
+    fmt = _format(target if isinstance(target, (str, os.PathLike)) else None, fmt)
+    if fmt == "xlsx":
+        _require_openpyxl()
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(headers)
+        for row in rows:
+            ws.append(list(row))
+        wb.save(target)
+        return target
+
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows)
+    else:
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(headers)
+        writer.writerows(rows)
+        target.write(text.getvalue().encode("utf-8"))
+    return target
+
+def export_portfolio(target, items, fmt=None):
+    return write_rows(target, PORTFOLIO_HEADERS, [
+        [item["ticker"], round(item["avg_price"], 2), item["lots"]] for item in items
+    ], fmt)
+
+def export_watchlist(target, tickers, fmt=None):
+    return write_rows(target, WATCHLIST_HEADERS, [[t] for t in tickers], fmt)
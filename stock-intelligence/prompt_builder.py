@@ -0,0 +1,292 @@
+import math
+import threading
+
+# Prompt building for the Catalyst agents.
+# Static instructions (role, rules, output schema) are returned separately so they can
+# be sent as the model's system_instruction: they are byte-identical across calls and
+# can be reused by provider-side context caching. The per-call prompt only carries a
+# compact key=value / pipe-table encoding of the market data, trimmed to a token budget.
+
+LANGUAGE_RULE = "LANGUAGE: STRICTLY INDONESIAN (BAHASA INDONESIA). Semua teks output dalam Bahasa Indonesia."
+
+DATA_RULES = """[ANTI-HALLUCINATION POLICY]:
+1. STRICTLY use the provided data. Do NOT invent numbers.
+2. If data is 'N/A' or 0, state it as "Unknown" or "Neutral".
+3. Do not assume news if not provided.
+4. Data format: 'key=value' pairs and 'a|b|c' tables. Output ONLY the requested JSON."""
+
+# Max input tokens of the per-call prompt (system instruction excluded)
+TOKEN_BUDGET = {
+    "technical": 450,
+    "bandarmology": 400,
+    "fundamental": 120,
+    "cio": 650,
+    "technical_batch": 120,   # per ticker
+    "fundamental_batch": 40,  # per ticker
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+# --- SYSTEM INSTRUCTIONS ---
+TECHNICAL_ROLES = {
+    "SCALPING": ("Aggressive Day Trader (Scalper)", "Intraday Momentum & Volatility Spikes", "Tight (Low Risk)"),
+    "SWING": ("Senior Trader & Risk Manager", "Swing Trading (Follow Trend)", "Standard (1 ATR)"),
+    "INVESTING": ("Long-Term Technical Analyst", "Major Trend & key Support/Resistance (Ignore Noise)", "Loose (Major Support)"),
+}
+
+TECHNICAL_OUTPUT = """{
+    "sentiment_score": (0-100, <40=Bearish, >60=Bullish),
+    "analysis": "Analisis teknikal padat (max 150 kata). Fokus pada Price Action & Volume.",
+    "action": "BUY_ON_WEAKNESS / BUY_ON_BREAKOUT / WAIT_AND_SEE / SELL / AVOID",
+    "trading_plan": {
+        "buy_area": "Range harga beli (Wajib isi, jika Bearish isi area Support terdekat untuk pantau)",
+        "stop_loss": "Harga SL (Critical Support - 1 ATR)",
+        "target_profit": "Target harga (Resistance)"
+    },
+    "plan_note": "Isi pesan tambahan jika plan ini high risk atau 'Wait for Confirmation'"
+}"""
+
+def technical_system(style="SWING", batch=False):
+    role, focus, sl_rule = TECHNICAL_ROLES.get(style, TECHNICAL_ROLES["SWING"])
+    if batch:
+        output = ("JSON ARRAY, satu objek per saham (urutan sama dengan input), "
+                  "setiap objek = {\"ticker\": \"KODE\", ...field di bawah (analysis max 60 kata)}:\n" + TECHNICAL_OUTPUT)
+    else:
+        output = "JSON:\n" + TECHNICAL_OUTPUT
+    return f"""Bertindaklah sebagai {role}.
+Tugasmu bukan hanya membaca indikator, tapi menyusun TRADING PLAN ({focus}). Strategi: {style}. Stop Loss: {sl_rule}.
+
+[STRATEGY CONTEXT]
+- SCALPING: Prioritaskan Volume Spikes, DOM, & Momentum jangka pendek. Hiraukan Valuasi.
+- SWING: Cari Trend Follow atau Reversal Confirmation yang valid.
+- INVESTING: Cari Entry point di Support Kuat (Buy on Weakness) untuk jangka panjang.
+
+{DATA_RULES}
+{LANGUAGE_RULE}
+
+[FIELD LEGEND]: px=Harga, adx>25=Strong Trend / <20=Choppy, vol=Volume (ratio vs rata-rata; turun + >2x = waspada distribusi),
+atr=Volatilitas (jarak SL), piv/fib=Support-Resistance referensi, plan=Trading plan terkalkulasi (REFERENSI UTAMA, pertahankan Risk Profile).
+
+TUGAS ANALISIS:
+1. Cek Market Structure: Higher High (Uptrend) atau Lower Low (Downtrend)?
+2. Cek Divergence antara Harga vs Indikator.
+3. Tentukan Skenario Bullish (breakout/rebound) dan Bearish (breakdown).
+
+OUTPUT {output}"""
+
+def bandarmology_system(broker_hint):
+    return f"""ROLE: Investigator Bandarmologi Profesional (Market Flow Detective).
+TUGAS: Analisis aliran dana institusi (smart money) menggunakan metode TOP-DOWN (Peta Besar vs Trigger Harian).
+
+[DATA INTEGRITY RULES]:
+1. Base your analysis PURELY on the Forensik Data.
+2. {LANGUAGE_RULE}
+3. CITATION MANDATORY: You MUST explicitly mention the timeframe of MAP (e.g. "Dalam 20 hari terakhir...").
+{DATA_RULES}
+
+[BROKER INTELLIGENCE (HINTS)]:
+{broker_hint}
+
+[FIELD LEGEND]: MAP=Peta Besar (periode N hari), TRIGGER=Hari Ini, bandar_avg=Avg Price Bandar vs px=Harga Market.
+
+LOGIKA DETEKSI (TOP-DOWN):
+1. [STRONG BUY]: MAP=AKUMULASI (Institusi), px DEKAT bandar_avg, TRIGGER=Institusi beli lagi.
+2. [TRAP / DISTRIBUTION]: MAP=DISTRIBUSI, TRIGGER=Akumulasi RETAIL (Top Buyer retail) -> pancingan. Hati-hati / Sell on Strength.
+3. [MARKDOWN ACCUMULATION]: MAP=Akumulasi, TRIGGER=Harga turun tapi Institusi tampung atau Asing masuk. Cicil Beli (Buy on Weakness).
+
+OUTPUT JSON:
+{{
+    "sentiment_score": (0=Distribusi Total, 50=Netral, 100=Strong Accumulation),
+    "status": "DISTRIBUSI / AKUMULASI / MARK-DOWN / CHURNING",
+    "analysis": "Analisis naratif tajam (Max 150 kata). WAJIB MENCANTUMKAN DURASI. Fokus pada pemain utama (Retail vs Institusi) berdasarkan Kode Broker.",
+    "action": "BUY / WAIT / SELL"
+}}"""
+
+FUNDAMENTAL_OUTPUT = """{
+    "sentiment_score": (0-100, <40=Bad Fundamentals, >70=Strong Fundamentals),
+    "valuation_status": "UNDERVALUED / FAIR / OVERVALUED",
+    "financial_health": "HEALTHY / RISKY / DISTRESS",
+    "analysis": "Ringkasan fundamental max 100 kata. Highlight rasio kunci."
+}"""
+
+def fundamental_system(batch=False):
+    if batch:
+        output = ("JSON ARRAY, satu objek per emiten, setiap objek = "
+                  "{\"ticker\": \"KODE\", ...field di bawah (analysis max 50 kata)}:\n" + FUNDAMENTAL_OUTPUT)
+    else:
+        output = "JSON:\n" + FUNDAMENTAL_OUTPUT
+    return f"""Bertindaklah sebagai Senior Equity Research Analyst (Value Investing approach).
+
+[STRICT DATA ONLY]:
+- Use the provided Financial Data ratios. Do not retrieve outside data.
+- If a ratio is 'N/A', ignore it or label as 'Data Unavailable'.
+- {LANGUAGE_RULE} Use formal investment terms in Indonesian.
+
+[FIELD LEGEND]: per=PE Ratio, pbv=PBV, roe=ROE %, der=Debt to Equity (x), eps_g=EPS Growth YoY %.
+
+TUGAS:
+1. Valuasi: Undervalued, Fair, atau Overvalued?
+2. Kesehatan: Utang aman (DER < 1.5)? Profitabilitas kuat (ROE > 10%)?
+3. Growth: Apakah perusahaan bertumbuh?
+
+OUTPUT {output}"""
+
+CIO_GUIDANCE = {
+    "SCALPING": """[STRATEGY: SCALPING / FAST TRADE]
+- FOKUS UTAMA: Momentum, Volume, & Bandarmology Flow (Hari Ini).
+- FUNDAMENTAL: "IGNORE" (Abaikan valuasi mahal/murah, fokus hanya pada liquiditas).
+- ACTION: Jika Volume Spike + Bandar Akumulasi = BUY Agresif (Stop Loss Ketat).""",
+    "INVESTING": """[STRATEGY: LONG TERM INVESTING]
+- FOKUS UTAMA: Fundamental (Valuasi Murah + Growth) & 'The Map' Bandarmology.
+- TECHNICAL: Gunakan hanya untuk Entry di Support (Buy on Weakness). Hiraukan noise harian.
+- ACTION: Jika Fundamental Bagus + Valuasi Murah = BUY & HOLD.""",
+    "SWING": """[STRATEGY: SWING TRADING (Default)]
+- FOKUS: Keseimbangan Teknikal (Trend) & Bandarmology.
+- FUNDAMENTAL: Check kesehatan (hindari saham gorengan berhutang tinggi).
+- LOGIKA PENIMBANGAN (WEIGHTING):
+  - Jika Fundamental JELEK tapi Teknikal & Bandar BAGUS -> "Speculative Buy" (Short Term only).
+  - Jika Fundamental BAGUS dan Teknikal BAGUS -> "Strong Buy" (Swing/Invest).
+  - Jika Bandarmologi "DISTRIBUSI MASIF", abaikan sinyal Buy teknikal (Risk of False Breakout).""",
+}
+
+def cio_system(style="SWING"):
+    return f"""Anda adalah Chief Investment Officer (CIO) dengan memegang strategi: {style}.
+Ambil keputusan final: BELI, JUAL, atau TAHAN berdasarkan laporan TECH, BANDAR, dan FUND.
+
+{CIO_GUIDANCE.get(style, CIO_GUIDANCE["SWING"])}
+
+[REQUIREMENT: DETAILED ACTION PLAN]:
+1. "Risk 1% Rule" calculation example (Assume 100 Mio Portfolio -> Max Risk 1 Mio).
+2. Position Sizing advice (e.g. "Potong Size 1/3", "Cicil Beli").
+3. Strict Exit rules (e.g. "Buang jika closing di bawah support").
+
+{LANGUAGE_RULE}
+
+OUTPUT JSON:
+{{
+    "final_score": (0-100),
+    "primary_strategy": "SWING_TRADE / INVESTING / SCALPING / AVOID",
+    "conviction_level": "HIGH / MEDIUM / LOW",
+    "final_reasoning": "Kesimpulan tegas max 3 kalimat. Gabungkan ketiga perspektif.",
+    "recommended_action": "BUY / SELL / WAIT",
+    "allocation_size": "SMALL (5%) / MEDIUM (15%) / AGGRESSIVE (25%) / ZERO",
+    "action_plan": "Tulis rencana eksekusi detail (Risk Rule, Cicil Beli, Cut Loss) dalam format poin-poin singkat."
+}}"""
+
+# --- COMPACT ENCODING ---
+def fmt_num(value, digits=0):
+    """Formats numbers compactly ('N/A' for missing / non-numeric values)."""
+    if value is None:
+        return "N/A"
+    try:
+        num = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(num):
+        return "N/A"
+    if digits == 0 or num == int(num):
+        return f"{num:.0f}"
+    return f"{num:.{digits}f}"
+
+def kv(**fields):
+    """Encodes fields as a single 'key=value key=value' line (None values are skipped)."""
+    return " ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+
+def table(header, rows):
+    """Encodes rows as a pipe table with a single header line."""
+    lines = ["|".join(header)]
+    lines.extend("|".join(str(c) for c in row) for row in rows)
+    return "\n".join(lines)
+
+def compact_history(history_str):
+    """Re-encodes the 'Date | Close | Vol' history block from technical_analysis without padding."""
+    if not history_str or "|" not in history_str:
+        return None
+    lines = []
+    for line in history_str.strip().splitlines():
+        cells = [c.strip() for c in line.split("|") if c.strip()]
+        if cells:
+            lines.append("|".join(cells))
+    return "\n".join(lines)
+
+def technical_block(ticker, ta_data, plan):
+    """One compact data block for the technical agent (also used per-ticker in batch mode)."""
+    pivots = ta_data.get('pivots') or {}
+    fib = ta_data.get('fib_levels') or {}
+    lines = [
+        f"[{ticker}] " + kv(
+            px=fmt_num(ta_data.get('price')),
+            trend=ta_data.get('trend', 'N/A'),
+            adx=fmt_num(ta_data.get('adx', 0), 1),
+            rsi=fmt_num(ta_data.get('rsi'), 1),
+            macd=ta_data.get('macd_status', 'N/A'),
+            vol=f"{ta_data.get('vol_status', 'N/A')}({fmt_num(ta_data.get('vol_ratio', 0), 2)}x)",
+            atr=fmt_num(ta_data.get('atr', 0)),
+        ),
+        "piv " + kv(P=fmt_num(pivots.get('pivot')), S1=fmt_num(pivots.get('s1')), S2=fmt_num(pivots.get('s2')),
+                    R1=fmt_num(pivots.get('r1')), R2=fmt_num(pivots.get('r2'))),
+        "fib " + kv(**{"0.236": fmt_num(fib.get(0.236)), "0.382": fmt_num(fib.get(0.382)), "0.618": fmt_num(fib.get(0.618))}),
+        f"plan({plan['label']}) " + kv(
+            buy=f"{fmt_num(plan['buy_area_low'])}-{fmt_num(plan['price'])}",
+            sl=fmt_num(plan['stop_loss']),
+            tp=plan['target_str'].replace(" ", ""),
+        ) + (f" note: {plan['note']}" if plan.get('note') else ""),
+    ]
+    return "\n".join(lines)
+
+# --- TOKEN ACCOUNTING & BUDGETS ---
+# Estimates use a chars-per-token ratio that is calibrated per model from the
+# prompt_token_count reported by the API (usage metadata of real calls).
+_ratios = {}
+_usage = {}
+_usage_lock = threading.Lock()
+
+def estimate_tokens(text, model_name=None):
+    ratio = _ratios.get(model_name, DEFAULT_CHARS_PER_TOKEN)
+    return int(math.ceil(len(text) / ratio)) if text else 0
+
+def truncate_to_tokens(text, max_tokens, model_name=None):
+    """Cuts text to roughly max_tokens (on a word boundary), marking the cut with '…'."""
+    if not text or estimate_tokens(text, model_name) <= max_tokens:
+        return text
+    max_chars = int(max_tokens * _ratios.get(model_name, DEFAULT_CHARS_PER_TOKEN))
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return cut + "…"
+
+def fit_to_budget(sections, budget, model_name=None):
+    """
+    Joins prompt sections under a token budget.
+    sections: list of (text, droppable) in priority order (most important first).
+    Droppable sections are removed from the end first; the remainder is truncated.
+    """
+    kept = [(text, droppable) for text, droppable in sections if text]
+    joined = "\n".join(text for text, _ in kept)
+    while estimate_tokens(joined, model_name) > budget and any(d for _, d in kept):
+        last = max(i for i, (_, d) in enumerate(kept) if d)
+        kept.pop(last)
+        joined = "\n".join(text for text, _ in kept)
+    return truncate_to_tokens(joined, budget, model_name)
+
+def record_usage(agent, model_name, prompt_chars, prompt_tokens):
+    """Stores a measured prompt token count and recalibrates the model's chars/token ratio."""
+    if not prompt_tokens:
+        return
+    with _usage_lock:
+        stats = _usage.setdefault(agent, {"calls": 0, "input_tokens": 0})
+        stats["calls"] += 1
+        stats["input_tokens"] += prompt_tokens
+        if prompt_chars:
+            measured = prompt_chars / prompt_tokens
+            previous = _ratios.get(model_name)
+            _ratios[model_name] = measured if previous is None else 0.8 * previous + 0.2 * measured
+
+def get_token_stats():
+    """
+    Returns {agent: {'calls', 'input_tokens', 'avg_input_tokens', 'prompt_budget'}} from measured usage.
+    Measured input tokens include the system instruction; prompt_budget covers the per-call prompt only.
+    """
+    with _usage_lock:
+        report = {agent: dict(v) for agent, v in _usage.items()}
+    for agent, v in report.items():
+        v["avg_input_tokens"] = round(v["input_tokens"] / v["calls"]) if v["calls"] else 0
+        v["prompt_budget"] = TOKEN_BUDGET.get(agent)
+    return report
@@ -1,21 +1,28 @@
+import datetime
 import pandas as pd
 import numpy as np
 try:
     from goapi_client import GoApiClient
 except ImportError:
     GoApiClient = None
+try:
+    import db_manager
+except ImportError:
+    db_manager = None
+from broker_registry import get_registry, RETAIL, SMART_MONEY
 
 class QuantAnalyzer:
     def __init__(self, goapi_client=None):
         self.goapi_client = goapi_client
-        # Daftar Broker Retail (Contoh)
-        self.retail_brokers = ['YP', 'PD', 'CC', 'NI', 'XC', 'XL', 'KK']
-        # Daftar Broker Institusi/Asing (Contoh)
-        self.insti_brokers = ['BK', 'ZP', 'AK', 'KZ', 'RX', 'CS', 'CG']
+        # Klasifikasi Broker (Retail / Institusi / Asing / Local Big) dari registry bersama
+        self.registry = get_registry()
+        self.retail_brokers = self.registry.retail
+        self.insti_brokers = self.registry.smart_money
 
-    def fetch_real_bandarmology(self, ticker):
+    def fetch_real_bandarmology(self, ticker, broker_data=None):
         """
         Fetches and analyzes real Broker Summary and Foreign Flow from GoAPI if available.
+        broker_data: Optional already-fetched raw broker summary (e.g. from the intraday tracker).
         Returns a combined dictionary of scores and status.
         """
         if not self.goapi_client or not self.goapi_client.check_connection():
@@ -24,11 +31,12 @@ class QuantAnalyzer:
         print(f"   [Quant] Fetching Real Bandarmology Data for {ticker} from GoAPI...")
         
         # 1. Broker Summary
-        broker_data = self.goapi_client.get_broker_summary(ticker)
+        if broker_data is None:
+            broker_data = self.goapi_client.get_broker_summary(ticker)
         bs_result = self._process_goapi_broker_data(broker_data)
         
-        # 2. Foreign Flow
-        foreign_data = self.goapi_client.get_foreign_flow(ticker)
+        # 2. Foreign Flow (Multi-day series, cached per ticker)
+        foreign_data = self.get_foreign_flow_series(ticker)
         ff_result = self._process_goapi_foreign_data(foreign_data)
         
         return {
@@ -36,6 +44,43 @@ class QuantAnalyzer:
             "foreign_flow": ff_result
         }
 
+    def get_foreign_flow_series(self, ticker, days=60):
+        """
+        Returns the daily Foreign Flow series (oldest first) for the last N trading days.
+        Past days are stored in the local DB and never refetched; only missing days
+        and TODAY (still changing intraday) are fetched, concurrently.
+        """
+        if not self.goapi_client:
+            return None
+            
+        dates = self.goapi_client.get_recent_trading_dates(days)
+        today_str = datetime.date.today().strftime("%Y-%m-%d")
+        oldest_str = dates[-1].strftime("%Y-%m-%d")
+        
+        known = {}
+        if db_manager:
+            try:
+                known = db_manager.get_foreign_flow(ticker, since_date=oldest_str)
+            except Exception as e:
+                print(f"   [Quant] Foreign Flow cache unavailable: {e}")
+        
+        missing = [d for d in dates if d.strftime("%Y-%m-%d") == today_str or d.strftime("%Y-%m-%d") not in known]
+        if missing:
+            print(f"   [Quant] Fetching {len(missing)} day(s) of Foreign Flow for {ticker} ({len(known)} cached)...")
+            fetched = self.goapi_client.get_foreign_flow_history(ticker, missing)
+            
+            # Only completed days are final; today's numbers keep changing until close.
+            final_rows = [r for d_str, r in fetched.items() if d_str != today_str]
+            if db_manager and final_rows:
+                try:
+                    db_manager.save_foreign_flow(ticker, final_rows)
+                except Exception as e:
+                    print(f"   [Quant] Failed to cache Foreign Flow: {e}")
+            known.update(fetched)
+        
+        series = [known[d_str] for d_str in sorted(known) if d_str >= oldest_str and known[d_str].get('has_data')]
+        return series or None
+
     def _process_goapi_broker_data(self, data):
         """Parses GoAPI broker summary response into analysis format."""
         if not data:
@@ -137,15 +182,10 @@ class QuantAnalyzer:
         # 4. Kalkulasi Kekuatan (Accumulation/Distribution) - DOMINANCE LOGIC
         # Fix: Don't just look at Top 1. Look at Top 3 Aggregate.
         
-        top3_inst_buy_vol = 0
-        top3_retail_buy_vol = 0
-        
-        for b in top3_buyers:
-            vol = buys.loc[b]['Volume']
-            if b in self.insti_brokers:
-                top3_inst_buy_vol += vol
-            else:
-                top3_retail_buy_vol += vol
+        top3_buys = buys.head(3)
+        inst_mask = (self.registry.flag_array(top3_buys.index) & SMART_MONEY) > 0
+        top3_inst_buy_vol = top3_buys['Volume'].to_numpy()[inst_mask].sum()
+        top3_retail_buy_vol = top3_buys['Volume'].to_numpy()[~inst_mask].sum()
                 
         # Determine Dominant Buyer Type
         buyer_type = "Retail"
@@ -181,13 +221,9 @@ class QuantAnalyzer:
         
         # Special Logic: Retail Sell + Inst Buy = Strongest Signal
         seller_type = "Institusi"
-        top3_retail_sell_vol = 0
-        for b in top3_sellers:
-            if b in self.retail_brokers:
-                top3_retail_sell_vol += buys.loc[b]['Volume'] if b in buys.index else 0 # Careful, sellers index in buys? No.
-                # Correct logic:
-                vol_sell = sells.loc[b]['Volume']
-                top3_retail_sell_vol += vol_sell
+        top3_sells = sells.head(3)
+        retail_mask = (self.registry.flag_array(top3_sells.index) & RETAIL) > 0
+        top3_retail_sell_vol = top3_sells['Volume'].to_numpy()[retail_mask].sum()
                 
         if top3_retail_sell_vol > (top3_sell_vol * 0.5): # If >50% sell volume is Retail
              seller_type = "Retail"
@@ -254,9 +290,11 @@ class QuantAnalyzer:
         top3_buyers = top_buyers[:3]
         top3_sellers = top_sellers[:3]
         
-        for b, vol in top3_buyers:
-            if b in self.insti_brokers: total_inst_buy += vol
-            else: total_retail_buy += vol
+        if top3_buyers:
+            codes, vols = zip(*top3_buyers)
+            inst_mask = (self.registry.flag_array(codes) & SMART_MONEY) > 0
+            total_inst_buy = np.asarray(vols)[inst_mask].sum()
+            total_retail_buy = np.asarray(vols)[~inst_mask].sum()
             
         buyer_type = "Institusi" if total_inst_buy > total_retail_buy else "Retail"
         
@@ -294,15 +332,29 @@ class QuantAnalyzer:
         Analisa Aliran Dana Asing (Foreign Flow).
         
         Param:
-        foreign_data (DataFrame): Index Tanggal, Kolom ['NetForeignBuy']
+        foreign_data (DataFrame): Index Tanggal (atau kolom 'Date'), Kolom ['NetForeignBuy']
         """
         if foreign_data is None or foreign_data.empty:
             return {"status": "Unknown", "score": 0}
 
+        if 'Date' in foreign_data.columns:
+            foreign_data = foreign_data.sort_values('Date')
+        net = foreign_data['NetForeignBuy'].to_numpy(dtype=float)
+
         # Cek akumulasi
-        net_1d = foreign_data['NetForeignBuy'].iloc[-1]
-        net_5d = foreign_data['NetForeignBuy'].tail(5).sum()
-        net_20d = foreign_data['NetForeignBuy'].tail(20).sum()
+        net_1d = net[-1]
+        net_5d = net[-5:].sum()
+        net_20d = net[-20:].sum()
+        net_60d = net[-60:].sum()
+        
+        # Streak: consecutive days with the same sign as the latest day
+        sign = np.sign(net)
+        streak_days = 0
+        if sign[-1] != 0:
+            breaks = np.flatnonzero(sign[::-1] != sign[-1])
+            streak_days = int(breaks[0]) if breaks.size else len(sign)
+        streak_direction = "Inflow" if sign[-1] > 0 else ("Outflow" if sign[-1] < 0 else "Flat")
+        inflow_days_20d = int((net[-20:] > 0).sum())
         
         score = 0
         status = "Netral"
@@ -321,7 +373,13 @@ class QuantAnalyzer:
             "status": status,
             "foreign_score": score,
             "net_1d": net_1d,
-            "net_5d": net_5d
+            "net_5d": net_5d,
+            "net_20d": net_20d,
+            "net_60d": net_60d,
+            "streak_days": streak_days,
+            "streak_direction": streak_direction,
+            "inflow_days_20d": inflow_days_20d,
+            "days_available": len(net)
         }
 
     def analyze_historical_broker_summary(self, historical_data):
@@ -488,6 +546,38 @@ class QuantAnalyzer:
             "risk_reward_ratio": f"1:{tp_multiplier/multiplier:.1f}"
         }
 
+    def calculate_dynamic_risk_batch(self, entry_prices, atrs, method="aggressive"):
+        """
+        Vectorised calculate_dynamic_risk for many tickers at once.
+        Param:
+            entry_prices, atrs (array-like): One value per ticker.
+        Returns:
+            dict of arrays: stop_loss, target_price (nullable Int64), risk_percentage (+ scalar risk_reward_ratio)
+            Tickers without entry price / ATR (NaN, e.g. short history) get <NA> / NaN instead of a level.
+        """
+        if method == "conservative":
+            multiplier = 2.0
+            tp_multiplier = 3.0
+        else: # aggressive/swing
+            multiplier = 1.5
+            tp_multiplier = 2.5
+            
+        entry = np.asarray(entry_prices, dtype=float)
+        atr = np.asarray(atrs, dtype=float)
+        
+        sl_price = entry - (multiplier * atr)
+        tp_price = entry + (tp_multiplier * atr)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk_pct = np.where(entry != 0, ((entry - sl_price) / entry) * 100, np.nan)
+        
+        return {
+            "stop_loss": pd.array(np.trunc(sl_price), dtype="Int64"),
+            "target_price": pd.array(np.trunc(tp_price), dtype="Int64"),
+            "risk_percentage": np.round(risk_pct, 2),
+            "risk_reward_ratio": f"1:{tp_multiplier/multiplier:.1f}"
+        }
+
     def get_cumulative_broker_summary(self, historical_data):
         """
         Aggregates ALL broker data from history to find the Top Net Buyers and Sellers
@@ -496,46 +586,20 @@ class QuantAnalyzer:
         Returns:
             dict: {'top_buyers': [(code, vol)], 'top_sellers': [(code, vol)]}
         """
-        if not historical_data:
+        # Same ledger (and value/lot precedence) as the broker flow chart
+        ledger = self.build_broker_ledger(historical_data)
+        if ledger is None or ledger.empty:
             return {'top_buyers': [], 'top_sellers': []}
-            
-        broker_totals = {}
         
-        for d_str, data in historical_data.items():
-            for item in data:
-                code = item.get('broker_code') or item.get('code')
-                val = float(item.get('value', 0) or item.get('lot', 0))
-                side = item.get('side', '').upper()
-                
-                if not code: continue
-                
-                # Normalize Volume (Positive for BUY, Negative for SELL)
-                net_change = 0
-                
-                if side == 'BUY':
-                    net_change = val
-                elif side == 'SELL':
-                    net_change = -val
-                # Legacy check ignored for brevity as we generally see side
-                elif 'buy_vol' in item:
-                     b_vol = float(item.get('buy_vol', 0))
-                     s_vol = float(item.get('sell_vol', 0))
-                     net_change = b_vol - s_vol
-                
-                broker_totals[code] = broker_totals.get(code, 0) + net_change
-                
-        # Sort
-        # Buyers: Net > 0, sorted const descending
-        buyers = [(k, v) for k, v in broker_totals.items() if v > 0]
-        buyers.sort(key=lambda x: x[1], reverse=True)
+        totals = ledger.groupby('Broker', sort=False)['Net'].sum()
         
-        # Sellers: Net < 0, sorted absolute descending (i.e. most negative first)
-        sellers = [(k, v) for k, v in broker_totals.items() if v < 0]
-        sellers.sort(key=lambda x: x[1]) # Ascending because they are negative (e.g. -1000 is smaller than -100)
+        # Buyers: Net > 0, largest first. Sellers: Net < 0, most negative first
+        buyers = totals[totals > 0].sort_values(ascending=False, kind='stable')
+        sellers = totals[totals < 0].sort_values(kind='stable')
         
         return {
-            'top_buyers': buyers,
-            'top_sellers': sellers
+            'top_buyers': [(code, float(v)) for code, v in buyers.items()],
+            'top_sellers': [(code, float(v)) for code, v in sellers.items()]
         }
 
     def calculate_final_verdict(self, tech_score, bandar_score, foreign_score, sentiment_score=50):
@@ -586,70 +650,144 @@ class QuantAnalyzer:
             }
         }
 
-    def prepare_broker_flow_data(self, historical_data, top_n=3):
+    def calculate_final_verdict_batch(self, tech_scores, bandar_scores, foreign_scores, sentiment_scores=50):
         """
-        Prepares a DataFrame for Broker Flow Chart (Cumulative Net Volume).
-        Targets the Top N Buyers and Sellers from the cumulative summary.
+        Vectorised calculate_final_verdict for many tickers at once (screening / rebalancing).
+        Param:
+            tech_scores, bandar_scores, foreign_scores, sentiment_scores (array-like or scalar):
+            Same scales as calculate_final_verdict; scalars are broadcast.
+            Missing scores (NaN, e.g. no RSI/ADX or no GoAPI data) count as neutral:
+            tech 50, bandar 0, foreign 0, sentiment 50.
+        Returns:
+            dict of ndarrays: final_score (int), verdict (str), details (contributions)
+        """
+        tech = np.nan_to_num(np.asarray(tech_scores, dtype=float), nan=50.0)
+        norm_bandar = np.nan_to_num(np.asarray(bandar_scores, dtype=float), nan=0.0) + 50
+        norm_foreign = 50 + (np.nan_to_num(np.asarray(foreign_scores, dtype=float), nan=0.0) * 1.5)
+        sentiment = np.nan_to_num(np.asarray(sentiment_scores, dtype=float), nan=50.0)
+        
+        final_score = (
+            (tech * 0.40) +
+            (norm_bandar * 0.30) +
+            (norm_foreign * 0.15) +
+            (sentiment * 0.15)
+        )
+        final_score = np.clip(final_score, 0, 100)
+        
+        verdict = np.select(
+            [final_score >= 80, final_score >= 60, final_score <= 30, final_score <= 45],
+            ["STRONG BUY", "BUY / ACCUMULATE", "STRONG SELL", "SELL / AVOID"],
+            default="WAIT & SEE"
+        )
+        
+        shape = final_score.shape
+        return {
+            "final_score": final_score.astype(int),
+            "verdict": verdict,
+            "details": {
+                "technical_contribution": np.broadcast_to(tech * 0.4, shape),
+                "bandar_contribution": np.broadcast_to(norm_bandar * 0.3, shape),
+                "foreign_contribution": np.broadcast_to(norm_foreign * 0.15, shape)
+            }
+        }
+
+    def build_broker_ledger(self, historical_data):
+        """
+        Normalises raw historical broker summary into one flat ledger.
+        Param:
+            historical_data (dict): {date_str: raw_broker_list} from get_broker_summary_historical
+            
+        Returns:
+            DataFrame: Cols=['Date', 'Broker', 'Action', 'Volume', 'Lot', 'Value', 'AvgPrice', 'Net']
+                       Volume is the rupiah value if the payload has it, else lots (chart / flow ranking).
+                       Lot and Value are kept separately (Value falls back to Lot x 100 x AvgPrice).
+                       Net is +Volume for BUY and -Volume for SELL.
         """
         if not historical_data:
             return None
             
-        # 1. Identify Key Brokers (Top N Buyers + Top N Sellers)
-        summ = self.get_cumulative_broker_summary(historical_data)
-        
-        target_brokers = set()
-        for b, _ in summ.get('top_buyers', [])[:top_n]:
-            target_brokers.add(b)
-        for b, _ in summ.get('top_sellers', [])[:top_n]:
-            target_brokers.add(b)
-            
-        target_brokers = list(target_brokers)
-        if not target_brokers:
+        records = [dict(item, Date=d_str) for d_str, data in historical_data.items() for item in data]
+        if not records:
             return None
             
-        # 2. Build Time Series
-        # Structure: {Date: {Broker: DailyNet}}
-        sorted_dates = sorted(historical_data.keys())
-        rows = []
-        
-        for d_str in sorted_dates:
-            daily_raw = historical_data[d_str]
-            row = {'Date': pd.to_datetime(d_str)}
+        raw = pd.DataFrame.from_records(records)
+        
+        def col(name):
+            if name in raw.columns:
+                return pd.to_numeric(raw[name], errors='coerce').fillna(0.0)
+            return pd.Series(0.0, index=raw.index)
+        
+        code = raw['broker_code'] if 'broker_code' in raw.columns else pd.Series(None, index=raw.index, dtype=object)
+        if 'code' in raw.columns:
+            code = code.fillna(raw['code'])
+        side = raw['side'].fillna('').astype(str).str.upper() if 'side' in raw.columns else pd.Series('', index=raw.index)
+        date = pd.to_datetime(raw['Date'])
+        
+        def value_of(value, lot, avg):
+            return value.where(value != 0, lot * 100 * avg) # 1 lot = 100 lembar
+        
+        # Standard format: one row per side. Prefer value, fallback to lot.
+        val = col('value')
+        val = val.where(val != 0, col('lot'))
+        std = side.isin(['BUY', 'SELL'])
+        frames = [pd.DataFrame({
+            'Date': date[std], 'Broker': code[std], 'Action': side[std],
+            'Volume': val[std], 'Lot': col('lot')[std],
+            'Value': value_of(col('value'), col('lot'), col('avg'))[std], 'AvgPrice': col('avg')[std]
+        })]
+        
+        # Legacy format: buy_vol / sell_vol in one row
+        if 'buy_vol' in raw.columns:
+            legacy = ~std & raw['buy_vol'].notna()
+            buy_vol = col('buy_value').where(col('buy_value') != 0, col('buy_vol'))
+            sell_vol = col('sell_value').where(col('sell_value') != 0, col('sell_vol'))
+            frames.append(pd.DataFrame({
+                'Date': date[legacy], 'Broker': code[legacy], 'Action': 'BUY',
+                'Volume': buy_vol[legacy], 'Lot': col('buy_vol')[legacy],
+                'Value': value_of(col('buy_value'), col('buy_vol'), col('buy_avg'))[legacy], 'AvgPrice': col('buy_avg')[legacy]
+            }))
+            frames.append(pd.DataFrame({
+                'Date': date[legacy], 'Broker': code[legacy], 'Action': 'SELL',
+                'Volume': sell_vol[legacy], 'Lot': col('sell_vol')[legacy],
+                'Value': value_of(col('sell_value'), col('sell_vol'), col('sell_avg'))[legacy], 'AvgPrice': col('sell_avg')[legacy]
+            }))
             
-            # Initialize 0 for all targets
-            for b in target_brokers:
-                row[b] = 0
-                
-            for item in daily_raw:
-                code = item.get('broker_code') or item.get('code')
-                if code not in target_brokers:
-                    continue
-                    
-                val = float(item.get('value', 0) or item.get('lot', 0)) # Using Value if available (see prior logic)
-                
-                side = item.get('side', '').upper()
-                
-                net_change = 0
-                if side == 'BUY':
-                    net_change = val
-                elif side == 'SELL':
-                    net_change = -val
-                elif 'buy_vol' in item:
-                     b_vol = float(item.get('buy_value', 0) or item.get('buy_vol', 0))
-                     s_vol = float(item.get('sell_value', 0) or item.get('sell_vol', 0))
-                     net_change = b_vol - s_vol
-                
-                row[code] += net_change
+        ledger = pd.concat(frames, ignore_index=True)
+        ledger = ledger[ledger['Broker'].notna()]
+        ledger['Net'] = np.where(ledger['Action'] == 'BUY', ledger['Volume'], -ledger['Volume'])
+        return ledger
+
+    def prepare_broker_flow_data(self, historical_data, top_n=3, brokers=None):
+        """
+        Prepares a DataFrame for Broker Flow Chart (Cumulative Net Volume).
+        Targets the Top N Net Buyers and Sellers over the whole period, or an explicit broker list.
+        
+        Returns:
+            DataFrame: Index=Date, Cols=Broker codes (cumulative net volume)
+        """
+        ledger = self.build_broker_ledger(historical_data)
+        if ledger is None or ledger.empty:
+            return None
             
-            rows.append(row)
+        # 1. Pivot (Date x Broker) of daily net volume
+        all_dates = pd.DatetimeIndex(sorted(pd.to_datetime(list(historical_data.keys()))), name='Date')
+        daily = ledger.groupby(['Date', 'Broker'])['Net'].sum().unstack(fill_value=0.0)
+        daily = daily.reindex(all_dates, fill_value=0.0)
+        
+        # 2. Identify Key Brokers (Top N Buyers + Top N Sellers, or explicit list)
+        if brokers:
+            target_brokers = list(dict.fromkeys(brokers))
+        else:
+            totals = daily.sum()
+            top_buyers = totals[totals > 0].nlargest(top_n).index
+            top_sellers = totals[totals < 0].nsmallest(top_n).index
+            target_brokers = list(top_buyers) + list(top_sellers)
             
-        if not rows:
+        if not target_brokers:
             return None
             
-        df = pd.DataFrame(rows)
-        df.set_index('Date', inplace=True)
-        
         # 3. Calculate Cumulative Sum (The "Flow")
-        df_flow = df.cumsum()
+        df_flow = daily.reindex(columns=target_brokers, fill_value=0.0).cumsum()
+        df_flow.columns.name = None
         
         return df_flow
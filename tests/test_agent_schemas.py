@@ -0,0 +1,60 @@
+import pytest
+import sys
+import os
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+from agent_schemas import extract_json, parse_response, response_schema
+
+def test_extract_json_ignores_fences_and_prose():
+    text = 'Berikut hasilnya:\n```json\n{"a": "x}y", "b": [1, {"c": 2}]}\n```\nSelesai {bukan json}'
+
+    value, complete = extract_json(text)
+
+    assert complete
+    assert value == {"a": "x}y", "b": [1, {"c": 2}]}
+
+def test_extract_json_closes_truncated_answer():
+    value, complete = extract_json('{"sentiment_score": 70, "analysis": "Tren naik", "action": "BU')
+
+    assert not complete
+    assert value == {"sentiment_score": 70, "analysis": "Tren naik"}
+
+def test_parse_response_coerces_types_and_fills_defaults():
+    res = parse_response("technical", '{"sentiment_score": "75/100", "action": "buy on breakout", "trading_plan": {"stop_loss": 940}}')
+
+    assert res["sentiment_score"] == 75
+    assert res["action"] == "BUY_ON_BREAKOUT"
+    assert res["trading_plan"] == {"buy_area": "-", "stop_loss": "940", "target_profit": "-"}
+    assert res["analysis"]  # default filled
+    assert "parse_error" not in res
+
+def test_parse_response_without_json_is_flagged():
+    res = parse_response("cio", "Maaf, saya tidak bisa menjawab.")
+
+    assert res["parse_error"] is True
+    assert res["final_score"] == 50
+    assert res["recommended_action"] == "WAIT"
+
+def test_batch_parse_and_response_schema():
+    res = parse_response("fundamental_batch", '[{"ticker": "BBCA", "sentiment_score": 150}, {"x": 1}]')
+
+    assert len(res) == 1 and res[0]["sentiment_score"] == 100
+    assert response_schema("fundamental_batch")["type"] == "ARRAY"
+    assert response_schema("technical")["properties"]["action"]["enum"][0] == "BUY_ON_WEAKNESS"
+
+def test_bare_buy_stays_bullish():
+    assert parse_response("technical", '{"action": "BUY"}')["action"] == "BUY_ON_WEAKNESS"
+    assert parse_response("technical", '{"action": "strong sell"}')["action"] == "SELL"
+    assert parse_response("technical", '{"action": "hold"}')["action"] == "WAIT_AND_SEE"
+
+def test_scanner_detects_close_across_chunks():
+    from agent_schemas import JsonScanner
+
+    scanner = JsonScanner("{")
+    chunks = ['Hasil: {"a": "}', '", "b": {"c"', ': 1}}', ' trailing']
+    closed = [scanner.feed(c) for c in chunks]
+
+    assert closed == [False, False, True, True]
+    assert scanner.result("".join(chunks[:3])) == ({"a": "}", "b": {"c": 1}}, True)
@@ -0,0 +1,38 @@
+import pytest
+import json
+import pandas as pd
+import sys
+import os
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+import broker_registry
+from broker_registry import BrokerRegistry, load_registry, RETAIL, FOREIGN, SMART_MONEY
+
+def test_default_classes():
+    reg = BrokerRegistry(broker_registry.DEFAULT_BROKERS)
+    
+    assert reg.classify('YP') == 'retail'
+    assert reg.classify('AK') == 'foreign'
+    assert reg.classify('LG') == 'local_big'
+    assert reg.classify('??') == 'unknown'
+    assert 'BK' in reg.smart_money and 'YP' not in reg.smart_money
+    assert reg.flag('ZP') & SMART_MONEY
+
+def test_vectorised_classification():
+    reg = BrokerRegistry(broker_registry.DEFAULT_BROKERS)
+    codes = pd.Series(['YP', 'AK', 'ZZ'])
+    
+    assert list(reg.flag_array(codes)) == [RETAIL, FOREIGN, 0]
+    assert list(reg.classify_series(codes)) == ['retail', 'foreign', 'unknown']
+
+def test_registry_file_override(tmp_path):
+    path = tmp_path / "brokers.json"
+    path.write_text(json.dumps({"yp": "institution", "QQ": "retail"}))
+    
+    reg = load_registry(str(path))
+    
+    assert reg.classify('YP') == 'institution'
+    assert 'QQ' in reg.retail
+    assert 'QQ' in reg.prompt_hint()
@@ -0,0 +1,98 @@
+import pytest
+import sys
+import os
+import gzip
+import json
+from datetime import datetime, timedelta
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+import db_manager
+import db_maintenance
+
+@pytest.fixture
+def setup_db(tmp_path, monkeypatch):
+    """Temporary database with its archive folder inside tmp_path."""
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(db_manager, "DB_NAME", path)
+    monkeypatch.setattr(db_maintenance, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    db_manager.init_db()
+    yield db_manager.get_db_connection()
+    db_manager.close_connections(path)
+
+def _insert_analysis(conn, ticker, timestamp, mode="ai"):
+    conn.execute(
+        "INSERT INTO analysis_cache (ticker, timestamp, timeframe, style, mode, full_message) VALUES (?, ?, 'daily', 'SWING', ?, ?)",
+        (ticker, timestamp, mode, f"Report {timestamp}")
+    )
+
+def test_analysis_cache_is_downsampled_and_archived(setup_db):
+    conn = setup_db
+    now = datetime.now()
+    # 3 runs per day over 4 days + one run older than the max age
+    for day in range(4):
+        for hour in (9, 12, 15):
+            _insert_analysis(conn, "BBCA", (now - timedelta(days=day)).replace(hour=hour))
+    _insert_analysis(conn, "BBCA", now - timedelta(days=400))
+    conn.commit()
+
+    removed = db_maintenance.prune_analysis_cache(conn, keep_recent=2, max_age_days=180)
+
+    days = conn.execute("SELECT date(timestamp), COUNT(*) FROM analysis_cache GROUP BY 1 ORDER BY 1 DESC").fetchall()
+    # Today keeps its 2 most recent runs, older days 1 row each, the 400-day-old row is gone
+    assert [row[1] for row in days] == [2, 1, 1, 1]
+    assert removed == 13 - 5
+
+    archives = os.listdir(db_maintenance.archive_dir())
+    assert len(archives) == 1
+    with gzip.open(os.path.join(db_maintenance.archive_dir(), archives[0]), "rt") as f:
+        archived = [json.loads(line) for line in f]
+    assert len(archived) == removed and archived[0]['ticker'] == "BBCA"
+
+def test_run_maintenance_caps_history_and_vacuums(setup_db):
+    for i in range(5):
+        db_manager.add_history(f"T{i}")
+    db_manager.save_llm_cache("old", "technical", "m", {}, datetime.now() - timedelta(days=3))
+
+    report = db_maintenance.run_maintenance({
+        "analysis_cache": {"keep_recent": 5, "max_age_days": 180},
+        "history": {"max_rows": 3},
+        "llm_cache": {"expired_grace_days": 1},
+    })
+
+    assert report == {"analysis_cache": 0, "history": 2, "llm_cache": 1}
+    assert db_manager.get_history() == ["T4", "T3", "T2"]
+    assert setup_db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2 # INCREMENTAL
+
+def test_quant_burst_keeps_last_ai_result(setup_db):
+    conn = setup_db
+    now = datetime.now()
+    _insert_analysis(conn, "BBCA", now - timedelta(minutes=30), mode="ai")
+    for minute in range(6):
+        _insert_analysis(conn, "BBCA", now - timedelta(minutes=minute), mode="quant")
+    conn.commit()
+
+    db_maintenance.prune_analysis_cache(conn, keep_recent=2, max_age_days=180)
+
+    modes = [row[0] for row in conn.execute("SELECT mode FROM analysis_cache ORDER BY timestamp")]
+    assert modes == ["ai", "quant", "quant"]
+
+def test_existing_db_is_converted_at_startup_not_by_maintenance(tmp_path, monkeypatch):
+    import sqlite3
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE favorites (ticker TEXT PRIMARY KEY)")
+    legacy.commit()
+    legacy.close()
+    monkeypatch.setattr(db_manager, "DB_NAME", path)
+    conn = db_manager.get_db_connection()
+    try:
+        db_maintenance.incremental_vacuum(conn) # Live DB: no full VACUUM
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+        db_manager.init_db()
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        db_manager.close_connections(path)
+
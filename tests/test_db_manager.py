@@ -3,6 +3,8 @@ import sqlite3
 import sys
 import os
 import tempfile
+import json
+from datetime import datetime
 
 # Add the source directory to the path so we can import the module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
@@ -10,8 +12,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligenc
 import db_manager
 
 # Create a temporary file for the database
-# We can't use :memory: easily because db_manager opens/closes connections internally
-# creating separate in-memory DBs each time.
+# We can't use :memory: easily because connections are pooled per thread,
+# so other threads would see separate in-memory DBs.
 @pytest.fixture
 def setup_db():
     """Initializes a temporary database file before each test."""
@@ -29,9 +31,30 @@ def setup_db():
     yield path
     
     # Teardown
+    db_manager.close_connections(path)
     db_manager.DB_NAME = original_db
-    if os.path.exists(path):
-        os.remove(path)
+    for f in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(f):
+            os.remove(f)
+
+def test_connection_is_pooled_and_tuned(setup_db):
+    import threading
+    conn = db_manager.get_db_connection()
+
+    assert db_manager.get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1 # NORMAL
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(db_manager.get_db_connection()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+    # Closing invalidates the pooled handle, the next call reconnects
+    db_manager.close_connections(setup_db)
+    assert db_manager.get_db_connection() is not conn
+    assert db_manager.is_favorite("BBCA") == False
 
 def test_favorites(setup_db):
     # Test adding a favorite
@@ -91,3 +114,233 @@ def test_analysis_cache(setup_db):
     
     # Test cache expiry (mocking time might be needed for strict test, but logic check is good enough)
     # For now, just ensure it returns data immediately after save.
+
+def test_analysis_snapshot_is_compact(setup_db, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    df = pd.DataFrame(
+        {"Close": np.linspace(1000, 1200, 250), "Volume": np.arange(250)},
+        index=pd.date_range("2024-01-01", periods=250)
+    )
+    ta_data = {"ticker": "BBRI.JK", "df_daily": df, "price": np.float64(1200.0), "final_score": 72,
+               "verdict": "BUY / ACCUMULATE", "rsi": np.float64(61.5), "pivots": {"pivot": np.int64(1190)}}
+    db_manager.save_analysis("BBRI", ta_data, "Buy", "Full Report")
+    db_manager.flush_writes()
+
+    size = db_manager.get_db_connection().execute("SELECT LENGTH(snapshot) FROM analysis_cache").fetchone()[0]
+    assert size < 300
+
+    loads = []
+    monkeypatch.setattr(db_manager, "BARS_LOADER", lambda ref: loads.append(ref) or df)
+    cached = db_manager.get_cached_analysis("BBRI")
+    assert cached['final_score'] == 72 and cached['ta_data']['rsi'] == 61.5
+    assert cached['ta_data']['pivots'] == {"pivot": 1190}
+    assert loads == [] # Bars are only fetched on access
+    assert cached['ta_data']['df_daily'] is df
+    assert cached['ta_data']['df_daily'] is df
+    assert loads == ["BBRI.JK|1d|2024-09-06|250"]
+
+def test_llm_cache(setup_db):
+    from datetime import datetime, timedelta
+    
+    db_manager.save_llm_cache("k1", "fundamental", "gemini", {"sentiment_score": 70}, datetime.now() + timedelta(hours=1))
+    db_manager.save_llm_cache("k2", "technical", "gemini", {"sentiment_score": 40}, datetime.now() - timedelta(minutes=1))
+    
+    assert db_manager.get_llm_cache("k1") == {"sentiment_score": 70}
+    assert db_manager.get_llm_cache("k2") is None # Expired
+    assert db_manager.get_llm_cache("missing") is None
+
+def test_history_keeps_one_row_per_ticker(setup_db):
+    db_manager.add_history("ASII")
+    db_manager.add_history("UNVR")
+    db_manager.add_history("ASII")
+
+    assert db_manager.get_history(limit=5) == ["ASII", "UNVR"]
+    count = db_manager.get_db_connection().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    assert count == 2
+
+def test_migration_upgrades_legacy_db(setup_db):
+    # Rebuild a version-0 database: duplicate history rows, ta_data blob with a stringified frame
+    conn = db_manager.get_db_connection()
+    conn.execute("DROP TABLE history")
+    conn.execute("DROP TABLE analysis_cache")
+    conn.execute("DROP TABLE analysis_scores")
+    conn.execute("CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT NOT NULL, timestamp DATETIME)")
+    conn.execute("CREATE TABLE analysis_cache (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT NOT NULL, timestamp DATETIME, ta_data TEXT, ai_analysis TEXT, full_message TEXT)")
+    conn.executemany("INSERT INTO history (ticker, timestamp) VALUES (?, ?)", [
+        ("BBCA", "2024-01-01 10:00:00"), ("TLKM", "2024-01-02 10:00:00"), ("BBCA", "2024-01-03 10:00:00"),
+    ])
+    blob = json.dumps({"ticker": "BBCA.JK", "price": 9000, "verdict": "BUY / ACCUMULATE", "df_daily": "Open High Low\n" * 5000})
+    conn.execute("INSERT INTO analysis_cache (ticker, timestamp, ta_data) VALUES ('BBCA', ?, ?)", (datetime.now(), blob))
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+    db_manager.init_db()
+
+    assert db_manager.get_schema_version() == len(db_manager.MIGRATIONS)
+    assert db_manager.get_history() == ["BBCA", "TLKM"]
+    cached = db_manager.get_cached_analysis("BBCA")
+    assert cached['price'] == 9000 and cached['verdict'] == "BUY / ACCUMULATE"
+    assert "df_daily" not in cached['ta_data']
+    assert conn.execute("SELECT ta_data FROM analysis_cache").fetchone()[0] is None
+    assert [row['price'] for row in db_manager.get_score_history("BBCA")] == [9000] # Backfilled
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM analysis_cache WHERE ticker = ? AND timestamp > ? ORDER BY timestamp DESC LIMIT 1",
+        ("BBCA", "2024-01-01")
+    ).fetchall()
+    assert "idx_analysis_ticker_ts" in " ".join(row[-1] for row in plan)
+
+def test_result_cache_key_and_partial_reuse(setup_db):
+    agents = {
+        "fundamental": {"sentiment_score": 70, "analysis": "Valuasi murah"},
+        "technical": {"sentiment_score": 40, "analysis": "Timeout", "degraded": True},
+    }
+    db_manager.save_analysis("BBCA", {"price": 9000}, "-", "Report AI", style="SWING", mode="ai", agents=agents)
+    db_manager.save_analysis("BBCA", {"price": 9000}, "-", "Report Quant", style="SWING", mode="quant")
+
+    assert db_manager.get_cached_analysis("BBCA", style="SWING", modes=("ai",))['full_message'] == "Report AI"
+    assert db_manager.get_cached_analysis("BBCA", style="SWING")['full_message'] == "Report Quant"
+    assert db_manager.get_cached_analysis("BBCA", style="INVESTING") is None
+    assert db_manager.get_cached_analysis("BBCA", timeframe="weekly") is None
+    assert db_manager.get_cached_analysis("BBCA", minutes_valid=0) is None # Expired
+
+    assert db_manager.get_cached_agent_result("BBCA", "fundamental", 60)['sentiment_score'] == 70
+    assert db_manager.get_cached_agent_result("BBCA", "technical", 60) is None # Degraded output is not reused
+
+def test_cache_freshness_on_non_wib_host(setup_db, monkeypatch):
+    import time
+    import market_hours
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset not available")
+
+    # Container without TZ: host-local time is UTC, stored timestamps are naive UTC
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    try:
+        class FixedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                # Monday 10:20 WIB, continuous session
+                wib = datetime(2024, 1, 15, 10, 20, tzinfo=market_hours.WIB)
+                return wib.astimezone(tz) if tz else wib.astimezone().replace(tzinfo=None)
+        monkeypatch.setattr(db_manager, "datetime", FixedDatetime)
+
+        conn = db_manager.get_db_connection()
+        with conn:
+            conn.execute("INSERT INTO analysis_cache (ticker, timestamp, timeframe, style, mode) VALUES ('BBCA', '2024-01-15 03:00:00', 'daily', 'SWING', 'ai')")
+            conn.execute("INSERT INTO analysis_cache (ticker, timestamp, timeframe, style, mode) VALUES ('TLKM', '2024-01-15 03:10:00', 'daily', 'SWING', 'ai')")
+
+        # Saved 10:00 WIB -> expired at 10:15 WIB, not "pre-open, valid until the session starts"
+        assert db_manager.get_cached_analysis("BBCA") is None
+        cached = db_manager.get_cached_analysis("TLKM")
+        assert cached['valid_until'] == datetime(2024, 1, 15, 10, 25, tzinfo=market_hours.WIB)
+        assert round(cached['age_minutes']) == 10
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+def test_fast_run_output_is_not_reused_by_ai_run(setup_db):
+    # skip_ai saves the deterministic fallbacks under `agents`, without a degraded flag
+    quant_agents = {"fundamental": {"sentiment_score": 55, "analysis": "Heuristik valuasi"}}
+    db_manager.save_analysis("BBCA", {"price": 9000}, "-", "Report Quant", mode="quant", agents=quant_agents)
+
+    assert db_manager.get_cached_agent_result("BBCA", "fundamental", 60) is None # AI run re-runs fundamental
+
+    db_manager.save_analysis("BBCA", {"price": 9000}, "-", "Report", mode="degraded",
+                             agents={"fundamental": {"sentiment_score": 70, "analysis": "Valuasi murah"}})
+    assert db_manager.get_cached_agent_result("BBCA", "fundamental", 60)['sentiment_score'] == 70
+
+def test_writes_are_batched_behind_the_caller(setup_db):
+    before = db_manager.get_write_stats()
+    for i in range(50):
+        db_manager.add_history(f"T{i:02d}")
+    db_manager.add_favorite("BBCA")
+
+    assert db_manager.flush_writes(timeout=5)
+    stats = db_manager.get_write_stats()
+    assert stats["queued"] == 0
+    assert stats["written"] - before["written"] == 51
+    assert stats["batches"] - before["batches"] < 51 # Several writes per transaction
+    assert db_manager.get_history(limit=1) == ["T49"]
+    assert db_manager.is_favorite("BBCA")
+
+def test_write_failures_reach_caller_and_never_stall_the_writer(setup_db, mocker):
+    before = db_manager.get_write_stats()
+    # Non-DB error inside the writer (e.g. missing driver / malformed params)
+    mocker.patch.object(db_manager, "_execute", side_effect=RuntimeError("boom"))
+    db_manager.add_history("ASII")
+    assert db_manager.add_portfolio("BBCA", 9000, 1) is False
+    mocker.stopall()
+
+    assert db_manager.flush_writes(timeout=5)
+    stats = db_manager.get_write_stats()
+    assert stats["queued"] == 0 and stats["failed"] - before["failed"] == 2
+    assert db_manager.get_portfolio() == [] # Reads do not hang
+    assert db_manager.add_portfolio("BBCA", 9000, 1) is True # Writer thread is still alive
+    assert db_manager.add_favorite("BBCA") is True
+
+def test_score_history_time_series(setup_db):
+    for score, rsi in ((55, 48.5), (62, 57.0), (71, 66.2)):
+        db_manager.save_analysis("BBRI", {"price": 5000, "final_score": score, "rsi": rsi, "trend": "Bullish"}, "-", "-",
+                                 agents={"cio": {"recommended_action": "BUY"}})
+    db_manager.save_analysis("TLKM", {"final_score": 30}, "-", "-")
+
+    history = db_manager.get_score_history("BBRI", days=90)
+    assert [row['final_score'] for row in history] == [55, 62, 71]
+    assert history[-1]['rsi'] == 66.2 and history[-1]['cio_action'] == "BUY"
+    assert list(db_manager.get_score_history("BBRI", fields=["final_score"])[0]) == ["ts", "final_score"]
+
+    plan = db_manager.get_db_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT ts, final_score FROM analysis_scores WHERE ticker = ? AND ts >= ? ORDER BY ts",
+        ("BBRI", "2024-01-01")
+    ).fetchall()
+    assert "PRIMARY KEY" in " ".join(row[-1] for row in plan)
+
+def test_read_through_cache(setup_db, mocker):
+    db_manager.add_favorite("BBCA")
+    db_manager.add_portfolio("TLKM", 3000, 10)
+    assert db_manager.is_favorite("BBCA")
+    assert db_manager.get_portfolio_item("TLKM")['lots'] == 10
+
+    # Loaded tables are served from memory
+    spy = mocker.spy(db_manager, "_read_connection")
+    for _ in range(100):
+        assert db_manager.is_favorite("bbca")
+        assert not db_manager.is_favorite("ASII")
+    db_manager.get_portfolio()[0]['lots'] = 99 # Callers get copies
+    assert db_manager.get_portfolio_item("TLKM")['lots'] == 10
+    assert spy.call_count == 0
+
+    # Writes invalidate, the next read reloads
+    db_manager.remove_favorite("BBCA")
+    assert not db_manager.is_favorite("BBCA")
+    db_manager.add_portfolio("TLKM", 3100, 20)
+    assert db_manager.get_portfolio_item("TLKM")['lots'] == 20
+    assert spy.call_count == 2
+
+def test_upsert_sql_is_portable():
+    assert db_manager._upsert_sql("favorites", ("ticker",), ("ticker",), update=False) == (
+        "INSERT INTO favorites (ticker) VALUES (?) ON CONFLICT (ticker) DO NOTHING"
+    )
+    assert db_manager._upsert_sql("portfolio", ("ticker", "lots"), ("ticker",)).endswith(
+        "ON CONFLICT (ticker) DO UPDATE SET lots = excluded.lots"
+    )
+    assert not db_manager.is_shared_storage("stock_intelligence.db")
+    assert db_manager.is_shared_storage("postgresql://user@localhost/stock")
+
+def test_bulk_portfolio_and_favorites_in_one_transaction(setup_db, mocker):
+    db_manager.add_portfolio("ASII", 5000, 5)
+    db_manager.add_favorite("OLD")
+    db_manager.flush_writes()
+    commit = mocker.spy(db_manager.WriteBehindQueue, "_commit")
+
+    items = [{"ticker": f"T{i:03d}", "avg_price": 1000 + i, "lots": i + 1} for i in range(300)]
+    db_manager.save_portfolio_bulk(items, remove=["ASII"])
+    db_manager.add_favorites_bulk(["bbca", "BBRI", "bbca"], replace=True)
+    db_manager.flush_writes()
+
+    portfolio = db_manager.get_portfolio()
+    assert len(portfolio) == 300 and "ASII" not in {p["ticker"] for p in portfolio}
+    assert db_manager.get_portfolio_item("T299") == {"ticker": "T299", "avg_price": 1299, "lots": 300}
+    assert db_manager.get_favorites() == ["BBCA", "BBRI"]
+    assert commit.call_count <= 2
@@ -0,0 +1,74 @@
+import pytest
+import sys
+import os
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+from quant_engine import QuantAnalyzer
+from intraday_tracker import IntradayBrokerTracker
+
+def snapshot(ak_buy, yp_sell):
+    return [
+        {'broker_code': 'AK', 'side': 'BUY', 'value': ak_buy, 'avg': 1000},
+        {'broker_code': 'YP', 'side': 'SELL', 'value': yp_sell, 'avg': 1000},
+    ]
+
+def test_poll_records_interval_deltas(mocker):
+    client = mocker.MagicMock()
+    client.get_broker_summary.side_effect = [snapshot(100, 50), snapshot(160, 50), snapshot(200, 90)]
+    tracker = IntradayBrokerTracker(client, QuantAnalyzer(goapi_client=None))
+    
+    # First poll is the baseline
+    assert tracker.poll("BBRI") is None
+    
+    delta = tracker.poll("BBRI")
+    assert delta.loc[('AK', 'BUY'), 'Volume'] == 60
+    assert ('YP', 'SELL') not in delta.index # Unchanged aggregates are not reported
+    
+    tracker.poll("BBRI")
+    flow = tracker.get_flow_since("BBRI", minutes=30)
+    assert flow.loc['AK', 'NetVol'] == 100
+    assert flow.loc['YP', 'NetVol'] == -40
+    assert flow.loc['AK', 'NetValue'] == 100 # Payload value is rupiah already
+    assert flow.loc['YP', 'NetValue'] == -40
+    assert flow.index[0] == 'AK'
+    assert tracker.get_latest_raw("BBRI") == snapshot(200, 90)
+
+def test_concurrent_start_runs_one_poller(mocker):
+    import threading
+    mocker.patch("intraday_tracker.is_market_open", return_value=False)
+    tracker = IntradayBrokerTracker(mocker.MagicMock(), QuantAnalyzer(goapi_client=None), interval=0.01)
+
+    callers = [threading.Thread(target=tracker.start, args=("bbri",)) for _ in range(8)]
+    for c in callers: c.start()
+    for c in callers: c.join()
+    pollers = [t for t in threading.enumerate() if t.name == "intraday-BBRI"]
+    assert len(pollers) == 1 and tracker.is_tracking("BBRI")
+
+    tracker.stop()
+    pollers[0].join(timeout=1)
+    assert not pollers[0].is_alive() and not tracker.is_tracking("BBRI")
+
+def test_market_hours():
+    import datetime
+    from market_hours import is_market_open, next_session_start, WIB
+    
+    monday_morning = datetime.datetime(2024, 1, 8, 10, 0, tzinfo=WIB)
+    friday_break = datetime.datetime(2024, 1, 12, 13, 0, tzinfo=WIB)
+    friday_evening = datetime.datetime(2024, 1, 12, 19, 0, tzinfo=WIB)
+    
+    assert is_market_open(monday_morning)
+    assert not is_market_open(friday_break)
+    assert next_session_start(friday_break) == datetime.datetime(2024, 1, 12, 14, 0, tzinfo=WIB)
+    assert next_session_start(friday_evening) == datetime.datetime(2024, 1, 15, 9, 0, tzinfo=WIB)
+
+def test_result_valid_until():
+    import datetime
+    from market_hours import result_valid_until, WIB
+    
+    monday_morning = datetime.datetime(2024, 1, 8, 10, 0, tzinfo=WIB)
+    friday_evening = datetime.datetime(2024, 1, 12, 19, 0, tzinfo=WIB)
+    
+    assert result_valid_until(monday_morning, "daily") == monday_morning + datetime.timedelta(minutes=15)
+    assert result_valid_until(friday_evening, "daily") == datetime.datetime(2024, 1, 15, 9, 0, tzinfo=WIB)
@@ -0,0 +1,66 @@
+import pytest
+import sys
+import os
+import time
+import threading
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+from llm_scheduler import LLMScheduler, INTERACTIVE, BACKGROUND
+
+def _start(scheduler, priority, name, order):
+    t = threading.Thread(target=scheduler.run, args=(lambda: order.append(name), priority))
+    t.start()
+    time.sleep(0.05) # Make enqueue order deterministic
+    return t
+
+def test_interactive_requests_jump_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1, rpm=0)
+    order = []
+    scheduler.acquire() # Occupy the only slot
+
+    threads = [
+        _start(scheduler, BACKGROUND, "scan-1", order),
+        _start(scheduler, BACKGROUND, "scan-2", order),
+        _start(scheduler, INTERACTIVE, "ui", order),
+    ]
+    scheduler.release()
+    for t in threads:
+        t.join(timeout=2)
+
+    assert order == ["ui", "scan-1", "scan-2"]
+    stats = scheduler.get_stats()
+    assert stats["background"]["requests"] == 2
+    assert stats["background"]["max_wait_s"] >= stats["interactive"]["avg_wait_s"]
+
+def test_concurrency_limit():
+    scheduler = LLMScheduler(max_concurrency=2, rpm=0)
+    peak = []
+    lock = threading.Lock()
+    active = [0]
+
+    def call():
+        with lock:
+            active[0] += 1
+            peak.append(active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    threads = [threading.Thread(target=scheduler.run, args=(call,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=2)
+
+    assert max(peak) == 2
+    assert scheduler.get_stats()["active"] == 0
+
+def test_rate_limit_blocks_when_window_full():
+    scheduler = LLMScheduler(max_concurrency=4, rpm=2)
+    scheduler.run(lambda: None)
+    scheduler.run(lambda: None)
+
+    assert not scheduler.has_capacity()
+    assert scheduler._rate_wait(time.monotonic()) > 0
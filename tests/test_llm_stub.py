@@ -0,0 +1,156 @@
+import pytest
+import sys
+import os
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+import catalyst_agent
+from llm_stub import StubBackend, parse_latency, benchmark
+
+TA_DATA = {
+    'price': 1000, 'trend': 'Bullish', 'adx': 27, 'rsi': 55, 'macd_status': 'Golden Cross',
+    'vol_status': 'High', 'vol_ratio': 2.1, 'atr': 20, 'support': 950,
+    'pivots': {'pivot': 990, 's1': 970, 's2': 950, 'r1': 1010, 'r2': 1030},
+    'fib_levels': {0.236: 1100, 0.382: 1050, 0.618: 980},
+}
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    monkeypatch.setattr(catalyst_agent, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(catalyst_agent, "HEDGE_ENABLED", False)
+    backend = StubBackend(seed=1)
+    catalyst_agent.set_llm_backend(backend)
+    yield backend
+    catalyst_agent.set_llm_backend(None)
+
+def test_parse_latency():
+    import random
+    rng = random.Random(0)
+
+    assert parse_latency("fixed:0.5")(rng) == 0.5
+    assert 1.0 <= parse_latency("uniform:1:2")(rng) <= 2.0
+    assert parse_latency("lognormal:1:0.3")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("poisson:1")
+
+def test_agents_return_schema_valid_json(stub_backend):
+    tech = catalyst_agent.get_technical_analysis("BBCA", TA_DATA)
+    fund = catalyst_agent.get_fundamental_analysis("BBCA", {'pe_ratio': 10, 'pbv': 1.2})
+    bandar = catalyst_agent.get_bandarmology_analysis("BBCA", {'market_cap': 5e12, 'pbv': 1.2})
+    cio = catalyst_agent.get_final_verdict("BBCA", tech, bandar, fund)
+
+    assert 20 <= tech['sentiment_score'] <= 80
+    assert tech['trading_plan']['buy_area'].startswith("950")
+    assert fund['valuation_status'] in ("UNDERVALUED", "FAIR", "OVERVALUED")
+    assert bandar['status'] in ("DISTRIBUSI", "AKUMULASI", "MARK-DOWN", "CHURNING")
+    assert cio['recommended_action'] in ("BUY", "SELL", "WAIT")
+    assert stub_backend.stats['calls'] == 4
+
+def test_batch_agent_splits_tickers(stub_backend):
+    res = catalyst_agent.get_technical_analysis_batch({"BBCA": TA_DATA, "BBRI": TA_DATA})
+
+    assert set(res) == {"BBCA", "BBRI"}
+    assert stub_backend.stats['calls'] == 1
+
+def test_split_batch_normalises_tickers():
+    answers = [{"ticker": "BBRI.JK", "action": "BUY"}, {"ticker": "bbca", "action": "WAIT"}, {"ticker": "GOTO"}]
+
+    res = catalyst_agent._split_batch(answers, ["BBCA", "bbri.jk"])
+
+    assert res == {"BBCA": {"action": "WAIT"}, "bbri.jk": {"action": "BUY"}}
+
+def test_failures_surface_as_agent_errors(stub_backend):
+    stub_backend.failure_rate = 1.0
+
+    res = catalyst_agent.get_fundamental_analysis("BBCA", {'pe_ratio': 10})
+
+    assert res['analysis'].startswith("Error:")
+    assert stub_backend.stats['failures'] == 1
+
+def test_benchmark_reports_latency(stub_backend):
+    report = benchmark(lambda i: catalyst_agent.get_fundamental_analysis(f"T{i}", {'pe_ratio': i}), runs=6, concurrency=3)
+
+    assert report['runs'] == 6 and report['errors'] == 0
+    assert report['p95_s'] >= report['p50_s']
+
+def test_hedge_loser_stops_streaming(monkeypatch):
+    import time
+
+    class Chunk:
+        usage_metadata = None
+        def __init__(self, text):
+            self.text = text
+
+    class SlowThenFastModel:
+        calls = 0
+        slow_chunks = 0
+        def generate_content(self, prompt, stream=True):
+            self.calls += 1
+            if self.calls > 1:
+                return iter([Chunk('{"a": 1}')])
+            def slow():
+                yield Chunk('{"a": ')
+                while True:
+                    time.sleep(0.02)
+                    self.slow_chunks += 1
+                    yield Chunk(' ')
+            return slow()
+
+    monkeypatch.setattr(catalyst_agent, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(catalyst_agent, "SOFT_BUDGET", {"technical": 0.1})
+    monkeypatch.setattr(catalyst_agent, "_latencies", {})
+    model = SlowThenFastModel()
+
+    text = catalyst_agent._hedged_call(
+        "technical", lambda cancel: catalyst_agent._stream_text("technical", model, "p", cancel=cancel)
+    )
+    assert text == '{"a": 1}' and model.calls == 2
+
+    time.sleep(0.1)
+    consumed = model.slow_chunks
+    time.sleep(0.2)
+    assert model.slow_chunks == consumed # Losing stream was abandoned
+    assert catalyst_agent.get_scheduler().get_stats()["active"] == 0
+
+# Without GoAPI, ta_data only carries analyze_technical's own verdict/final_score
+NO_GOAPI_TA = dict(TA_DATA, trend='Bearish', macd_status='Dead Cross', rsi=40, adx=15,
+                   final_score=80, verdict='STRONG BUY')
+WEAK_CONTEXT = {'bandar_score': -40, 'top_seller': 'YP', 'today_summary': 'N/A'}
+WEAK_FUND = {'pe_ratio': -5, 'der': 2}
+
+def test_fallback_cio_ignores_technical_verdict_without_goapi():
+    tech = catalyst_agent.fallback_technical_analysis(NO_GOAPI_TA)
+    bandar = catalyst_agent.fallback_bandarmology_analysis(WEAK_CONTEXT)
+    fund = catalyst_agent.fallback_fundamental_analysis(WEAK_FUND)
+
+    cio = catalyst_agent.fallback_final_verdict(tech, bandar, fund, quant_verdict=NO_GOAPI_TA.get('quant_verdict'))
+    assert cio['recommended_action'] != "BUY" and cio['final_score'] < 65
+
+    quant = {'final_score': 82, 'verdict': 'STRONG BUY'}
+    cio = catalyst_agent.fallback_final_verdict(tech, bandar, fund, quant_verdict=quant)
+    assert cio['recommended_action'] == "BUY" and cio['final_score'] == 82
+
+def test_quant_pipeline_without_goapi_uses_weighted_verdict():
+    app_controller = pytest.importorskip("app_controller")
+    controller = app_controller.StockAppController.__new__(app_controller.StockAppController)
+    controller.log_callback = None
+
+    ta_data = dict(NO_GOAPI_TA)
+    _, _, _, cio = controller._run_quant_pipeline(ta_data, WEAK_CONTEXT, WEAK_FUND)
+    assert cio['recommended_action'] != "BUY" and cio['final_score'] < 65
+
+def test_fallback_technical_ignores_composite_score():
+    # With GoAPI final_score is the QuantAnalyzer composite (bandar/foreign included)
+    bullish = dict(TA_DATA, final_score=20)
+    assert catalyst_agent.fallback_technical_analysis(bullish)['sentiment_score'] == 90
+    bearish = dict(TA_DATA, trend='Bearish', macd_status='Dead Cross', rsi=40, adx=15, final_score=95)
+    result = catalyst_agent.fallback_technical_analysis(bearish)
+    assert result['sentiment_score'] == 20 and result['action'] == "AVOID"
+
+def test_llm_backend_requires_create_model():
+    class Incomplete(catalyst_agent.LLMBackend):
+        name = "incomplete"
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert StubBackend(seed=1).name == "stub"
@@ -0,0 +1,41 @@
+import pytest
+import sys
+import os
+import io
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+import portfolio_io
+
+def test_parse_broker_statement_csv():
+    csv_text = (
+        "Kode Saham;Harga Rata-rata;Lembar\n"
+        "BBCA.JK;9.150;1000\n"
+        "bbca;9.350;1000\n"
+        "TLKM;3.500;abc\n"
+        ";100;100\n"
+    )
+    rows = portfolio_io.read_rows(io.BytesIO(csv_text.encode("utf-8")), "statement.csv")
+    items, errors = portfolio_io.parse_portfolio(rows)
+
+    assert items == [{"ticker": "BBCA", "avg_price": 9250, "lots": 20}]
+    assert len(errors) == 2 and "TLKM" in errors[0]
+
+def test_watchlist_round_trip_csv(tmp_path):
+    path = str(tmp_path / "watchlist.csv")
+    portfolio_io.export_watchlist(path, ["BBCA", "TLKM"])
+
+    assert portfolio_io.parse_watchlist(portfolio_io.read_rows(path)) == ["BBCA", "TLKM"]
+
+    # Plain list without a header row
+    rows = portfolio_io.read_rows(io.BytesIO(b"bbca.jk\nTLKM\nBBCA\n"), "list.csv")
+    assert portfolio_io.parse_watchlist(rows) == ["BBCA", "TLKM"]
+
+def test_portfolio_round_trip_xlsx(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = str(tmp_path / "portfolio.xlsx")
+    portfolio_io.export_portfolio(path, [{"ticker": "ASII", "avg_price": 5012.5, "lots": 12}])
+
+    items, errors = portfolio_io.parse_portfolio(portfolio_io.read_rows(path))
+    assert items == [{"ticker": "ASII", "avg_price": 5012.5, "lots": 12}] and not errors
@@ -0,0 +1,39 @@
+import pytest
+import sys
+import os
+
+# Add path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stock-intelligence'))
+
+import prompt_builder as pb
+
+def test_compact_encoding():
+    assert pb.kv(px=pb.fmt_num(1000.4), rsi=pb.fmt_num(55.123, 1), skip=None) == "px=1000 rsi=55.1"
+    assert pb.fmt_num(None) == "N/A"
+    assert pb.fmt_num("N/A") == "N/A"
+    assert pb.compact_history("Date | Close | Vol\n2024-01-02 | 1000 | 120k\n") == "Date|Close|Vol\n2024-01-02|1000|120k"
+
+def test_fit_to_budget_drops_optional_sections_first():
+    core = "core " * 20
+    optional = "history " * 200
+    tail = "news " * 10
+
+    prompt = pb.fit_to_budget([(core, False), (tail, False), (optional, True)], budget=60)
+
+    assert "history" not in prompt
+    assert core.strip() in prompt and "news" in prompt
+
+def test_fit_to_budget_truncates_required_text():
+    prompt = pb.fit_to_budget([("word " * 500, False)], budget=50)
+
+    assert prompt.endswith("…")
+    assert pb.estimate_tokens(prompt) <= 51
+
+def test_usage_calibrates_estimates():
+    model = "test-model"
+    pb.record_usage("fundamental", model, prompt_chars=400, prompt_tokens=100)
+
+    assert pb.estimate_tokens("x" * 400, model) == 100
+    stats = pb.get_token_stats()["fundamental"]
+    assert stats["avg_input_tokens"] >= 1
+    assert stats["prompt_budget"] == pb.TOKEN_BUDGET["fundamental"]
@@ -88,3 +88,121 @@ def test_calculate_final_verdict(quant_engine):
     # Weighted: (90*0.4) + (100*0.3) + (80*0.15) + (80*0.15) = 36 + 30 + 12 + 12 = 90
     assert res['final_score'] >= 85
     assert "STRONG BUY" in res['verdict']
+
+def test_analyze_foreign_flow_windows_and_streak(quant_engine):
+    net = [-100] * 40 + [50] * 17 + [10, 20, 30]
+    data = pd.DataFrame({
+        'Date': pd.bdate_range(start='2023-01-02', periods=60),
+        'NetForeignBuy': net
+    })
+    
+    result = quant_engine.analyze_foreign_flow(data)
+    
+    assert result['net_1d'] == 30
+    assert result['net_5d'] == 50 + 50 + 10 + 20 + 30
+    assert result['net_20d'] == sum(net[-20:])
+    assert result['net_60d'] == sum(net)
+    assert result['streak_direction'] == "Inflow"
+    assert result['streak_days'] == 20
+    assert result['inflow_days_20d'] == 20
+
+def test_foreign_flow_series_only_fetches_missing_days(mocker, tmp_path):
+    import datetime
+    import db_manager
+    
+    mocker.patch.object(db_manager, 'DB_NAME', str(tmp_path / "ff.db"))
+    db_manager.init_db()
+    
+    dates = [datetime.date.today() - datetime.timedelta(days=i) for i in range(5)]
+    d_strs = [d.strftime("%Y-%m-%d") for d in dates]
+    
+    client = mocker.MagicMock()
+    client.get_recent_trading_dates.return_value = dates
+    client.get_foreign_flow_history.side_effect = lambda ticker, ds: {
+        d.strftime("%Y-%m-%d"): {'date': d.strftime("%Y-%m-%d"), 'net_foreign_buy': 100.0,
+                                  'total_buy': 100.0, 'total_sell': 0.0, 'has_data': True}
+        for d in ds
+    }
+    engine = QuantAnalyzer(goapi_client=client)
+    
+    first = engine.get_foreign_flow_series("BBRI", days=5)
+    assert [r['date'] for r in first] == sorted(d_strs)
+    
+    # Second call: past days come from the DB, only today is refetched
+    engine.get_foreign_flow_series("BBRI", days=5)
+    refetched = client.get_foreign_flow_history.call_args[0][1]
+    assert refetched == [dates[0]]
+
+def test_prepare_broker_flow_data(quant_engine):
+    hist = {
+        '2024-01-02': [
+            {'broker_code': 'AK', 'side': 'BUY', 'value': 100, 'avg': 1000},
+            {'broker_code': 'YP', 'side': 'SELL', 'value': 80, 'avg': 1000},
+            {'broker_code': 'CC', 'side': 'SELL', 'value': 5, 'avg': 1000},
+        ],
+        '2024-01-03': [
+            {'broker_code': 'AK', 'side': 'BUY', 'value': 50, 'avg': 1010},
+            {'broker_code': 'YP', 'side': 'SELL', 'value': 20, 'avg': 1010},
+            {'code': 'BK', 'buy_vol': 30, 'sell_vol': 10},
+        ],
+    }
+    
+    flow = quant_engine.prepare_broker_flow_data(hist, top_n=1)
+    
+    assert list(flow.columns) == ['AK', 'YP']
+    assert list(flow['AK']) == [100, 150]
+    assert list(flow['YP']) == [-80, -100]
+    
+    # Explicit broker list, including legacy-format rows and absent brokers
+    flow = quant_engine.prepare_broker_flow_data(hist, brokers=['BK', 'XX'])
+    assert list(flow['BK']) == [0, 20]
+    assert list(flow['XX']) == [0, 0]
+
+def test_batch_scoring_matches_scalar(quant_engine):
+    tech = [90, 50, 20, 70]
+    bandar = [50, 0, -50, 10]
+    foreign = [20, 0, -20, 30]
+    sentiment = [80, 50, 10, 50]
+    
+    batch = quant_engine.calculate_final_verdict_batch(tech, bandar, foreign, sentiment)
+    
+    for i in range(len(tech)):
+        single = quant_engine.calculate_final_verdict(tech[i], bandar[i], foreign[i], sentiment[i])
+        assert batch['final_score'][i] == single['final_score']
+        assert batch['verdict'][i] == single['verdict']
+    
+    risk = quant_engine.calculate_dynamic_risk_batch([1000, 2500], [50, 40], method="conservative")
+    for i, (entry, atr) in enumerate([(1000, 50), (2500, 40)]):
+        single = quant_engine.calculate_dynamic_risk(entry, atr, method="conservative")
+        assert risk['stop_loss'][i] == single['stop_loss']
+        assert risk['target_price'][i] == single['target_price']
+        assert risk['risk_percentage'][i] == single['risk_percentage']
+
+def test_batch_scoring_with_missing_inputs(quant_engine):
+    nan = float("nan")
+    batch = quant_engine.calculate_final_verdict_batch([nan, 90], [0, nan], [nan, 20], [50, 80])
+    
+    # Missing scores are neutral, never INT64_MIN
+    assert batch['final_score'][0] == quant_engine.calculate_final_verdict(50, 0, 0, 50)['final_score']
+    assert batch['verdict'][0] == "WAIT & SEE"
+    assert batch['final_score'][1] == quant_engine.calculate_final_verdict(90, 0, 20, 80)['final_score']
+    
+    risk = quant_engine.calculate_dynamic_risk_batch([1000, 2500, nan], [50, nan, 40])
+    assert risk['stop_loss'][0] == quant_engine.calculate_dynamic_risk(1000, 50)['stop_loss']
+    assert risk['stop_loss'][1] is pd.NA and risk['target_price'][2] is pd.NA
+
+def test_cumulative_summary_matches_flow_chart(quant_engine):
+    # Legacy rows carry both value and lot; summary and chart must rank the same brokers
+    hist = {
+        '2024-01-02': [
+            {'code': 'AK', 'buy_vol': 10, 'sell_vol': 0, 'buy_value': 900_000, 'sell_value': 0},
+            {'code': 'BK', 'buy_vol': 50, 'sell_vol': 0, 'buy_value': 100_000, 'sell_value': 0},
+            {'code': 'YP', 'buy_vol': 0, 'sell_vol': 60, 'buy_value': 0, 'sell_value': 1_000_000},
+        ],
+    }
+    summary = quant_engine.get_cumulative_broker_summary(hist)
+    flow = quant_engine.prepare_broker_flow_data(hist, top_n=1)
+
+    assert summary['top_buyers'] == [('AK', 900_000), ('BK', 100_000)]
+    assert summary['top_sellers'] == [('YP', -1_000_000)]
+    assert list(flow.columns) == [summary['top_buyers'][0][0], summary['top_sellers'][0][0]]
@@ -24,7 +24,9 @@ class MarketView(ctk.CTkFrame):
         self.control_card.grid_columnconfigure(1, weight=0) # Save
         self.control_card.grid_columnconfigure(2, weight=1) # Spacer
         self.control_card.grid_columnconfigure(3, weight=0) # Timeframe
-        self.control_card.grid_columnconfigure(4, weight=0) # Run
+        self.control_card.grid_columnconfigure(4, weight=0) # Strategy
+        self.control_card.grid_columnconfigure(5, weight=0) # Fast Mode
+        self.control_card.grid_columnconfigure(6, weight=0) # Run
 
         # Common grid options
         grid_opts = {"row": 0, "pady": 15, "sticky": "ns"}
@@ -53,12 +55,24 @@ class MarketView(ctk.CTkFrame):
                                             font=("Arial", 12, "bold"), dropdown_font=("Arial", 12))
         self.strategy_combo.grid(column=4, padx=10, **grid_opts)
 
-        # Element 5: Run Analysis Button
+        # Element 5: Fast Mode (Skip AI -> deterministic quant report)
+        self.skip_ai_var = ctk.BooleanVar(value=False)
+        self.skip_ai_check = ctk.CTkCheckBox(self.control_card, text="⚡ Tanpa AI", variable=self.skip_ai_var,
+                                             font=("Arial", 12, "bold"), checkbox_width=20, checkbox_height=20)
+        self.skip_ai_check.grid(column=5, padx=10, **grid_opts)
+
+        # Element 6: Force Refresh (ignore cached results)
+        self.force_refresh_var = ctk.BooleanVar(value=False)
+        self.force_refresh_check = ctk.CTkCheckBox(self.control_card, text="🔄 Refresh", variable=self.force_refresh_var,
+                                                   font=("Arial", 12, "bold"), checkbox_width=20, checkbox_height=20)
+        self.force_refresh_check.grid(column=6, padx=10, **grid_opts)
+
+        # Element 7: Run Analysis Button
         self.analyze_btn = ctk.CTkButton(self.control_card, text="RUN ANALYSIS ⚡", width=180, height=40, 
                                        font=ctk.CTkFont(size=14, weight="bold"),
                                        fg_color="#2CC985", hover_color="#25A96E", text_color="black",
                                        command=self.start_analysis_thread)
-        self.analyze_btn.grid(column=5, padx=(10, 20), **grid_opts)
+        self.analyze_btn.grid(column=7, padx=(10, 20), **grid_opts)
 
         # Progress Bar
         self.progress_bar = ctk.CTkProgressBar(self.control_card, height=4, progress_color="#2CC985", width=500)
@@ -106,6 +120,10 @@ class MarketView(ctk.CTkFrame):
         self.sentiment_bar = ctk.CTkProgressBar(score_container, width=400, height=15, corner_radius=8)
         self.sentiment_bar.pack(side="left", fill="x", expand=True)
         self.sentiment_bar.set(0)
+        
+        # Cache age of the shown report (empty for a fresh run)
+        self.cache_label = ctk.CTkLabel(score_container, text="", font=("Arial", 12), text_color="gray")
+        self.cache_label.pack(side="left", padx=(15, 0))
 
         # Row 1: Content Area
         self.content_area = ctk.CTkFrame(self.frame_preview, fg_color="transparent")
@@ -207,6 +225,8 @@ class MarketView(ctk.CTkFrame):
         
         timeframe = self.timeframe_var.get().lower()
         style = self.strategy_var.get()
+        skip_ai = self.skip_ai_var.get()
+        force_refresh = self.force_refresh_var.get()
 
         self.toggle_inputs(False)
         self.progress_bar.set(0)
@@ -226,16 +246,19 @@ class MarketView(ctk.CTkFrame):
         
         self.sentiment_bar.set(0)
         self.sentiment_val_label.configure(text="--/100", text_color="gray")
+        self.cache_label.configure(text="")
 
-        threading.Thread(target=self.run_analysis_safe, args=(ticker, timeframe, style), daemon=True).start()
+        threading.Thread(target=self.run_analysis_safe, args=(ticker, timeframe, style, skip_ai, force_refresh), daemon=True).start()
 
-    def run_analysis_safe(self, ticker, timeframe, style):
+    def run_analysis_safe(self, ticker, timeframe, style, skip_ai=False, force_refresh=False):
         try:
             final_message, chart_path, sentiment_score = self.controller.run_analysis(
                 ticker, 
                 timeframe=timeframe,
                 style=style,
-                progress_callback=self.update_progress
+                progress_callback=self.update_progress,
+                skip_ai=skip_ai,
+                force_refresh=force_refresh
             )
             
             self.current_chart_path = chart_path
@@ -250,6 +273,7 @@ class MarketView(ctk.CTkFrame):
             self.switch_tab("REPORT PREVIEW")
             
             self.update_sentiment_ui(sentiment_score)
+            self.update_cache_ui(self.controller.last_cache_info)
             self.send_btn.configure(state="normal")
             
             # Request Sidebar Update
@@ -278,6 +302,14 @@ class MarketView(ctk.CTkFrame):
         self.sentiment_bar.configure(progress_color=color)
         self.sentiment_val_label.configure(text_color=color)
 
+    def update_cache_ui(self, cache_info):
+        if not cache_info:
+            self.cache_label.configure(text="🆕 Analisa baru")
+            return
+        self.cache_label.configure(
+            text=f"♻️ Cache {cache_info['age_minutes']:.0f} menit lalu (valid s/d {cache_info['valid_until']:%H:%M})"
+        )
+
     def update_progress(self, val):
         self.progress_bar.set(val)
 
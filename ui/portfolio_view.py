@@ -1,6 +1,6 @@
 import customtkinter as ctk
 import threading
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
@@ -34,6 +34,15 @@ class PortfolioView(ctk.CTkFrame):
         
         ctk.CTkButton(input_row, text="+ BUY / AVG", width=120, fg_color="#1F6AA5", command=self.add_portfolio_entry).pack(side="left", padx=10)
 
+        # Bulk import / export (CSV or XLSX, e.g. broker statement)
+        io_row = ctk.CTkFrame(self.port_input, fg_color="transparent")
+        io_row.pack(pady=(0, 5))
+        
+        ctk.CTkButton(io_row, text="IMPORT PORTFOLIO", width=140, fg_color="#333", command=self.import_portfolio).pack(side="left", padx=5)
+        ctk.CTkButton(io_row, text="EXPORT PORTFOLIO", width=140, fg_color="#333", command=self.export_portfolio).pack(side="left", padx=5)
+        ctk.CTkButton(io_row, text="IMPORT WATCHLIST", width=140, fg_color="#333", command=self.import_watchlist).pack(side="left", padx=5)
+        ctk.CTkButton(io_row, text="EXPORT WATCHLIST", width=140, fg_color="#333", command=self.export_watchlist).pack(side="left", padx=5)
+
         # 2. Main Content Area (Split Table and Chart)
         self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.content_frame.grid(row=1, column=0, sticky="nsew")
@@ -101,6 +110,46 @@ class PortfolioView(ctk.CTkFrame):
         except ValueError:
             messagebox.showerror("Error", "Price must be number, Lots must be integer")
 
+    FILE_TYPES = [("Excel / CSV", "*.xlsx *.csv"), ("Excel", "*.xlsx"), ("CSV", "*.csv")]
+
+    def import_portfolio(self):
+        path = filedialog.askopenfilename(title="Import Portfolio", filetypes=self.FILE_TYPES)
+        if not path:
+            return
+        replace = messagebox.askyesno("Import Portfolio", "Replace the current portfolio?\n\nNo = merge (weighted average with existing positions).")
+        result = self.controller.import_portfolio(path, replace=replace)
+        if result is None:
+            messagebox.showerror("Error", "Import failed, see log for details.")
+            return
+        msg = f"Imported {result['imported']} positions."
+        if result['errors']:
+            msg += f"\n\nSkipped {len(result['errors'])} rows:\n" + "\n".join(result['errors'][:10])
+        messagebox.showinfo("Import Portfolio", msg)
+        self.refresh_portfolio_table()
+
+    def export_portfolio(self):
+        path = filedialog.asksaveasfilename(title="Export Portfolio", defaultextension=".xlsx", filetypes=self.FILE_TYPES)
+        if path and not self.controller.export_portfolio(path):
+            messagebox.showerror("Error", "Export failed, see log for details.")
+
+    def import_watchlist(self):
+        path = filedialog.askopenfilename(title="Import Watchlist", filetypes=self.FILE_TYPES)
+        if not path:
+            return
+        count = self.controller.import_favorites(path)
+        if count is None:
+            messagebox.showerror("Error", "Import failed, see log for details.")
+            return
+        messagebox.showinfo("Import Watchlist", f"Added {count} tickers to Favorites.")
+        app = self.winfo_toplevel()
+        if hasattr(app, "sidebar"):
+            app.sidebar.update_lists()
+
+    def export_watchlist(self):
+        path = filedialog.asksaveasfilename(title="Export Watchlist", defaultextension=".csv", filetypes=self.FILE_TYPES)
+        if path and not self.controller.export_favorites(path):
+            messagebox.showerror("Error", "Export failed, see log for details.")
+
     def delete_portfolio_entry(self, ticker):
         if messagebox.askyesno("Confirm", f"Remove {ticker} from portfolio?"):
             self.controller.remove_portfolio_item(ticker)
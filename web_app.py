@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import io
 import time
 import os
 import sys
@@ -75,7 +76,8 @@ if page == "📊 Market Data":
     with col2:
         style = st.selectbox("Trading Style", ["SWING", "SCALPING", "INVESTING"])
     with col3:
-        pass # Spacer
+        skip_ai = st.checkbox("⚡ Fast Mode (Tanpa AI)", value=False)
+        force_refresh = st.checkbox("🔄 Force Refresh", value=False)
 
     if st.button("🚀 Analyze Stock", type="primary"):
         if not ticker:
@@ -91,14 +93,16 @@ if page == "📊 Market Data":
             try:
                 # Run Analysis
                 msg, chart_path, score = st.session_state.controller.run_analysis(
-                    ticker, style=style, progress_callback=progress_callback
+                    ticker, style=style, progress_callback=progress_callback, skip_ai=skip_ai,
+                    force_refresh=force_refresh
                 )
                 
                 st.session_state.analysis_result = {
                     "msg": msg,
                     "chart": chart_path,
                     "score": score,
-                    "ticker": ticker
+                    "ticker": ticker,
+                    "cache": st.session_state.controller.last_cache_info
                 }
                 status_container.success("Analysis Complete!")
                 
@@ -114,6 +118,8 @@ if page == "📊 Market Data":
         
         with c1:
             st.subheader(f"Analysis Report: {res['ticker']}")
+            if res.get('cache'):
+                st.caption(f"♻️ Cached result, {res['cache']['age_minutes']:.0f} min old (valid until {res['cache']['valid_until']:%H:%M} WIB)")
             st.text_area("Report Output", value=res['msg'], height=500)
             
             target_phone = os.getenv("TARGET_PHONE")
@@ -146,6 +152,37 @@ elif page == "💼 Portfolio":
     else:
         st.info("Portfolio is empty.")
 
+    # Bulk import / export (CSV or XLSX, e.g. broker statement)
+    with st.expander("📥 Import / Export"):
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**Portfolio**")
+            up = st.file_uploader("Import portfolio", type=["csv", "xlsx"], key="portfolio_upload")
+            replace = st.checkbox("Replace current portfolio (otherwise merge / average)")
+            if up and st.button("Import Portfolio"):
+                result = st.session_state.controller.import_portfolio(up, filename=up.name, replace=replace)
+                if result is None:
+                    st.error("Import failed.")
+                else:
+                    st.success(f"Imported {result['imported']} positions.")
+                    for err in result['errors']:
+                        st.warning(err)
+            buf = io.BytesIO()
+            if st.session_state.controller.export_portfolio(buf, fmt="xlsx"):
+                st.download_button("Export Portfolio (.xlsx)", buf.getvalue(), file_name="portfolio.xlsx")
+        with c2:
+            st.markdown("**Watchlist (Favorites)**")
+            up = st.file_uploader("Import watchlist", type=["csv", "xlsx"], key="watchlist_upload")
+            if up and st.button("Import Watchlist"):
+                count = st.session_state.controller.import_favorites(up, filename=up.name)
+                if count is None:
+                    st.error("Import failed.")
+                else:
+                    st.success(f"Added {count} tickers to Favorites.")
+            buf = io.BytesIO()
+            if st.session_state.controller.export_favorites(buf, fmt="csv"):
+                st.download_button("Export Watchlist (.csv)", buf.getvalue(), file_name="watchlist.csv")
+
 # --- PAGE: SETTINGS ---
 elif page == "⚙️ Settings":
     st.header("Configuration")